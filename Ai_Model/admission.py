@@ -0,0 +1,381 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from typing import Any, Collection, Dict, Optional
+import logging
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Request kinds sharing capacity (same names the model router uses)
+KINDS = ("chat", "assessment")
+
+# Waits kept per kind for the percentiles in stats()
+WAIT_WINDOW = 500
+# Smoothing of the observed service time used to predict queue waits
+SERVICE_TIME_ALPHA = 0.1
+
+# Header a trusted proxy (the Laravel backend) sets to the id of the user it authenticated
+USER_HEADER = "X-User-Id"
+FORWARDED_FOR_HEADER = "X-Forwarded-For"
+# Prefix of keys derived from the client address only
+ADDRESS_PREFIX = "ip:"
+
+
+def _parse_addresses(value: Optional[str]) -> frozenset:
+    return frozenset(part.strip() for part in (value or "").split(",") if part.strip())
+
+
+def identify_user(authorization: Optional[str] = None, session_id: Optional[str] = None,
+                  client_address: Optional[str] = None, forwarded_user: Optional[str] = None,
+                  forwarded_for: Optional[str] = None, trusted_proxies: Collection[str] = ()) -> str:
+    """
+    Key used to give every user a fair share of capacity.
+
+    Prefers the `sub` claim of a Laravel JWT bearer token, then the chat
+    session id, then the client address. The token signature is not verified
+    here (the Laravel backend does that); a forged token only moves its
+    sender into another fairness bucket.
+
+    When the request comes from one of `trusted_proxies`, the proxy's
+    X-User-Id header is used before the session id, and the address it
+    appended to X-Forwarded-For replaces its own address. Headers from any
+    other client are ignored, since they could be set to anything.
+    """
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+        subject = _jwt_subject(token)
+        if subject:
+            return f"user:{subject}"
+        return f"token:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]}"
+    trusted = client_address is not None and client_address in trusted_proxies
+    if trusted and forwarded_user and forwarded_user.strip():
+        return f"user:{forwarded_user.strip()}"
+    if session_id:
+        return f"session:{session_id}"
+    if trusted and forwarded_for:
+        # The last hop is the one the trusted proxy appended; earlier ones are client-supplied
+        client_address = forwarded_for.split(",")[-1].strip() or client_address
+    return f"{ADDRESS_PREFIX}{client_address or 'unknown'}"
+
+
+def _jwt_subject(token: str) -> Optional[str]:
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    subject = claims.get("sub") if isinstance(claims, dict) else None
+    return str(subject) if subject is not None else None
+
+
+class AdmissionRejected(Exception):
+    """The request was shed; retry after `retry_after` seconds (HTTP 429 + Retry-After)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Waiter:
+    __slots__ = ("user", "kind", "enqueued", "granted", "granted_at", "released", "event", "future", "loop")
+
+    def __init__(self, user: str, kind: str):
+        self.user = user
+        self.kind = kind
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.granted_at = 0.0
+        self.released = False
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class Ticket:
+    """Admission of one request; release() when its response is finished (idempotent)."""
+
+    def __init__(self, controller: "AdmissionController", waiter: Optional[_Waiter]):
+        self._controller = controller
+        self._waiter = waiter
+
+    def release(self):
+        if self._waiter is not None:
+            self._controller._release(self._waiter)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Admission control with per-user in-flight limits and weighted fair queuing.
+
+    At most `max_in_flight` requests run at once and at most
+    `per_user_in_flight` of them belong to the same user. Waiting requests are
+    scheduled hierarchically with start-time fair queuing: first between the
+    request kinds (chat vs. assessment, by weight), then between the users
+    waiting within that kind. A user spamming requests therefore only queues
+    behind themself.
+
+    A request is shed with AdmissionRejected instead of queued when its
+    predicted wait exceeds `max_queue_wait`, and a queued request that still
+    waits that long is shed too.
+
+    The address key of a trusted proxy (a proxied request that carried no
+    token, session id or forwarded user) is exempt from the per-user limit,
+    because everyone behind the proxy would otherwise share it. Such requests
+    are still queued fairly against other users and count towards
+    `max_in_flight`.
+    """
+
+    def __init__(self, max_in_flight: int = 64, per_user_in_flight: int = 4,
+                 weights: Dict[str, float] = None, max_queue_wait: float = 10.0,
+                 enabled: bool = True, trusted_proxies: Collection[str] = ()):
+        """
+        Args:
+            max_in_flight: Requests processed concurrently across all users
+            per_user_in_flight: Requests processed concurrently for one user
+            weights: Capacity share per request kind. Defaults to 1 for each kind
+            max_queue_wait: Longest queue wait in seconds before a request is shed
+            enabled: When False every request is admitted immediately
+            trusted_proxies: Addresses whose X-User-Id and X-Forwarded-For headers identify_user honours
+        """
+        self.max_in_flight = max_in_flight
+        self.per_user_in_flight = per_user_in_flight
+        self.weights = dict(weights or {kind: 1.0 for kind in KINDS})
+        self.max_queue_wait = max_queue_wait
+        self.enabled = enabled
+        self.trusted_proxies = frozenset(trusted_proxies)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._user_in_flight: Counter = Counter()
+        self._user_queued: Counter = Counter()
+        # kind -> user -> queued waiters (FIFO per user)
+        self._waiting: Dict[str, "OrderedDict[str, deque]"] = defaultdict(OrderedDict)
+        # Virtual clocks and finish tags of the two fair-queuing levels
+        self._kind_clock = 0.0
+        self._kind_finish: Dict[str, float] = defaultdict(float)
+        self._user_clock: Dict[str, float] = defaultdict(float)
+        self._user_finish: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._service_time = 1.0
+
+        self._admitted: Counter = Counter()
+        self._rejected: Counter = Counter()
+        self._timeouts: Counter = Counter()
+        self._waits: Dict[str, deque] = defaultdict(lambda: deque(maxlen=WAIT_WINDOW))
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Create a controller configured from ADMISSION_* environment variables."""
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64")),
+            per_user_in_flight=int(os.getenv("ADMISSION_PER_USER_IN_FLIGHT", "4")),
+            weights={kind: float(os.getenv(f"ADMISSION_{kind.upper()}_WEIGHT", "1")) for kind in KINDS},
+            max_queue_wait=float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "10")),
+            enabled=os.getenv("ADMISSION_CONTROL", "1") == "1",
+            trusted_proxies=_parse_addresses(os.getenv("ADMISSION_TRUSTED_PROXIES")),
+        )
+
+    def acquire(self, user: str, kind: str) -> Ticket:
+        """
+        Wait (blocking) until the request may run.
+
+        Raises:
+            AdmissionRejected: When the request is shed
+        """
+        if not self.enabled:
+            return Ticket(self, None)
+        waiter = _Waiter(user, kind)
+        waiter.event = threading.Event()
+        self._enqueue(waiter)
+        if not waiter.event.wait(self.max_queue_wait):
+            self._abandon(waiter)
+        return Ticket(self, waiter)
+
+    async def acquire_async(self, user: str, kind: str) -> Ticket:
+        """Async variant of acquire; waiting does not block the event loop."""
+        if not self.enabled:
+            return Ticket(self, None)
+        waiter = _Waiter(user, kind)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_queue_wait)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+        except asyncio.CancelledError:
+            # Client went away while queued: give back the slot if it was granted meanwhile
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._remove(waiter)
+            if granted:
+                self._release(waiter)
+            raise
+        return Ticket(self, waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = {}
+            for kind, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[kind] = {
+                    "p50_ms": round(percentile(ordered, 50) * 1000) if ordered else None,
+                    "p95_ms": round(percentile(ordered, 95) * 1000) if len(ordered) >= 20 else None,
+                }
+            return {
+                "enabled": self.enabled,
+                "max_in_flight": self.max_in_flight,
+                "per_user_in_flight": self.per_user_in_flight,
+                "in_flight": self._in_flight,
+                "queued": {kind: sum(len(queue) for queue in users.values()) for kind, users in self._waiting.items()},
+                "waiting_users": len(self._user_queued),
+                "admitted": dict(self._admitted),
+                "rejected": dict(self._rejected),
+                "queue_timeouts": dict(self._timeouts),
+                "queue_wait": waits,
+                "service_time_ms": round(self._service_time * 1000),
+            }
+
+    def _enqueue(self, waiter: _Waiter):
+        with self._lock:
+            expected_wait = self._expected_wait(waiter.user)
+            if expected_wait > self.max_queue_wait:
+                self._rejected[waiter.kind] += 1
+                raise AdmissionRejected(
+                    f"Server busy: expected queue wait {expected_wait:.1f}s exceeds {self.max_queue_wait:.0f}s",
+                    retry_after=expected_wait,
+                )
+            self._waiting[waiter.kind].setdefault(waiter.user, deque()).append(waiter)
+            self._user_queued[waiter.user] += 1
+            self._dispatch()
+
+    def _expected_wait(self, user: str) -> float:
+        """
+        Predicted queue wait of a new request of `user` (caller holds the lock).
+
+        Under fair queuing a new request waits for about one request of every
+        other waiting user, or for the user's own backlog when that is longer.
+        """
+        waiting_users = len(self._user_queued)
+        shared_wait = 0.0
+        if self._in_flight >= self.max_in_flight:
+            shared_wait = (waiting_users + 1) / self.max_in_flight * self._service_time
+        own_backlog = self._user_in_flight[user] + self._user_queued[user]
+        own_wait = 0.0
+        if self._limited(user) and own_backlog >= self.per_user_in_flight:
+            own_wait = (self._user_queued[user] + 1) / self.per_user_in_flight * self._service_time
+        return max(shared_wait, own_wait)
+
+    def _limited(self, user: str) -> bool:
+        """Whether the per-user limit applies to `user` (not to a trusted proxy's own address)."""
+        return not (user.startswith(ADDRESS_PREFIX) and user[len(ADDRESS_PREFIX):] in self.trusted_proxies)
+
+    def _dispatch(self):
+        """Grant free slots to waiters in fair-queuing order (caller holds the lock)."""
+        while self._in_flight < self.max_in_flight:
+            best = None
+            for kind, users in self._waiting.items():
+                eligible = [user for user in users
+                            if self._user_in_flight[user] < self.per_user_in_flight or not self._limited(user)]
+                if not eligible:
+                    continue
+                start = max(self._kind_clock, self._kind_finish[kind])
+                if best is None or start < best[0]:
+                    best = (start, kind, eligible)
+            if best is None:
+                return
+
+            kind_start, kind, eligible = best
+            clock = self._user_clock[kind]
+            finish = self._user_finish[kind]
+            user = min(eligible, key=lambda candidate: max(clock, finish.get(candidate, 0.0)))
+            user_start = max(clock, finish.get(user, 0.0))
+
+            self._kind_clock = kind_start
+            self._kind_finish[kind] = kind_start + 1.0 / self.weights.get(kind, 1.0)
+            self._user_clock[kind] = user_start
+            finish[user] = user_start + 1.0
+            if len(finish) > 10000:
+                # Idle users' tags are behind the clock and no longer matter
+                for idle in [name for name, tag in finish.items() if tag <= user_start]:
+                    del finish[idle]
+
+            queue = self._waiting[kind][user]
+            waiter = queue.popleft()
+            if not queue:
+                del self._waiting[kind][user]
+            self._grant(waiter)
+
+    def _grant(self, waiter: _Waiter):
+        waiter.granted = True
+        waiter.granted_at = time.monotonic()
+        self._in_flight += 1
+        self._user_in_flight[waiter.user] += 1
+        self._dequeued(waiter.user)
+        self._admitted[waiter.kind] += 1
+        self._waits[waiter.kind].append(waiter.granted_at - waiter.enqueued)
+        if waiter.event is not None:
+            waiter.event.set()
+        else:
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def _abandon(self, waiter: _Waiter):
+        """The waiter's queue time ran out: shed it unless it was granted at the last moment."""
+        with self._lock:
+            if waiter.granted:
+                return
+            self._remove(waiter)
+            self._timeouts[waiter.kind] += 1
+        raise AdmissionRejected(
+            f"Server busy: request waited {self.max_queue_wait:.0f}s in the queue", retry_after=self._service_time
+        )
+
+    def _remove(self, waiter: _Waiter):
+        """Drop a waiter that was never granted (caller holds the lock)."""
+        queue = self._waiting[waiter.kind].get(waiter.user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._waiting[waiter.kind][waiter.user]
+        self._dequeued(waiter.user)
+
+    def _dequeued(self, user: str):
+        self._user_queued[user] -= 1
+        if self._user_queued[user] <= 0:
+            del self._user_queued[user]
+
+    def _release(self, waiter: _Waiter):
+        with self._lock:
+            if waiter.released:
+                return
+            waiter.released = True
+            elapsed = time.monotonic() - waiter.granted_at
+            self._service_time += SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+            self._in_flight -= 1
+            self._user_in_flight[waiter.user] -= 1
+            if self._user_in_flight[waiter.user] <= 0:
+                del self._user_in_flight[waiter.user]
+            self._dispatch()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -16,13 +16,24 @@ load_dotenv()
 # Add current directory to PYTHONPATH
 sys.path.append(os.path.dirname(__file__))
 
-# Import model implementation
-try:
-    from tes_implement_gemini import GeminiModelImplementation
-    logger.info("Successfully imported GeminiModelImplementation")
-except ImportError as e:
-    logger.error(f"Failed to import GeminiModelImplementation: {e}")
-    sys.exit(1)
+# Only light modules at import time; the Gemini SDK (grpc, protobuf, api-core) and the model
+# modules are imported by the background startup so the server can bind and answer /healthz at once
+from sse import SSE_HEADERS, format_sse
+from admission import FORWARDED_FOR_HEADER, USER_HEADER, AdmissionController, AdmissionRejected, identify_user
+from preload import freeze, preload_enabled
+from startup import Startup
+from metrics import (CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, fallback_served, record_fallback,
+                     register_server_metrics, reset_fallback_served)
+from tracing import end_trace, span, start_trace
+from profiler import PROFILE_HEADER, SamplingProfiler
+from prompt_budget import PromptBudget, PromptBudgetExceeded
+from idempotency import (IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyConflict, IdempotencyInProgress,
+                         IdempotencyStore, idempotency_scope)
+
+# Offline Gemini stand-in for load tests and local development
+if os.getenv("GEMINI_BACKEND") == "fake":
+    from fake_gemini import install_fake_backend
+    install_fake_backend()
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -38,7 +49,18 @@ CORS(app, resources={
 })
 
 chatbot_model = None
-model_initialized = False
+startup = Startup.from_env()
+
+# Per-user in-flight limits and fair queuing between chat and assessments
+admission = AdmissionController.from_env()
+# Admission-controlled endpoints and the request kind they are queued as
+ADMISSION_KINDS = {"/chat": "chat", "/chat/stream": "chat", "/assess-career": "assessment"}
+
+def resolve_model_path():
+    model_path = os.path.join("Ai_Model", "my_career_chatbot.json")
+    if not os.path.exists(model_path):
+        model_path = "my_career_chatbot.json"
+    return model_path
 
 def initialize_model():
     global chatbot_model
@@ -46,26 +68,33 @@ def initialize_model():
     if chatbot_model is not None:
         return True
 
+    try:
+        with startup.phase("imports"):
+            from tes_implement_gemini import GeminiModelImplementation
+        logger.info("Successfully imported GeminiModelImplementation")
+    except ImportError as e:
+        logger.error(f"Failed to import GeminiModelImplementation: {e}")
+        return False
+
     try:
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             api_key = ""
             logger.warning("Using hardcoded API key - set GOOGLE_API_KEY env variable")
 
-        model_path = os.path.join("Ai_Model", "my_career_chatbot.pkl")
-        if not os.path.exists(model_path):
-            model_path = "my_career_chatbot.pkl"
-
-        chatbot_model = GeminiModelImplementation(
-            model_path=model_path,
-            api_key=api_key
-        )
+        model_path = resolve_model_path()
+        with startup.phase("model_load"):
+            chatbot_model = GeminiModelImplementation(
+                model_path=model_path,
+                api_key=api_key
+            )
         logger.info(f"Model loaded successfully from {model_path}")
         return True
 
     except FileNotFoundError:
-        logger.warning("Pickle file not found, creating basic implementation")
-        chatbot_model = BasicCareerChatbot(api_key=api_key)
+        logger.warning("Model config file not found, creating basic implementation")
+        with startup.phase("model_load"):
+            chatbot_model = BasicCareerChatbot(api_key=api_key)
         logger.info("Basic chatbot model initialized")
         return True
 
@@ -73,12 +102,27 @@ def initialize_model():
         logger.error(f"Failed to initialize model: {e}")
         return False
 
+def load_and_warm_up():
+    """Background startup: import and load the model, then open the Gemini connections."""
+    if not initialize_model():
+        raise RuntimeError("Failed to initialize model")
+    with startup.phase("warm_up"):
+        return chatbot_model.warm_up()
+
 class BasicCareerChatbot:
+    FALLBACK_RESPONSE = "Maaf, saya mengalami kendala teknis. Silakan coba lagi atau ajukan pertanyaan yang lebih spesifik."
+
     def __init__(self, api_key):
         import google.generativeai as genai
+        from session_store import SessionStore
+        from conversation_log import ConversationLog
+        from gemini_backend import GeminiBackend
+        from recommendation_parser import RecommendationParser
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-        self.conversation_history = []
+        self.session_store = SessionStore.from_env()
+        self.conversation_log = ConversationLog.from_env()
+        if self.conversation_log:
+            self.session_store.loader = self.conversation_log.load_session
 
         self.system_prompt = """
 Anda adalah CareerMentorAI, seorang konselor karir profesional yang ahli membantu orang menemukan jalur karir yang tepat.
@@ -98,86 +142,293 @@ GAYA KOMUNIKASI:
 
 Selalu berikan jawaban yang membantu dan konstruktif!
 """
+        # Same generation defaults as the main model; assessments add JSON mode on top
+        self.generation_config = {
+            'temperature': 0.7,
+            'top_p': 0.8,
+            'top_k': 40,
+            'max_output_tokens': 1024,
+        }
+        self.structured_output = os.getenv('ASSESSMENT_STRUCTURED_OUTPUT', '1') == '1'
 
-    def generate_response(self, user_message: str, user_context: dict = None) -> str:
-        try:
-            context = self.system_prompt + "\n\n"
-
-            if self.conversation_history:
-                context += "Riwayat percakapan:\n"
-                for conv in self.conversation_history[-3:]:
-                    context += f"User: {conv['user']}\n"
-                    context += f"Assistant: {conv['assistant'][:200]}...\n"
+        # Same routed flash/pro backend as the main model; the static prompt is the system_instruction
+        self.backend = GeminiBackend.from_env()
+        self.backend.configure(self.system_prompt)
+        self.prompt_budget = PromptBudget.from_env()
+        self.prompt_budget.set_system_prompt(self.system_prompt)
+        self.recommendation_parser = RecommendationParser()
 
-            context += f"\nUser: {user_message}\nCareerMentorAI:"
-            response = self.model.generate_content(context)
+    def generate_response(self, user_message: str, user_context: dict = None, session_id: str = None) -> str:
+        try:
+            tier = self._route_chat(user_message, session_id)
+            response = self.backend.generate(
+                self._build_context(user_message, session_id), tier, generation_config=self.generation_config
+            )
             response_text = response.text
 
-            self.conversation_history.append({
-                "user": user_message,
-                "assistant": response_text,
-                "timestamp": str(datetime.now())
-            })
+            self._record_turn(user_message, response_text, session_id)
 
             return response_text
 
+        except PromptBudgetExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return "Maaf, saya mengalami kendala teknis. Silakan coba lagi atau ajukan pertanyaan yang lebih spesifik."
+            record_fallback("chat")
+            return self.FALLBACK_RESPONSE
 
-    def assess_career_fit(self, user_profile: dict) -> list:
+    def generate_response_stream(self, user_message: str, user_context: dict = None, session_id: str = None):
+        chunks = []
         try:
-            assessment_prompt = f"""
-Berdasarkan profil berikut, berikan 3-5 rekomendasi karir terbaik:
+            tier = self._route_chat(user_message, session_id)
+            context = self._build_context(user_message, session_id)
+            for text in self.backend.stream(context, tier, generation_config=self.generation_config):
+                chunks.append(text)
+                yield text
+
+        except PromptBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            if not chunks:
+                record_fallback("chat")
+                yield self.FALLBACK_RESPONSE
+            return
 
-PROFIL USER:
-- Minat: {', '.join(user_profile.get('interests', []))}
-- Skills: {', '.join(user_profile.get('skills', []))}
-- Pengalaman: {user_profile.get('experience_level', 'Tidak disebutkan')}
-- Pendidikan: {user_profile.get('education', 'Tidak disebutkan')}
+        self._record_turn(user_message, "".join(chunks), session_id)
 
-Berikan rekomendasi dalam format yang jelas dengan alasan mengapa cocok.
-"""
-            response = self.model.generate_content(self.system_prompt + "\n\n" + assessment_prompt)
+    def _build_context(self, user_message: str, session_id: str = None) -> str:
+        self.prompt_budget.check_message(user_message)
+        context = ""
+
+        recent_history = self.prompt_budget.trim_history(
+            self.session_store.get_history(session_id, limit=3), self._render_turn
+        )
+        if recent_history:
+            context += "Riwayat percakapan:\n"
+            for conv in recent_history:
+                context += self._render_turn(conv)
+
+        context += f"\nUser: {user_message}\nCareerMentorAI:"
+        return self.prompt_budget.finish(context, self.backend.count_tokens)
+
+    def _render_turn(self, conv: dict) -> str:
+        return f"User: {conv['user']}\nAssistant: {conv['assistant'][:200]}...\n"
+
+    def warm_up(self) -> dict:
+        return self.backend.warm_up()
+
+    def get_model_info(self) -> dict:
+        return {
+            "model_type": "basic",
+            "sessions": self.session_store.stats(),
+            "prompt_budget": self.prompt_budget.stats(),
+            "gemini": self.backend.stats()
+        }
 
-            return [{
-                "career_title": "Business Analyst",
-                "match_score": 80,
-                "reasons": ["Cocok dengan skill analisis", "Peluang karir yang baik"],
-                "next_steps": ["Pelajari tools analisis", "Dapatkan sertifikasi"],
-                "salary_range": "Rp 8,000,000 - Rp 20,000,000/bulan",
-                "growth_prospect": "Tinggi"
-            }]
+    def _route_chat(self, user_message: str, session_id: str = None) -> str:
+        return self.backend.route("chat", user_message, len(self.session_store.get_history(session_id)))
+
+    def _record_turn(self, user_message: str, response_text: str, session_id: str = None):
+        turn = {
+            "user": user_message,
+            "assistant": response_text,
+            "timestamp": str(datetime.now())
+        }
+        self.session_store.append_turn(session_id, turn)
+        if self.conversation_log and session_id:
+            self.conversation_log.append(session_id, turn)
+
+    def assess_career_fit(self, user_profile: dict) -> list:
+        # Shared with the main model; without career data the prompt holds just the profile
+        from career_assistant import assessment_generation_config, build_assessment_prompt, format_profile
+        user_profile = self.prompt_budget.sanitize_profile(user_profile)
+        try:
+            response = self.backend.generate(
+                build_assessment_prompt(format_profile(user_profile)),
+                self.backend.route("assessment"),
+                generation_config=assessment_generation_config(self.generation_config, self.structured_output)
+            )
+            recommendations = self.recommendation_parser.parse(response.text)
+            if recommendations is not None:
+                return recommendations
+            logger.error("No usable recommendations in the assessment reply")
 
         except Exception as e:
             logger.error(f"Error in career assessment: {e}")
-            return [{
-                "career_title": "Konsultasi Lebih Lanjut Diperlukan",
-                "match_score": 50,
-                "reasons": ["Perlu informasi lebih detail"],
-                "next_steps": ["Diskusi dengan konselor karir"],
-                "salary_range": "Bervariasi",
-                "growth_prospect": "Tergantung pilihan"
-            }]
-
-# Safe model initialization for Flask 3.0+
+
+        record_fallback("assessment")
+        return [{
+            "career_title": "Konsultasi Lebih Lanjut Diperlukan",
+            "match_score": 50,
+            "reasons": ["Perlu informasi lebih detail"],
+            "next_steps": ["Diskusi dengan konselor karir"],
+            "salary_range": "Bervariasi",
+            "growth_prospect": "Tergantung pilihan"
+        }]
+
+# PRELOAD_MODEL=1 with `gunicorn --preload`: read the config and compile the career data once
+# in the master; forked workers share it copy-on-write and build their own clients and connections
+if preload_enabled():
+    with startup.phase("preload"):
+        from tes_implement_gemini import GeminiModelImplementation
+        try:
+            GeminiModelImplementation.preload(resolve_model_path())
+        except FileNotFoundError:
+            logger.warning("Model config file not found, nothing to preload")
+    freeze()
+else:
+    # With preload the master must not start threads; each worker starts on its first request
+    startup.run_in_background(load_and_warm_up)
+
+# Responses of requests sent with an Idempotency-Key, replayed to client retries
+idempotency = IdempotencyStore.from_env()
+IDEMPOTENT_PATHS = ("/chat", "/assess-career")
+
+register_server_metrics(admission.stats, lambda: chatbot_model.session_store.stats() if chatbot_model else None)
+
+# Opt-in sampling profiler for slow requests (PROFILE_SAMPLE_RATE / PROFILE_ALLOW_HEADER)
+profiler = SamplingProfiler.from_env()
+
+@app.before_request
+def start_request_trace():
+    g.trace, g.trace_token = start_trace(request.method, request.path)
+    if profiler and profiler.wants(request.headers.get(PROFILE_HEADER)):
+        g.profile = profiler.start()
+
+# Model loading runs in the background; requests never wait for it (Flask 3.0+ safe)
+@app.before_request
+def ensure_startup():
+    startup.run_in_background(load_and_warm_up)
+
+def request_session_id():
+    data = request.get_json(silent=True)
+    return data.get('session_id') if isinstance(data, dict) else None
+
+# Before admission, so retries that are answered from the store take no queue slot
+@app.before_request
+def replay_idempotent_request():
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if idempotency is None or idempotency_key is None:
+        return None
+    if request.method != 'POST' or request.path not in IDEMPOTENT_PATHS:
+        return None
+    scope = idempotency_scope(request.headers.get('Authorization'), request_session_id(), request.remote_addr)
+    try:
+        key = IdempotencyStore.make_key(scope, request.path, idempotency_key)
+        stored = idempotency.begin(key, IdempotencyStore.fingerprint(request.get_data()))
+    except IdempotencyConflict as e:
+        return jsonify({"error": str(e)}), 422
+    except IdempotencyInProgress as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": str(e.retry_after)}
+    if stored is None:
+        # This request runs; its response is recorded in store_idempotent_response
+        g.idempotency_key = key
+        reset_fallback_served()
+        return None
+    status_code, body = stored
+    return Response(body, status=status_code, content_type='application/json', headers={REPLAYED_HEADER: "true"})
+
 @app.before_request
-def ensure_model_initialized():
-    global model_initialized
-    if not model_initialized:
-        if initialize_model():
-            model_initialized = True
-        else:
-            logger.error("Failed to initialize model")
+def admit_request():
+    kind = ADMISSION_KINDS.get(request.path)
+    if kind is None or request.method != 'POST':
+        return None
+    if not startup.ready:
+        return jsonify({"error": "Model is still starting up"}), 503, {"Retry-After": "5"}
+
+    user_id = identify_user(
+        request.headers.get('Authorization'), request_session_id(), request.remote_addr,
+        forwarded_user=request.headers.get(USER_HEADER),
+        forwarded_for=request.headers.get(FORWARDED_FOR_HEADER),
+        trusted_proxies=admission.trusted_proxies,
+    )
+    try:
+        with span("admission"):
+            g.admission_ticket = admission.acquire(user_id, kind)
+    except AdmissionRejected as e:
+        logger.warning(f"Shedding {kind} request of {user_id}: {e}")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    return None
+
+@app.after_request
+def record_request_timing(response):
+    # Streamed responses are measured until their headers are sent
+    trace = g.get('trace')
+    if trace is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(trace.elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+        response.headers['Server-Timing'] = trace.server_timing()
+        g.response_status = response.status_code
+    return response
+
+@app.after_request
+def store_idempotent_response(response):
+    key = g.pop('idempotency_key', None)
+    if key is None:
+        return response
+    if fallback_served():
+        # Canned or local replies after a Gemini failure are not replayed; a retry asks Gemini again
+        idempotency.abandon(key)
+    else:
+        idempotency.finish(key, response.status_code, response.get_data())
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    # Runs once the body was sent, so streamed responses log their complete breakdown
+    trace = g.pop('trace', None)
+    if trace is None:
+        return
+    profile = g.pop('profile', None)
+    profile_path = profiler.finish(profile, trace.elapsed, f"{request.method} {request.path}") if profile else None
+    if request.method != 'GET' or profile_path:
+        # Probes and scrapes are not logged
+        trace.log(g.pop('response_status', 500), profile=profile_path)
+    end_trace(g.pop('trace_token'))
+
+@app.teardown_request
+def release_admission(error=None):
+    # Runs after streamed responses have finished too (stream_with_context)
+    ticket = g.pop('admission_ticket', None)
+    if ticket:
+        ticket.release()
+
+@app.teardown_request
+def abandon_idempotent_request(error=None):
+    # Only still set when the request failed before after_request ran
+    key = g.pop('idempotency_key', None)
+    if key is not None:
+        idempotency.abandon(key)
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         "status": "AI Career Chatbot API is running",
         "model_initialized": chatbot_model is not None,
-        "endpoints": ["/chat", "/assess-career", "/status"]
+        "endpoints": ["/chat", "/chat/stream", "/assess-career", "/status", "/healthz", "/readyz", "/metrics"]
     })
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests, whether or not the model is loaded yet;
+    # fails once every startup attempt failed so the orchestrator restarts the worker
+    uptime = startup.status()["uptime_seconds"]
+    if not startup.alive:
+        return jsonify({"status": "startup failed", "error": startup.error, "uptime_seconds": uptime}), 503
+    return jsonify({"status": "alive", "uptime_seconds": uptime})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: model loaded and Gemini connections warm, so requests get normal latency
+    status_code = 200 if startup.ready else 503
+    return jsonify(startup.status()), status_code
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text format; each worker process reports its own numbers
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/status', methods=['GET'])
 def status():
     is_model_initialized = chatbot_model is not None
@@ -192,7 +443,11 @@ def status():
     return jsonify({
         "status": "AI Flask API is running",
         "model_initialized": is_model_initialized,
-        "model_info": model_info
+        "model_info": model_info,
+        "startup": startup.status(),
+        "admission": admission.stats(),
+        "profiler": profiler.stats() if profiler else None,
+        "idempotency": idempotency.stats() if idempotency else None
     })
 
 @app.route('/chat', methods=['POST'])
@@ -204,21 +459,59 @@ def chat():
 
         user_message = data.get('user_message')
         user_context = data.get('user_context', {})
+        session_id = data.get('session_id')
 
         if not user_message:
             return jsonify({"error": "No user_message provided"}), 400
 
-        response_text = chatbot_model.generate_response(user_message, user_context)
+        response_text = chatbot_model.generate_response(user_message, user_context, session_id)
 
-        return jsonify({
-            "response": response_text,
-            "status": "success"
-        })
+        with span("serialize"):
+            return jsonify({
+                "response": response_text,
+                "status": "success"
+            })
 
+    except PromptBudgetExceeded as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         return jsonify({"error": f"Failed to get response from AI: {str(e)}"}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+
+    user_message = data.get('user_message')
+    user_context = data.get('user_context', {})
+    session_id = data.get('session_id')
+
+    if not user_message:
+        return jsonify({"error": "No user_message provided"}), 400
+
+    try:
+        # Reject oversized messages before the stream starts
+        chatbot_model.prompt_budget.check_message(user_message)
+    except PromptBudgetExceeded as e:
+        return jsonify({"error": str(e)}), 413
+
+    def generate_events():
+        try:
+            for chunk in chatbot_model.generate_response_stream(user_message, user_context, session_id):
+                yield format_sse({"text": chunk})
+            yield format_sse({"status": "success"}, event="done")
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}")
+            yield format_sse({"error": f"Failed to get response from AI: {str(e)}"}, event="error")
+
+    return Response(
+        stream_with_context(generate_events()),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
 @app.route('/assess-career', methods=['POST'])
 def assess_career():
     try:
@@ -241,10 +534,11 @@ def assess_career():
 
         recommendations = chatbot_model.assess_career_fit(user_profile)
 
-        return jsonify({
-            "recommendations": recommendations,
-            "status": "success"
-        })
+        with span("serialize"):
+            return jsonify({
+                "recommendations": recommendations,
+                "status": "success"
+            })
 
     except Exception as e:
         logger.error(f"Error in assess-career endpoint: {e}")
@@ -254,7 +548,7 @@ def assess_career():
 def not_found(error):
     return jsonify({
         "error": "Endpoint not found",
-        "available_endpoints": ["/", "/chat", "/assess-career", "/status"]
+        "available_endpoints": ["/", "/chat", "/chat/stream", "/assess-career", "/status", "/healthz", "/readyz", "/metrics"]
     }), 404
 
 @app.errorhandler(500)
@@ -262,5 +556,4 @@ def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
-    initialize_model()
     app.run(host='0.0.0.0', port=5000, debug=True)
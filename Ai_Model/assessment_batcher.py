@@ -0,0 +1,160 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from google.api_core import exceptions as google_exceptions
+
+from key_pool import QuotaWaitTimeout
+from resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# One batch item: (profile id, user profile)
+BatchItem = Tuple[str, Dict]
+
+# Upper bound on the output budget of a batched call (per-profile budget x batch size)
+MAX_BATCH_OUTPUT_TOKENS = 8192
+
+# Batch errors meaning Gemini refuses calls for now: passed to every caller instead of
+# letting each one retry alone, which would multiply the calls during an outage
+UNAVAILABLE_ERRORS = (google_exceptions.ResourceExhausted, QuotaWaitTimeout, CircuitOpenError)
+
+
+class AssessmentBatcher:
+    """
+    Coalesce concurrent career assessments into one Gemini call.
+
+    Profiles submitted within `window_ms` of the first waiting one (or until
+    `max_batch` are waiting) are handed to `run_batch` together. Each caller
+    gets a Future resolving to its own recommendations, or to None when the
+    batch reply had no usable entry for that profile so the caller can fall
+    back to a single-profile request. When Gemini refused the batch (quota,
+    open breaker) the futures raise that error instead, so callers fall back
+    locally rather than retry one by one. `wait` and `wait_async` bound the
+    wait for a batch by `result_timeout`.
+    """
+
+    def __init__(self, run_batch: Callable[[List[BatchItem]], Dict[str, Any]],
+                 window_ms: float = 150, max_batch: int = 8, workers: int = 8,
+                 result_timeout: float = 45):
+        """
+        Args:
+            run_batch: Callable taking [(profile_id, profile), ...] and returning
+                {profile_id: recommendations}; missing ids count as failed items
+            window_ms: How long the first profile of a batch waits for company
+            max_batch: Maximum profiles per Gemini call
+            workers: Batches that may be in flight at the same time
+            result_timeout: Seconds a caller waits for its batch (the backend's deadline
+                on both tiers plus the window)
+        """
+        self.run_batch = run_batch
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.result_timeout = result_timeout
+
+        self._queue: "queue.Queue[Tuple[Dict, Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assessment-batch")
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.failed_items = 0
+        self.failed_batches = 0
+
+        self._collector = threading.Thread(target=self._collect, name="assessment-batcher", daemon=True)
+        self._collector.start()
+
+    @classmethod
+    def from_env(cls, run_batch: Callable[[List[BatchItem]], Dict[str, Any]]) -> Optional["AssessmentBatcher"]:
+        """Create a batcher when ASSESSMENT_BATCH_SIZE > 1 (None disables batching)."""
+        max_batch = int(os.getenv("ASSESSMENT_BATCH_SIZE", "1"))
+        if max_batch <= 1:
+            return None
+        return cls(
+            run_batch,
+            window_ms=float(os.getenv("ASSESSMENT_BATCH_WINDOW_MS", "150")),
+            max_batch=max_batch,
+            workers=int(os.getenv("ASSESSMENT_BATCH_WORKERS", "8")),
+            result_timeout=float(os.getenv("ASSESSMENT_BATCH_TIMEOUT_SECONDS", "45")),
+        )
+
+    def submit(self, user_profile: Dict) -> Future:
+        """Queue a profile for the next batch and return the Future of its recommendations."""
+        future: Future = Future()
+        self._queue.put((user_profile, future))
+        return future
+
+    def wait(self, user_profile: Dict) -> Optional[List[Dict]]:
+        """
+        Submit a profile and block until its batch finished.
+
+        Raises:
+            TimeoutError: If the batch took longer than result_timeout
+            UNAVAILABLE_ERRORS: If Gemini refused the batch
+        """
+        return self.submit(user_profile).result(self.result_timeout)
+
+    async def wait_async(self, user_profile: Dict) -> Optional[List[Dict]]:
+        """Async variant of wait."""
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(user_profile)), self.result_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+                "failed_items": self.failed_items,
+                "failed_batches": self.failed_batches,
+                "waiting": self._queue.qsize(),
+            }
+
+    def _collect(self):
+        """Group queued profiles into batches and hand them to the worker pool."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_ms / 1000
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[Dict, Future]]):
+        # Ids only need to be unique within one prompt
+        items = [(f"p{i}", profile) for i, (profile, _) in enumerate(batch)]
+
+        error = None
+        try:
+            results = self.run_batch(items) or {}
+        except Exception as e:
+            logger.error(f"Error in batched career assessment of {len(batch)} profiles: {e}")
+            results = {}
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                error = e
+            with self._lock:
+                self.failed_batches += 1
+
+        failed = 0
+        for (profile_id, _), (_, future) in zip(items, batch):
+            recommendations = results.get(profile_id)
+            if recommendations is None:
+                failed += 1
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(recommendations)
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.failed_items += failed
@@ -0,0 +1,204 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Profile fields that are free-form lists; order and case do not change the assessment
+PROFILE_LIST_FIELDS = ("interests", "skills", "work_values")
+PROFILE_TEXT_FIELDS = ("experience_level", "education")
+
+
+def canonicalize_profile(user_profile: Dict) -> Dict[str, Any]:
+    """
+    Normalize a user profile so equivalent profiles produce the same cache key.
+
+    List fields are case-folded, stripped, de-duplicated and sorted; text fields
+    are case-folded with whitespace collapsed.
+    """
+    canonical = {}
+    for field in PROFILE_LIST_FIELDS:
+        values = user_profile.get(field) or []
+        canonical[field] = sorted({" ".join(str(v).split()).casefold() for v in values} - {""})
+    for field in PROFILE_TEXT_FIELDS:
+        canonical[field] = " ".join(str(user_profile.get(field) or "").split()).casefold()
+    return canonical
+
+
+def career_data_version(career_database: Any) -> str:
+    """Version of the career data: a compiled knowledge base's label, else a hash of the database."""
+    version = getattr(career_database, "version", None)
+    if version:
+        return version
+    payload = json.dumps(career_database or {}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def config_version(model_name: str, system_prompt: str, generation_config: Dict,
+                   data_version: Optional[str] = None) -> str:
+    """Short fingerprint of everything besides the profile that shapes an assessment."""
+    config = {"model": model_name, "system_prompt": system_prompt, "generation_config": generation_config}
+    if data_version:
+        # Results cached under other career data (see career_data_version) are not reused
+        config["career_data"] = data_version
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class AssessmentCache:
+    """
+    LRU + TTL cache of career assessment results keyed on a canonical profile.
+
+    Entries live in memory and, when `persist_path` is set, are written through
+    to a SQLite file so they survive restarts and can be shared by workers on
+    the same host.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 24 * 3600,
+                 persist_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Maximum number of results kept in memory (and in the SQLite file)
+            ttl_seconds: Age after which a cached result is ignored
+            persist_path: Optional SQLite file for on-disk persistence
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if persist_path:
+            self._open_db(persist_path)
+
+    @classmethod
+    def from_env(cls) -> "AssessmentCache":
+        """Create a cache configured from ASSESSMENT_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("ASSESSMENT_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("ASSESSMENT_CACHE_TTL_SECONDS", str(24 * 3600))),
+            persist_path=os.getenv("ASSESSMENT_CACHE_PATH") or None,
+        )
+
+    @staticmethod
+    def make_key(user_profile: Dict, version: str) -> str:
+        """Build the cache key for a profile under a given model/config version."""
+        payload = json.dumps({"profile": canonicalize_profile(user_profile), "version": version}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Return a copy of the cached recommendations, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            loaded = False
+            if entry is None and self._db is not None:
+                entry = self._load_from_db(key)
+                loaded = entry is not None
+
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self._delete_from_db(key)
+                entry = None
+            elif loaded:
+                self._store(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: str, recommendations: List[Dict]):
+        """Cache recommendations for a key (and persist them if enabled)."""
+        entry = (time.time(), copy.deepcopy(recommendations))
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO assessments (key, created_at, value) VALUES (?, ?, ?)",
+                        (key, entry[0], json.dumps(recommendations, ensure_ascii=False))
+                    )
+                    self._trim_db()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error persisting assessment cache entry: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and size information."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "persistent": self._db is not None,
+            }
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _open_db(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS assessments (key TEXT PRIMARY KEY, created_at REAL, value TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS assessments_created_at ON assessments (created_at)")
+            self._db.execute("DELETE FROM assessments WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._trim_db()
+            self._db.commit()
+            logger.info(f"Assessment cache persisted to {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Error opening assessment cache at {path}: {e}")
+            self._db = None
+
+    def _trim_db(self):
+        """Delete the oldest persisted entries beyond max_entries (caller commits)."""
+        self._db.execute(
+            "DELETE FROM assessments WHERE key IN "
+            "(SELECT key FROM assessments ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def _delete_from_db(self, key: str):
+        if self._db is None:
+            return
+        try:
+            self._db.execute("DELETE FROM assessments WHERE key = ?", (key,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error deleting expired assessment cache entry: {e}")
+
+    def _load_from_db(self, key: str) -> Optional[tuple]:
+        try:
+            row = self._db.execute(
+                "SELECT created_at, value FROM assessments WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading assessment cache: {e}")
+            return None
+        if row is None:
+            return None
+        return (row[0], json.loads(row[1]))
@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from metrics import percentile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVER_COMMANDS = {
+    "flask": [sys.executable, "-m", "flask", "--app", "app", "run", "--no-reload", "--with-threads", "--port", "{port}"],
+    "fastapi": [sys.executable, "-m", "uvicorn", "main_api:app", "--log-level", "warning", "--port", "{port}"],
+}
+
+SAMPLE_INTERESTS = ["Technology", "Design", "Business", "Data", "Education", "Healthcare", "Marketing"]
+SAMPLE_SKILLS = ["Python", "Communication", "Data Analysis", "Leadership", "SQL", "Design Thinking", "Writing"]
+SAMPLE_VALUES = ["Work-life balance", "Learning opportunities", "Career growth", "Impact", "Stability"]
+SAMPLE_MESSAGES = [
+    "Saya lulusan IT dengan pengalaman 3 tahun, ingin transisi ke data science. Apa yang harus saya lakukan?",
+    "Bagaimana cara memulai karir sebagai UX designer tanpa latar belakang desain?",
+    "Skill apa yang paling dicari untuk product manager di Indonesia?",
+    "Berapa kisaran gaji software engineer junior di Jakarta?",
+]
+
+
+def chat_payload() -> Dict:
+    return {
+        "user_message": random.choice(SAMPLE_MESSAGES),
+        "user_context": {},
+        "session_id": f"bench-{random.randint(0, 999)}",
+    }
+
+
+def assess_payload() -> Dict:
+    return {
+        "interests": random.sample(SAMPLE_INTERESTS, 2),
+        "skills": random.sample(SAMPLE_SKILLS, 3),
+        "experience_level": random.choice(["Fresh graduate", "1-3 tahun", "3-5 tahun"]),
+        "education": random.choice(["S1 Informatika", "S1 Manajemen", "SMA"]),
+        "work_values": random.sample(SAMPLE_VALUES, 2),
+    }
+
+
+ENDPOINTS = {
+    "chat": ("/chat", chat_payload),
+    "assess": ("/assess-career", assess_payload),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ServerProcess:
+    """Runs one of the API servers against the fake Gemini backend."""
+
+    def __init__(self, kind: str, env_overrides: Dict[str, str]):
+        self.kind = kind
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ, GEMINI_BACKEND="fake", GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "fake-key"))
+        self.env.update(env_overrides)
+        self.process = None
+
+    def __enter__(self) -> "ServerProcess":
+        command = [part.format(port=self.port) for part in SERVER_COMMANDS[self.kind]]
+        self.process = subprocess.Popen(
+            command, cwd=BASE_DIR, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self._wait_until_ready()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def rss_mb(self) -> Optional[float]:
+        return read_rss_mb(self.process.pid)
+
+    def _wait_until_ready(self, timeout: float = 30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.kind} server exited with code {self.process.returncode}")
+            try:
+                # /status answers while the model still loads; /readyz is 200 only once it can serve
+                with urllib.request.urlopen(f"{self.base_url}/readyz", timeout=1):
+                    return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.kind} server did not become ready within {timeout}s")
+
+
+def post_json(url: str, payload: Dict, timeout: float) -> int:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_level(base_url: str, endpoint: str, concurrency: int, duration: float, timeout: float) -> Dict:
+    """Drive one endpoint with `concurrency` closed-loop clients for `duration` seconds."""
+    path, make_payload = ENDPOINTS[endpoint]
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                status = post_json(base_url + path, make_payload(), timeout)
+            except Exception:
+                status = 0
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / wall_time, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def run_benchmark(servers: List[str], endpoints: List[str], levels: List[int],
+                  duration: float, timeout: float, env_overrides: Dict[str, str]) -> List[Dict]:
+    results = []
+    for kind in servers:
+        with ServerProcess(kind, env_overrides) as server:
+            for endpoint in endpoints:
+                for concurrency in levels:
+                    rss_before = server.rss_mb()
+                    result = run_level(server.base_url, endpoint, concurrency, duration, timeout)
+                    rss_after = server.rss_mb()
+                    result.update({
+                        "server": kind,
+                        "endpoint": endpoint,
+                        "concurrency": concurrency,
+                        "rss_mb": round(rss_after, 1) if rss_after is not None else None,
+                        "rss_growth_mb": round(rss_after - rss_before, 1)
+                        if rss_before is not None and rss_after is not None else None,
+                    })
+                    results.append(result)
+                    print_row(result)
+    return results
+
+
+COLUMNS = ["server", "endpoint", "concurrency", "requests", "errors", "rps",
+           "p50_ms", "p95_ms", "p99_ms", "rss_mb", "rss_growth_mb"]
+
+
+def print_header():
+    print(" ".join(f"{column:>13}" for column in COLUMNS))
+
+
+def print_row(result: Dict):
+    print(" ".join(f"{str(result[column]):>13}" for column in COLUMNS), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the career chatbot APIs")
+    parser.add_argument("--servers", default="flask,fastapi", help="Comma-separated: flask,fastapi")
+    parser.add_argument("--endpoints", default="chat,assess", help="Comma-separated: chat,assess")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request client timeout in seconds")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Fake Gemini latency (FAKE_GEMINI_LATENCY_MS)")
+    parser.add_argument("--error-rate", type=float, default=None, help="Fake Gemini error rate (FAKE_GEMINI_ERROR_RATE)")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    env_overrides = {}
+    if args.latency_ms is not None:
+        env_overrides["FAKE_GEMINI_LATENCY_MS"] = str(args.latency_ms)
+    if args.error_rate is not None:
+        env_overrides["FAKE_GEMINI_ERROR_RATE"] = str(args.error_rate)
+
+    print_header()
+    results = run_benchmark(
+        servers=args.servers.split(","),
+        endpoints=args.endpoints.split(","),
+        levels=[int(level) for level in args.concurrency.split(",")],
+        duration=args.duration,
+        timeout=args.timeout,
+        env_overrides=env_overrides,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
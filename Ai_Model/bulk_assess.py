@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import logging
+
+from google.api_core import exceptions as google_exceptions
+
+from key_pool import QuotaWaitTimeout, TokenBucket
+from prompt_budget import PROFILE_LIST_FIELDS
+from resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Bump when the checkpoint layout changes
+CHECKPOINT_VERSION = 1
+# Separator of list fields (interests, skills, work_values) in CSV input
+CSV_LIST_SEPARATOR = ";"
+# Exit code of a run stopped by quota exhaustion (EX_TEMPFAIL); rerun the same command to resume
+EXIT_QUOTA = 75
+
+# Errors meaning Gemini will keep refusing for a while: stop and resume later instead of falling back
+QUOTA_ERRORS = (google_exceptions.ResourceExhausted, QuotaWaitTimeout, CircuitOpenError)
+
+
+class QuotaExhausted(Exception):
+    """Gemini quota ran out (or the breaker opened) while assessing a profile."""
+
+
+def read_profiles(path: str, id_field: str = "id") -> Iterator[Tuple[int, str, Dict]]:
+    """
+    Stream (index, profile_id, profile) from a CSV or JSONL file.
+
+    CSV list fields are separated by ";". Blank JSONL lines are skipped.
+    The id is taken from `id_field` and defaults to the index.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = ({field: value for field, value in row.items() if value not in (None, "")}
+                    for row in csv.DictReader(f))
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for index, row in enumerate(rows):
+            for field in PROFILE_LIST_FIELDS:
+                if isinstance(row.get(field), str):
+                    row[field] = [item.strip() for item in row[field].split(CSV_LIST_SEPARATOR) if item.strip()]
+            profile_id = str(row.pop(id_field, index))
+            yield index, profile_id, row
+
+
+def count_profiles(path: str) -> int:
+    """Number of profiles in the input (one extra pass, for progress and ETA)."""
+    return sum(1 for _ in read_profiles(path))
+
+
+class Checkpoint:
+    """
+    Progress of a bulk run, saved atomically next to the output.
+
+    Completed input indexes are kept as a watermark (every index below it is
+    done) plus the few finished out of order above it. `output_bytes` is the
+    length of the output file the checkpoint covers; on resume the output is
+    cut back to it, so results written after the last save are redone rather
+    than duplicated.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.output_bytes = 0
+        self.counters = {"ok": 0, "fallback": 0, "retries": 0}
+        self.elapsed = 0.0
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> "Checkpoint":
+        checkpoint = cls(path, input_path)
+        if not os.path.exists(path):
+            return checkpoint
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {path}")
+        if os.path.abspath(data["input"]) != os.path.abspath(input_path):
+            raise ValueError(f"Checkpoint {path} belongs to {data['input']}, not {input_path}")
+        checkpoint.watermark = data["watermark"]
+        checkpoint.done = set(data["done"])
+        checkpoint.output_bytes = data["output_bytes"]
+        checkpoint.counters.update(data["counters"])
+        checkpoint.elapsed = data["elapsed_seconds"]
+        return checkpoint
+
+    @property
+    def completed(self) -> int:
+        return self.watermark + len(self.done)
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+    def mark_done(self, index: int):
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self, output_bytes: int, elapsed: float):
+        self.output_bytes = output_bytes
+        self.elapsed = elapsed
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "input": self.input_path,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+            "output_bytes": output_bytes,
+            "counters": self.counters,
+            "elapsed_seconds": round(elapsed, 3),
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class BulkAssessment:
+    """
+    Run assess_career_fit_async over a profile file with a bounded worker pool.
+
+    `concurrency` workers take profiles from a small queue fed lazily from the
+    input, so memory stays flat for large files. Each call goes through the
+    model's Gemini backend, which already holds requests to the per-key RPM/TPM
+    limits (GEMINI_<TIER>_RPM / _TPM); `requests_per_minute` paces the run
+    below that to leave headroom for live traffic. The backend already retries
+    failed calls (GEMINI_MAX_ATTEMPTS) and falls back across tiers, so a
+    profile is tried once by default; one that fails gets the local basic
+    recommendations and is marked as a fallback. Quota errors stop the run
+    instead, after the in-flight profiles finish and progress is saved.
+    """
+
+    def __init__(self, model: Any, input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+                 concurrency: int = 8, requests_per_minute: float = 0, max_attempts: int = 1,
+                 checkpoint_every: int = 50, report_seconds: float = 10, id_field: str = "id"):
+        """
+        Args:
+            model: CareerChatbotModel or a loaded GeminiModelImplementation
+            input_path: CSV or JSONL file of profiles
+            output_path: JSONL file results are appended to
+            checkpoint_path: Progress file. Defaults to the output path plus ".checkpoint.json"
+            concurrency: Profiles assessed at the same time
+            requests_per_minute: Extra pacing of assessments (0 = only the backend's limits)
+            max_attempts: Attempts per profile before falling back to basic recommendations. Each
+                attempt is a full backend call with its own retries, so raise it only to ride out
+                malformed replies
+            checkpoint_every: Results between checkpoint saves
+            report_seconds: Interval of the progress line
+            id_field: Input field holding the profile id (default: the row number)
+        """
+        self.model = model
+        self.input_path = input_path
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.json"
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.checkpoint_every = checkpoint_every
+        self.report_seconds = report_seconds
+        self.id_field = id_field
+
+        self._pacer = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._pacer_lock: Optional[asyncio.Lock] = None
+        self._stop: Optional[asyncio.Event] = None
+        self.quota_error: Optional[Exception] = None
+
+    async def run(self) -> int:
+        """Assess every profile not yet in the checkpoint. Returns the process exit code."""
+        checkpoint = Checkpoint.load(self.checkpoint_path, self.input_path)
+        total = count_profiles(self.input_path)
+        self._pacer_lock = asyncio.Lock()
+        self._stop = asyncio.Event()
+        if checkpoint.completed:
+            print(f"Resuming: {checkpoint.completed} profiles already done", flush=True)
+
+        output = self._open_output(checkpoint.output_bytes)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.monotonic() - checkpoint.elapsed
+        run_start, run_completed = time.monotonic(), checkpoint.completed
+        unsaved = 0
+
+        def save():
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint.save(output.tell(), time.monotonic() - started)
+
+        def report():
+            done = checkpoint.completed
+            rate = (done - run_completed) / max(time.monotonic() - run_start, 1e-9)
+            eta = (total - done) / rate if rate else float("inf")
+            assessed = checkpoint.counters["ok"] + checkpoint.counters["fallback"]
+            fallback_rate = checkpoint.counters["fallback"] / assessed if assessed else 0.0
+            eta_text = f"{int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d}" if rate else "--:--:--"
+            print(f"{done}/{total} ({done / max(total, 1):.1%}) | {rate:.2f} profiles/s | ETA {eta_text} | "
+                  f"fallback {fallback_rate:.1%} | retries {checkpoint.counters['retries']}", flush=True)
+
+        async def produce():
+            for index, profile_id, profile in read_profiles(self.input_path, self.id_field):
+                if self._stop.is_set():
+                    break
+                if not checkpoint.is_done(index):
+                    await queue.put((index, profile_id, profile))
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work():
+            nonlocal unsaved
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if self._stop.is_set():
+                    continue
+                index, profile_id, profile = item
+                try:
+                    record = await self._assess(index, profile_id, profile, checkpoint)
+                except QuotaExhausted:
+                    continue
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                checkpoint.mark_done(index)
+                unsaved += 1
+                if unsaved >= self.checkpoint_every:
+                    save()
+                    unsaved = 0
+
+        async def report_loop():
+            while True:
+                await asyncio.sleep(self.report_seconds)
+                report()
+
+        reporter = asyncio.create_task(report_loop())
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+        finally:
+            reporter.cancel()
+            save()
+            output.close()
+        report()
+
+        if self.quota_error is not None:
+            print(f"Stopped on quota exhaustion ({self.quota_error}); progress saved to {self.checkpoint_path}. "
+                  f"Run the same command again to resume.", flush=True)
+            return EXIT_QUOTA
+        print(f"Done: {checkpoint.counters['ok']} assessed, {checkpoint.counters['fallback']} fallbacks, "
+              f"results in {self.output_path}", flush=True)
+        return 0
+
+    async def _assess(self, index: int, profile_id: str, profile: Dict, checkpoint: Checkpoint) -> Dict:
+        """One profile with retries; raises QuotaExhausted after stopping the run."""
+        error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                checkpoint.counters["retries"] += 1
+                # Exponential backoff with full jitter, as in resilience.ResilientCaller
+                await asyncio.sleep(random.uniform(0, min(30, 2 ** attempt)))
+            await self._pace()
+            try:
+                recommendations = await self.model.assess_career_fit_async(profile, fallback=False)
+            except QUOTA_ERRORS as e:
+                self.quota_error = e
+                self._stop.set()
+                raise QuotaExhausted() from e
+            except Exception as e:
+                error = e
+                logger.warning(f"Assessment of profile {profile_id} failed (attempt {attempt + 1}): {e}")
+                continue
+            checkpoint.counters["ok"] += 1
+            return {"index": index, "id": profile_id, "fallback": False, "recommendations": recommendations}
+
+        checkpoint.counters["fallback"] += 1
+        return {
+            "index": index,
+            "id": profile_id,
+            "fallback": True,
+            "error": str(error),
+            "recommendations": self.model.basic_recommendations(profile),
+        }
+
+    async def _pace(self):
+        if self._pacer is None:
+            return
+        async with self._pacer_lock:
+            self._pacer.refill(time.monotonic())
+            wait = self._pacer.wait_time(1)
+            if wait:
+                await asyncio.sleep(wait)
+                self._pacer.refill(time.monotonic())
+            self._pacer.take(1)
+
+    def _open_output(self, valid_bytes: int):
+        """Open the output for appending, dropping anything written after the last checkpoint."""
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(directory, exist_ok=True)
+        output = open(self.output_path, "a+b")
+        output.truncate(valid_bytes)
+        output.close()
+        return open(self.output_path, "a", encoding="utf-8")
+
+
+def load_model(config_path: Optional[str]):
+    """The model the servers use: GeminiModelImplementation for a saved config, else CareerChatbotModel."""
+    # Dry runs against the offline fake Gemini backend: GEMINI_BACKEND=fake
+    if os.getenv("GEMINI_BACKEND") == "fake":
+        from fake_gemini import install_fake_backend
+        install_fake_backend()
+    if config_path:
+        from tes_implement_gemini import GeminiModelImplementation
+        return GeminiModelImplementation(config_path)
+    from tes_gemini import CareerChatbotModel
+    return CareerChatbotModel()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Assess career fit for a file of profiles (resumable)")
+    parser.add_argument("input", help="Profiles as CSV (list fields separated by ';') or JSONL")
+    parser.add_argument("output", help="JSONL results, one line per profile")
+    parser.add_argument("--config", default=None, help="Saved model config (default: the builtin CareerChatbotModel)")
+    parser.add_argument("--checkpoint", default=None, help="Progress file (default: OUTPUT.checkpoint.json)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Profiles assessed at the same time")
+    parser.add_argument("--rpm", type=float, default=0, help="Max assessments per minute (default: backend limits only)")
+    parser.add_argument("--max-attempts", type=int, default=1,
+                        help="Attempts per profile before the local fallback (the backend retries each one)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Results between checkpoint saves")
+    parser.add_argument("--report-seconds", type=float, default=10, help="Interval of the progress line")
+    parser.add_argument("--id-field", default="id", help="Input field with the profile id (default: row number)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    bulk = BulkAssessment(
+        load_model(args.config), args.input, args.output,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        max_attempts=args.max_attempts,
+        checkpoint_every=args.checkpoint_every,
+        report_seconds=args.report_seconds,
+        id_field=args.id_field,
+    )
+    return asyncio.run(bulk.run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
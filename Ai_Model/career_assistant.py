@@ -0,0 +1,602 @@
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from assessment_batcher import MAX_BATCH_OUTPUT_TOKENS
+from assessment_cache import AssessmentCache, career_data_version, config_version
+from career_index import CareerIndex
+from career_kb import CareerKnowledgeBase
+from career_matcher import CareerMatcher
+from metrics import record_fallback
+from prompt_budget import PromptBudgetExceeded
+from recommendation_parser import RECOMMENDATION_SCHEMA
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Static part of the assessment prompt, rendered once; only the profile is formatted per request
+ASSESSMENT_OUTPUT_FORMAT = """
+Format output sebagai JSON dengan struktur:
+[
+  {
+    "career_title": "Nama Profesi",
+    "match_score": 85,
+    "reasons": ["Alasan 1", "Alasan 2"],
+    "next_steps": ["Langkah 1", "Langkah 2"],
+    "salary_range": "Range gaji",
+    "growth_prospect": "Prospek karir"
+  }
+]
+"""
+
+# Output format of batched assessments: one recommendation list per profile id
+BATCH_ASSESSMENT_OUTPUT_FORMAT = """
+Format output sebagai JSON object dengan id profil sebagai key dan daftar rekomendasinya sebagai value:
+{
+  "p0": [
+    {
+      "career_title": "Nama Profesi",
+      "match_score": 85,
+      "reasons": ["Alasan 1", "Alasan 2"],
+      "next_steps": ["Langkah 1", "Langkah 2"],
+      "salary_range": "Range gaji",
+      "growth_prospect": "Prospek karir"
+    }
+  ]
+}
+Sertakan setiap id profil di atas.
+"""
+
+
+def format_profile(user_profile: Dict, career_data: str = "") -> str:
+    """Profile lines of an assessment prompt, followed by the relevant career records (if any)."""
+    return f"""- Minat: {', '.join(user_profile.get('interests', []))}
+- Skills: {', '.join(user_profile.get('skills', []))}
+- Pengalaman: {user_profile.get('experience_level', 'Tidak disebutkan')}
+- Pendidikan: {user_profile.get('education', 'Tidak disebutkan')}
+- Work Values: {', '.join(user_profile.get('work_values', []))}
+{career_data}"""
+
+
+def build_assessment_prompt(profile_text: str) -> str:
+    """Career assessment prompt for one profile rendered by format_profile."""
+    return f"""
+Berdasarkan profil berikut, berikan 5 rekomendasi karir terbaik dengan scoring:
+
+PROFIL USER:
+{profile_text}
+""" + ASSESSMENT_OUTPUT_FORMAT
+
+
+def assessment_generation_config(generation_config: Dict, structured_output: bool = True,
+                                 response_schema: Optional[Dict] = RECOMMENDATION_SCHEMA) -> Dict:
+    """Generation config for assessments: JSON mode plus a response schema unless structured output is off."""
+    generation_config = dict(generation_config or {})
+    if structured_output:
+        generation_config['response_mime_type'] = 'application/json'
+        if response_schema:
+            generation_config['response_schema'] = response_schema
+    return generation_config
+
+
+class CareerAssistantMixin:
+    """
+    Chat, assessment and career-data logic shared by the two model classes.
+
+    CareerChatbotModel (FastAPI) and GeminiModelImplementation (Flask) differ
+    only in where their configuration comes from. Either sets up the
+    attributes used here: backend, system_prompt, generation_config,
+    safety_settings, prompt_budget, career_database, career_kb,
+    _career_index, _career_matcher, assessment_backend, session_store,
+    conversation_log, history_summary, assessment_cache, assessment_batcher,
+    structured_output and recommendation_parser.
+    """
+
+    # (career_database, its version) of the last assessment cache key
+    _career_data_fingerprint: Optional[Tuple[Any, str]] = None
+
+    def generate_response(self, user_message: str, user_context: Dict = None,
+                          session_id: Optional[str] = None) -> str:
+        """
+        Generate a response using the loaded model configuration.
+
+        Args:
+            user_message (str): User's input message
+            user_context (dict): Additional context about user
+            session_id (str, optional): Conversation session identifier. None means a stateless request
+
+        Returns:
+            str: Generated response
+        """
+        if not self.backend.ready:
+            record_fallback("chat")
+            return "Error: Model not loaded properly."
+
+        try:
+            # Build conversation context
+            conversation_context = self._build_context(user_message, user_context, session_id)
+
+            # Generate response
+            tier = self._route_chat(user_message, session_id)
+            response = self.backend.generate(
+                conversation_context,
+                tier,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings
+            )
+
+            return self._record_turn(user_message, response.text, user_context, session_id)
+
+        except PromptBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            return self._get_fallback_response()
+
+    async def generate_response_async(self, user_message: str, user_context: Dict = None,
+                                      session_id: Optional[str] = None) -> str:
+        """
+        Async variant of generate_response that does not block the event loop.
+
+        Args:
+            user_message (str): User's input message
+            user_context (dict): Additional context about user
+            session_id (str, optional): Conversation session identifier. None means a stateless request
+
+        Returns:
+            str: Generated response
+        """
+        if not self.backend.ready:
+            record_fallback("chat")
+            return "Error: Model not loaded properly."
+
+        try:
+            conversation_context = await self._build_context_async(user_message, user_context, session_id)
+
+            tier = self._route_chat(user_message, session_id)
+            response = await self.backend.generate_async(
+                conversation_context,
+                tier,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings
+            )
+
+            return self._record_turn(user_message, response.text, user_context, session_id)
+
+        except PromptBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            return self._get_fallback_response()
+
+    def generate_response_stream(self, user_message: str, user_context: Dict = None,
+                                 session_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream response chunks as they are generated.
+
+        Args:
+            user_message (str): User's input message
+            user_context (dict): Additional context about user
+            session_id (str, optional): Conversation session identifier. None means a stateless request
+
+        Yields:
+            str: Response text chunks; the turn is stored only once the stream completes
+        """
+        if not self.backend.ready:
+            record_fallback("chat")
+            yield "Error: Model not loaded properly."
+            return
+
+        chunks = []
+        try:
+            conversation_context = self._build_context(user_message, user_context, session_id)
+
+            tier = self._route_chat(user_message, session_id)
+            for text in self.backend.stream(
+                conversation_context,
+                tier,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings
+            ):
+                chunks.append(text)
+                yield text
+
+        except PromptBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            if not chunks:
+                yield self._get_fallback_response()
+            return
+
+        self._record_turn(user_message, "".join(chunks), user_context, session_id)
+
+    async def generate_response_stream_async(self, user_message: str, user_context: Dict = None,
+                                             session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Async variant of generate_response_stream for the FastAPI server.
+
+        Args:
+            user_message (str): User's input message
+            user_context (dict): Additional context about user
+            session_id (str, optional): Conversation session identifier. None means a stateless request
+
+        Yields:
+            str: Response text chunks; the turn is stored only once the stream completes
+        """
+        if not self.backend.ready:
+            record_fallback("chat")
+            yield "Error: Model not loaded properly."
+            return
+
+        chunks = []
+        try:
+            conversation_context = await self._build_context_async(user_message, user_context, session_id)
+
+            tier = self._route_chat(user_message, session_id)
+            async for text in self.backend.stream_async(
+                conversation_context,
+                tier,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings
+            ):
+                chunks.append(text)
+                yield text
+
+        except PromptBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            if not chunks:
+                yield self._get_fallback_response()
+            return
+
+        self._record_turn(user_message, "".join(chunks), user_context, session_id)
+
+    @traced("history_write")
+    def _record_turn(self, user_message: str, response_text: str, user_context: Dict = None,
+                     session_id: Optional[str] = None) -> str:
+        """Store a completed conversation turn and return the response text."""
+        turn = {
+            "user": user_message,
+            "assistant": response_text,
+            "timestamp": datetime.now().isoformat(),
+            "context": user_context
+        }
+        if self.history_summary and session_id:
+            # Position in the session, so the summary knows which turns it already folded
+            previous = self.session_store.get_history(session_id, limit=1)
+            turn["index"] = self.history_summary.next_index(session_id, previous)
+        self.session_store.append_turn(session_id, turn)
+        if self.conversation_log and session_id:
+            self.conversation_log.append(session_id, turn)
+        if self.history_summary and session_id:
+            self.history_summary.schedule(session_id, self.session_store.get_history(session_id))
+        return response_text
+
+    def _route_chat(self, user_message: str, session_id: Optional[str] = None) -> str:
+        """Pick the Gemini tier for a chat message from its length, intent and the session state."""
+        history_turns = len(self.session_store.get_history(session_id))
+        return self.backend.route("chat", user_message, history_turns)
+
+    async def _build_context_async(self, user_message: str, user_context: Dict = None,
+                                   session_id: Optional[str] = None) -> str:
+        """Build the context off the event loop when enforcing the token budget may call count_tokens."""
+        if self.history_summary:
+            return await asyncio.to_thread(self._build_context, user_message, user_context, session_id)
+        return self._build_context(user_message, user_context, session_id)
+
+    @traced("prompt_build")
+    def _build_context(self, user_message: str, user_context: Dict = None,
+                       session_id: Optional[str] = None) -> str:
+        """Build complete context for AI model."""
+
+        # Oversized messages are rejected; the user_context fields are cleaned and bounded
+        self.prompt_budget.check_message(user_message)
+        user_context = self.prompt_budget.sanitize_context(user_context)
+
+        # The static system prompt is sent as the model's system_instruction
+        context_parts = []
+
+        # Add user context if available
+        if user_context:
+            context_parts.append("\nKONTEKS USER:")
+            if user_context.get("assessment_data"):
+                assessment = user_context["assessment_data"]
+                context_parts.append(f"- Minat: {', '.join(assessment.get('interests', []))}")
+                context_parts.append(f"- Skills: {', '.join(assessment.get('skills', []))}")
+                context_parts.append(f"- Pengalaman: {assessment.get('experience_level', 'Tidak disebutkan')}")
+                context_parts.append(f"- Pendidikan: {assessment.get('education', 'Tidak disebutkan')}")
+                context_parts.append(f"- Work Values: {', '.join(assessment.get('work_values', []))}")
+
+            if user_context.get("career_stage"):
+                context_parts.append(f"- Career Stage: {user_context['career_stage']}")
+
+            if user_context.get("goals"):
+                context_parts.append(f"- Goals: {user_context['goals']}")
+
+        if context_parts:
+            context_parts = [self.prompt_budget.truncate("user_context", "\n".join(context_parts))]
+
+        # Add only the career records relevant to this message and profile
+        career_data = self._get_career_index().build_context(self._career_query_terms(user_message, user_context))
+        if career_data:
+            context_parts.append(self.prompt_budget.truncate("career_data", career_data))
+
+        def render(summary: str, recent_history: List[Dict]) -> str:
+            return self._render_context(context_parts, summary, recent_history, user_message)
+
+        # Add conversation history of this session only
+        if self.history_summary:
+            # Rolling summary plus the latest turns, trimmed to the token budget
+            recent_history = self.session_store.get_history(session_id, limit=self.history_summary.recent_turns)
+            prompt = self.history_summary.fit(
+                render, self.history_summary.get(session_id), recent_history, self.backend.count_tokens
+            )
+        else:
+            recent_history = self.session_store.get_history(session_id, limit=3)  # Last 3 conversations
+            prompt = render("", self.prompt_budget.trim_history(recent_history, self._render_turn))
+        return self.prompt_budget.finish(prompt, self.backend.count_tokens)
+
+    def _render_context(self, context_parts: List[str], summary: str, recent_history: List[Dict],
+                        user_message: str) -> str:
+        """Append the history section and the current user message to the context parts."""
+        parts = list(context_parts)
+        if summary:
+            parts.append("\nRINGKASAN PERCAKAPAN SEBELUMNYA:")
+            parts.append(summary)
+        if recent_history:
+            parts.append("\nRIWAYAT PERCAKAPAN TERBARU:")
+            for conv in recent_history:
+                parts.append(self._render_turn(conv))
+
+        # Add current user message
+        parts.append(f"\nUser: {user_message}")
+        parts.append("CareerMentorAI:")
+
+        return "\n".join(parts).lstrip()
+
+    def _render_turn(self, conv: Dict) -> str:
+        """Render one stored turn for the history section."""
+        return f"User: {conv['user']}\nCareerMentorAI: {conv['assistant'][:200]}..."
+
+    def _career_query_terms(self, user_message: str, user_context: Dict = None) -> List[str]:
+        """Collect the free text used to look up relevant careers."""
+        terms = [user_message]
+        if user_context:
+            assessment = user_context.get("assessment_data") or {}
+            terms.extend(assessment.get("interests", []))
+            terms.extend(assessment.get("skills", []))
+            if user_context.get("goals"):
+                terms.append(str(user_context["goals"]))
+        return terms
+
+    def _get_career_index(self) -> CareerIndex:
+        """Build the career inverted index, rebuilding it if the database was replaced."""
+        if self.career_kb:
+            self.career_kb.maybe_reload()
+        if self._career_index is None or self._career_index.source is not self.career_database:
+            self._career_index = CareerIndex(self.career_database)
+        return self._career_index
+
+    def _get_fallback_response(self) -> str:
+        """Fallback response when AI generation fails."""
+        record_fallback("chat")
+        return """Maaf, saya mengalami kendala teknis saat ini.
+
+Sebagai alternatif, saya tetap bisa membantu Anda dengan:
+- Memberikan informasi umum tentang berbagai profesi
+- Membantu Anda memahami skill yang dibutuhkan untuk karir tertentu
+- Memberikan panduan pengembangan karir secara umum
+
+Silakan ajukan pertanyaan spesifik Anda, dan saya akan berusaha membantu dengan pengetahuan yang ada."""
+
+    def assess_career_fit(self, user_profile: Dict) -> List[Dict]:
+        """
+        Assess career fit based on user profile.
+
+        Args:
+            user_profile: Dictionary containing user's interests, skills, etc.
+
+        Returns:
+            List of career recommendations with fit scores
+        """
+        if self.assessment_backend == "local":
+            return self.basic_recommendations(user_profile)
+        if not self.backend.ready:
+            record_fallback("assessment")
+            return self.basic_recommendations(user_profile)
+
+        cache_key = self._assessment_cache_key(user_profile)
+        cached = self.assessment_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            if self.assessment_batcher:
+                # Times out on a stuck batch; a refused batch raises, without a call of our own
+                recommendations = self.assessment_batcher.wait(user_profile)
+                if recommendations is not None:
+                    self.assessment_cache.put(cache_key, recommendations)
+                    return recommendations
+                # The batch reply had nothing usable for this profile; ask for it alone
+
+            response = self.backend.generate(
+                self._build_assessment_prompt(user_profile),
+                self.backend.route("assessment"),
+                generation_config=self._assessment_generation_config()
+            )
+            return self._parse_recommendations(response.text, user_profile, cache_key)
+
+        except Exception as e:
+            logger.error(f"Error in career assessment: {str(e)}")
+            record_fallback("assessment")
+            return self.basic_recommendations(user_profile)
+
+    async def assess_career_fit_async(self, user_profile: Dict, fallback: bool = True) -> List[Dict]:
+        """
+        Async variant of assess_career_fit that does not block the event loop.
+
+        Args:
+            user_profile: Dictionary containing user's interests, skills, etc.
+            fallback: Answer with basic recommendations when Gemini fails. If False the error is raised
+
+        Returns:
+            List of career recommendations with fit scores
+        """
+        if self.assessment_backend != "local" and not self.backend.ready and not fallback:
+            raise RuntimeError("Gemini model is not loaded")
+        if self.assessment_backend == "local":
+            return self.basic_recommendations(user_profile)
+        if not self.backend.ready:
+            record_fallback("assessment")
+            return self.basic_recommendations(user_profile)
+
+        cache_key = self._assessment_cache_key(user_profile)
+        cached = self.assessment_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            if self.assessment_batcher:
+                # Times out on a stuck batch; a refused batch raises, without a call of our own
+                recommendations = await self.assessment_batcher.wait_async(user_profile)
+                if recommendations is not None:
+                    self.assessment_cache.put(cache_key, recommendations)
+                    return recommendations
+                # The batch reply had nothing usable for this profile; ask for it alone
+
+            response = await self.backend.generate_async(
+                self._build_assessment_prompt(user_profile),
+                self.backend.route("assessment"),
+                generation_config=self._assessment_generation_config()
+            )
+            return self._parse_recommendations(response.text, user_profile, cache_key, fallback)
+
+        except Exception as e:
+            if not fallback:
+                raise
+            logger.error(f"Error in career assessment: {str(e)}")
+            record_fallback("assessment")
+            return self.basic_recommendations(user_profile)
+
+    @traced("prompt_build")
+    def _build_assessment_prompt(self, user_profile: Dict) -> str:
+        """Build the career assessment prompt for a user profile."""
+        return build_assessment_prompt(self._format_profile(user_profile))
+
+    @traced("prompt_build")
+    def _build_batch_assessment_prompt(self, items: List[Tuple[str, Dict]]) -> str:
+        """Build one assessment prompt covering several (profile_id, profile) pairs."""
+        sections = "\n".join(
+            f"\nPROFIL {profile_id}:\n{self._format_profile(user_profile)}" for profile_id, user_profile in items
+        )
+        return f"""
+Berdasarkan {len(items)} profil berikut, berikan 5 rekomendasi karir terbaik dengan scoring untuk SETIAP profil:
+{sections}
+""" + BATCH_ASSESSMENT_OUTPUT_FORMAT
+
+    def _format_profile(self, user_profile: Dict) -> str:
+        """Render a profile and its relevant career records for an assessment prompt."""
+        user_profile = self.prompt_budget.sanitize_profile(user_profile)
+        career_data = self._get_career_index().build_context(
+            list(user_profile.get('interests', [])) + list(user_profile.get('skills', [])), top_k=5
+        )
+        return format_profile(user_profile, career_data)
+
+    def _assess_batch(self, items: List[Tuple[str, Dict]]) -> Dict[str, List[Dict]]:
+        """
+        Assess several profiles with a single Gemini call (used by the AssessmentBatcher).
+
+        Returns:
+            Recommendations by profile id; profiles missing from the reply are left out
+        """
+        # Batched replies are keyed by profile id, which a response schema cannot express
+        generation_config = self._assessment_generation_config(response_schema=None)
+        generation_config['max_output_tokens'] = min(
+            MAX_BATCH_OUTPUT_TOKENS, generation_config.get('max_output_tokens', 1024) * len(items)
+        )
+        response = self.backend.generate(
+            self._build_batch_assessment_prompt(items),
+            self.backend.route("assessment"),
+            generation_config=generation_config
+        )
+        return self.recommendation_parser.parse_batch(response.text)
+
+    def _parse_recommendations(self, response_text: str, user_profile: Dict,
+                               cache_key: Optional[str] = None, fallback: bool = True) -> List[Dict]:
+        """Parse the model's JSON recommendations, falling back to basic matching."""
+        recommendations = self.recommendation_parser.parse(response_text)
+        if recommendations is None:
+            if not fallback:
+                raise ValueError("No usable recommendations in the assessment reply")
+            # Nothing usable in the reply; create structured response manually (not cached)
+            record_fallback("assessment")
+            return self.basic_recommendations(user_profile)
+
+        if cache_key:
+            self.assessment_cache.put(cache_key, recommendations)
+        return recommendations
+
+    def _assessment_generation_config(self, response_schema: Optional[Dict] = RECOMMENDATION_SCHEMA) -> Dict:
+        """Generation config for assessments: JSON mode plus a response schema unless structured output is off."""
+        return assessment_generation_config(self.generation_config, self.structured_output, response_schema)
+
+    def _assessment_cache_key(self, user_profile: Dict) -> str:
+        """Cache key for a profile under the current model, prompt, assessment config and career data."""
+        version = config_version(
+            self.backend.model_name_for("assessment"), self.system_prompt, self._assessment_generation_config(),
+            self._career_data_version()
+        )
+        return AssessmentCache.make_key(user_profile, version)
+
+    def _career_data_version(self) -> str:
+        """Version of career_database, hashed again only when the database is replaced."""
+        if self._career_data_fingerprint is None or self._career_data_fingerprint[0] is not self.career_database:
+            self._career_data_fingerprint = (self.career_database, career_data_version(self.career_database))
+        return self._career_data_fingerprint[1]
+
+    def basic_recommendations(self, user_profile: Dict) -> List[Dict]:
+        """Create local recommendations by scoring the whole career database."""
+        recommendations = self._get_career_matcher().recommend(user_profile, top_k=5)
+
+        # Add fallback recommendation
+        if not recommendations:
+            recommendations.append({
+                "career_title": "Business Analyst",
+                "match_score": 60,
+                "reasons": ["Karir yang versatile", "Cocok untuk berbagai background"],
+                "next_steps": ["Pelajari business analysis fundamentals", "Dapatkan sertifikasi"],
+                "salary_range": "Rp 8,000,000 - Rp 22,000,000/bulan",
+                "growth_prospect": "Tinggi"
+            })
+
+        return recommendations
+
+    def _install_career_kb(self, knowledge_base: CareerKnowledgeBase):
+        """Build the index and matcher of a new knowledge base version then swap them in."""
+        career_database = knowledge_base.as_database()
+        career_index, career_matcher = CareerIndex(career_database), CareerMatcher(career_database)
+        self.career_database = career_database
+        self._career_index, self._career_matcher = career_index, career_matcher
+
+    def _get_career_matcher(self) -> CareerMatcher:
+        """Compile career_database into the matcher, rebuilding it if the database was replaced."""
+        if self.career_kb:
+            self.career_kb.maybe_reload()
+        if self._career_matcher is None or self._career_matcher.source is not self.career_database:
+            self._career_matcher = CareerMatcher(self.career_database)
+        return self._career_matcher
+
+    def warm_up(self) -> Dict[str, Any]:
+        """Compile the career index/matcher and open the Gemini connections before serving traffic."""
+        self._get_career_index()
+        self._get_career_matcher()
+        return self.backend.warm_up()
+
+    async def warm_up_async(self) -> Dict[str, Any]:
+        """warm_up plus the asyncio connections used by the async methods (run on the serving loop)."""
+        results = await asyncio.to_thread(self.warm_up)
+        results.update({f"{name} (async)": ms for name, ms in (await self.backend.warm_up_async()).items()})
+        return results
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from career_kb import CareerDatabaseView
+from career_terms import expand_terms, tokenize
+
+# Posting weights per field a token came from
+REQUIRED_SKILL_WEIGHT = 1.0
+TITLE_WEIGHT = 1.0
+TRENDING_SKILL_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.3
+
+# Ignore careers that only share a weak, broad term with the query
+MIN_RELEVANCE = 0.8
+
+# Knowledge base fields and their posting weights
+INDEX_FIELDS = (
+    ("category", CATEGORY_WEIGHT),
+    ("trending_skills", TRENDING_SKILL_WEIGHT),
+    ("skills_required", REQUIRED_SKILL_WEIGHT),
+    ("title", TITLE_WEIGHT),
+)
+
+
+class CareerIndex:
+    """
+    Inverted index from normalized skill/interest tokens to career_database entries.
+
+    Used at prompt-build time to pull only the few career records relevant to
+    the user into the context, so answers are grounded in our own salary and
+    career-path data instead of long generic generations.
+    """
+
+    def __init__(self, career_database: Dict):
+        """
+        Args:
+            career_database: Nested {category: {career_key: career_data}} dictionary
+        """
+        self.source = career_database
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+
+        if isinstance(career_database, CareerDatabaseView):
+            # Read the knowledge base columns directly; every distinct string is tokenized once
+            kb = career_database.knowledge_base
+            self.careers: Sequence[Tuple[str, Dict]] = kb.entries()
+            rows, token_ids, weights, vocabulary = kb.token_entries(INDEX_FIELDS, tokenize)
+            for career_id, token_id, weight in zip(rows.tolist(), token_ids.tolist(), weights.tolist()):
+                posting = postings[vocabulary[token_id]]
+                posting[career_id] = max(posting.get(career_id, 0), weight)
+            self.postings = dict(postings)
+            return
+
+        self.careers = [
+            (category, career)
+            for category, careers in (career_database or {}).items()
+            for career in careers.values()
+        ]
+
+        def add(career_id: int, text: str, weight: float):
+            for token in tokenize(text):
+                postings[token][career_id] = max(postings[token].get(career_id, 0), weight)
+
+        for career_id, (category, career) in enumerate(self.careers):
+            add(career_id, category.replace("_", " "), CATEGORY_WEIGHT)
+            for skill in career.get("trending_skills", []):
+                add(career_id, skill, TRENDING_SKILL_WEIGHT)
+            for skill in career.get("skills_required", []):
+                add(career_id, skill, REQUIRED_SKILL_WEIGHT)
+            add(career_id, career.get("title", ""), TITLE_WEIGHT)
+
+        self.postings = dict(postings)
+
+    def search(self, texts: Iterable[str], top_k: int = 3) -> List[Tuple[str, Dict]]:
+        """
+        Find the careers most relevant to free text (messages, skills, interests).
+
+        Args:
+            texts: User-supplied strings; synonyms are expanded before lookup
+            top_k: Maximum number of careers to return
+
+        Returns:
+            (category, career_data) pairs, most relevant first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(expand_terms(texts)):
+            for career_id, weight in self.postings.get(token, {}).items():
+                scores[career_id] += weight
+
+        # Ties keep database order rather than the (hash-dependent) order the tokens were visited in
+        ranked = sorted(
+            (career_id for career_id, score in scores.items() if score >= MIN_RELEVANCE),
+            key=lambda career_id: (-scores[career_id], career_id)
+        )
+        return [self.careers[career_id] for career_id in ranked[:top_k]]
+
+    def build_context(self, texts: Iterable[str], top_k: int = 3) -> str:
+        """Render the relevant career records as a compact prompt section ("" if none)."""
+        matches = self.search(texts, top_k)
+        if not matches:
+            return ""
+
+        lines = ["\nDATA KARIR RELEVAN (gunakan untuk gaji & jalur karir):"]
+        for category, career in matches:
+            lines.append(
+                f"- {career.get('title', '')} ({category}): "
+                f"gaji {career.get('salary_range', '-')}; "
+                f"prospek {career.get('growth_prospects', '-')}; "
+                f"jalur {career.get('career_path', '-')}; "
+                f"skill inti {', '.join(career.get('skills_required', []))}; "
+                f"skill tren {', '.join(career.get('trending_skills', []))}"
+            )
+        return "\n".join(lines)
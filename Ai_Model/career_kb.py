@@ -0,0 +1,491 @@
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CKB1"
+# Bump when the binary layout changes; readers refuse newer formats
+FORMAT_VERSION = 1
+# Magic plus the length of the JSON header that follows it
+PREAMBLE = struct.Struct("<4sI")
+ALIGNMENT = 8
+
+SCALAR_FIELDS = ("title", "description", "education", "salary_range", "growth_prospects", "career_path")
+LIST_FIELDS = ("skills_required", "trending_skills")
+# Separator of list fields in CSV sources
+CSV_LIST_SEPARATOR = ";"
+
+# Seconds between checks of the artifact for a new version
+DEFAULT_RELOAD_SECONDS = 5.0
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def load_source(path: str) -> Dict[str, Dict[str, Dict]]:
+    """
+    Read a career dataset into the nested {category: {career_key: career_data}} layout.
+
+    Accepts a JSON file holding that layout (or a model config with a
+    "career_database" key, or a list of records with "category" and "key"),
+    or a CSV file with one row per career whose list fields are separated
+    by ";". A missing key is derived from the title.
+    """
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            records = list(csv.DictReader(f))
+        for record in records:
+            for field in LIST_FIELDS:
+                value = record.get(field) or ""
+                record[field] = [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "career_database" in data:
+            data = data["career_database"]
+        if isinstance(data, dict):
+            return data
+        records = data
+
+    database: Dict[str, Dict[str, Dict]] = {}
+    for record in records:
+        record = {field: value for field, value in record.items() if value not in (None, "")}
+        category = record.pop("category", "other")
+        key = record.pop("key", None) or _slug(record.get("title", ""))
+        database.setdefault(category, {})[key] = record
+    return database
+
+
+def compile_database(database: Dict[str, Dict[str, Dict]], output_path: str,
+                     version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compile a nested career database into a memory-mappable artifact.
+
+    Layout: magic, JSON header, then 8-byte aligned sections. Every string is
+    stored once in a string table (UTF-8 blob plus offsets); careers are
+    columns of string ids (-1 = missing), and list fields are CSR-style
+    offsets into a flat id array. The file is written next to the target and
+    moved into place atomically, so readers see either version but never a
+    partial file.
+
+    Args:
+        database: Nested {category: {career_key: career_data}} dictionary
+        output_path: Artifact path
+        version: Version label. Defaults to a hash of the content
+
+    Returns:
+        The artifact header
+    """
+    strings: Dict[str, int] = {}
+
+    def intern(value: Any) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    rows: List[Tuple[str, str, Dict]] = [
+        (category, key, career) for category, careers in database.items() for key, career in careers.items()
+    ]
+    columns: Dict[str, np.ndarray] = {
+        "category": np.array([intern(category) for category, _, _ in rows], dtype=np.int32),
+        "key": np.array([intern(key) for _, key, _ in rows], dtype=np.int32),
+    }
+    for field in SCALAR_FIELDS:
+        columns[field] = np.array([intern(career.get(field)) for _, _, career in rows], dtype=np.int32)
+    for field in LIST_FIELDS:
+        values = [[intern(item) for item in career.get(field, [])] for _, _, career in rows]
+        columns[f"{field}.offsets"] = np.cumsum([0] + [len(items) for items in values], dtype=np.uint32)
+        columns[f"{field}.values"] = np.array([sid for items in values for sid in items], dtype=np.int32)
+
+    encoded = [value.encode("utf-8") for value in strings]
+    columns["strings.offsets"] = np.cumsum([0] + [len(value) for value in encoded], dtype=np.uint64)
+    columns["strings.blob"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    sections, offset = {}, 0
+    for name, array in columns.items():
+        offset = _align(offset)
+        sections[name] = [offset, array.dtype.str, int(array.size)]
+        offset += array.nbytes
+
+    digest = hashlib.sha256()
+    for array in columns.values():
+        digest.update(array.tobytes())
+    header = {
+        "format": FORMAT_VERSION,
+        "version": version or digest.hexdigest()[:12],
+        "created_at": datetime.now().isoformat(),
+        "careers": len(rows),
+        "strings": len(strings),
+        "sections": sections,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    tmp_path = f"{output_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in columns.items():
+            f.write(b"\0" * (data_start + sections[name][0] - f.tell()))
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+    return header
+
+
+class CareerKnowledgeBase:
+    """
+    Read-only view of a compiled career artifact.
+
+    The file is memory-mapped and every column is a numpy view into that
+    mapping, so opening it costs no parsing and every worker process shares
+    the same page-cache pages. Strings are decoded only when a record field
+    is read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Identifies the file that was opened; a changed stamp means a new version was moved in
+        self.stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled career knowledge base")
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + header_length])
+        if header["format"] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported career knowledge base format {header['format']}")
+        self.version: str = header["version"]
+        self.created_at: str = header["created_at"]
+
+        data_start = _align(PREAMBLE.size + header_length)
+        self._columns: Dict[str, np.ndarray] = {
+            name: self._section(data_start + offset, np.dtype(dtype), count)
+            for name, (offset, dtype, count) in header["sections"].items()
+        }
+        self._string_offsets = self._columns["strings.offsets"]
+        self._blob_start = data_start + header["sections"]["strings.blob"][0]
+        self._database: Optional["CareerDatabaseView"] = None
+
+    def _section(self, offset: int, dtype: np.dtype, count: int) -> np.ndarray:
+        # An empty section may be aligned past the end of the file, where frombuffer refuses the offset
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+
+    @classmethod
+    def from_env(cls) -> Optional["CareerKnowledgeBase"]:
+        """Open the artifact at CAREER_KB_PATH (None when unset)."""
+        path = os.getenv("CAREER_KB_PATH")
+        return cls(path) if path else None
+
+    def __len__(self) -> int:
+        return len(self._columns["key"])
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id < 0:
+            return None
+        start = self._blob_start + int(self._string_offsets[string_id])
+        end = self._blob_start + int(self._string_offsets[string_id + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def field(self, row: int, field: str) -> Any:
+        """Value of one field of a career row (None when missing)."""
+        if field in LIST_FIELDS:
+            offsets = self._columns[f"{field}.offsets"]
+            values = self._columns[f"{field}.values"][offsets[row]:offsets[row + 1]]
+            return [self.string(int(string_id)) for string_id in values]
+        return self.string(int(self._columns[field][row]))
+
+    def field_entries(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, string ids) of one field over all careers; list fields give one pair per item."""
+        if field in LIST_FIELDS:
+            offsets = self._columns[f"{field}.offsets"]
+            return np.repeat(np.arange(len(self)), np.diff(offsets)), self._columns[f"{field}.values"]
+        string_ids = self._columns[field]
+        rows = np.flatnonzero(string_ids >= 0)
+        return rows, string_ids[rows]
+
+    def token_entries(self, field_weights: Iterable[Tuple[str, float]],
+                      tokenize: Callable[[str], List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """
+        (row, token id, weight) triples of the given fields, plus the token vocabulary.
+
+        Every distinct string is decoded and tokenized once, however many careers
+        share it, and the triples are gathered from the mapped columns with array
+        operations instead of going through a dict per career.
+
+        Args:
+            field_weights: (field, weight) pairs; "category" and "key" are accepted too
+            tokenize: Splits one string into tokens
+
+        Returns:
+            Rows, token ids into the vocabulary, weights, and the vocabulary
+        """
+        vocabulary: Dict[str, int] = {}
+        rows: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+        tokens: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+        weights: List[np.ndarray] = [np.empty(0)]
+        for field, weight in field_weights:
+            field_rows, string_ids = self.field_entries(field)
+            if not len(field_rows):
+                continue
+            unique_ids, inverse = np.unique(string_ids, return_inverse=True)
+            token_ids = [
+                [vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(self.string(int(string_id)))]
+                for string_id in unique_ids
+            ]
+            counts = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+            starts = np.cumsum(counts) - counts
+            flat = np.array([token_id for ids in token_ids for token_id in ids], dtype=np.int64)
+
+            # Repeat each (row, string) entry once per token of its string, then gather those tokens
+            per_entry = counts[inverse]
+            within = np.arange(per_entry.sum()) - np.repeat(np.cumsum(per_entry) - per_entry, per_entry)
+            rows.append(np.repeat(field_rows, per_entry))
+            tokens.append(flat[np.repeat(starts[inverse], per_entry) + within])
+            weights.append(np.full(len(within), float(weight)))
+        return np.concatenate(rows), np.concatenate(tokens), np.concatenate(weights), list(vocabulary)
+
+    def entries(self) -> "CareerEntries":
+        """(category, career) pairs in row order, as the careers list of CareerIndex and CareerMatcher."""
+        return CareerEntries(self)
+
+    def category_of(self, row: int) -> str:
+        return self.string(int(self._columns["category"][row]))
+
+    def key_of(self, row: int) -> str:
+        return self.string(int(self._columns["key"][row]))
+
+    def as_database(self) -> "CareerDatabaseView":
+        """The nested {category: {career_key: career}} view used in place of a career_database dict."""
+        if self._database is None:
+            self._database = CareerDatabaseView(self)
+        return self._database
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "created_at": self.created_at,
+            "careers": len(self),
+            "mapped_bytes": len(self._mmap),
+        }
+
+
+class CareerRecord(Mapping):
+    """One career of the knowledge base, read like the career dicts of career_database."""
+
+    __slots__ = ("_kb", "_row")
+
+    def __init__(self, kb: CareerKnowledgeBase, row: int):
+        self._kb = kb
+        self._row = row
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in SCALAR_FIELDS and field not in LIST_FIELDS:
+            raise KeyError(field)
+        value = self._kb.field(self._row, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for field in SCALAR_FIELDS + LIST_FIELDS:
+            if field in LIST_FIELDS or self._kb.field(self._row, field) is not None:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class CareerEntries(Sequence):
+    """(category, CareerRecord) per row of a CareerKnowledgeBase, created on access."""
+
+    __slots__ = ("_kb",)
+
+    def __init__(self, kb: CareerKnowledgeBase):
+        self._kb = kb
+
+    def __getitem__(self, row: int) -> Tuple[str, CareerRecord]:
+        if not -len(self._kb) <= row < len(self._kb):
+            raise IndexError(row)
+        row %= len(self._kb)
+        return self._kb.category_of(row), CareerRecord(self._kb, row)
+
+    def __len__(self) -> int:
+        return len(self._kb)
+
+
+class CareerDatabaseView(Mapping):
+    """
+    Read-only {category: {career_key: CareerRecord}} mapping over a CareerKnowledgeBase.
+
+    The nested dicts are built on first access; CareerIndex and CareerMatcher
+    read the knowledge base columns directly and never need them.
+    """
+
+    def __init__(self, kb: CareerKnowledgeBase):
+        self.knowledge_base = kb
+        self.version = kb.version
+        self._nested: Optional[Dict[str, Dict[str, CareerRecord]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _categories(self) -> Dict[str, Dict[str, CareerRecord]]:
+        if self._nested is None:
+            with self._lock:
+                if self._nested is None:
+                    kb = self.knowledge_base
+                    nested: Dict[str, Dict[str, CareerRecord]] = {}
+                    for row in range(len(kb)):
+                        nested.setdefault(kb.category_of(row), {})[kb.key_of(row)] = CareerRecord(kb, row)
+                    self._nested = nested
+        return self._nested
+
+    def __getitem__(self, category: str) -> Mapping:
+        return self._categories[category]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._categories)
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict]]:
+        """Plain nested dict copy (e.g. to write into a JSON config)."""
+        return {
+            category: {key: dict(record) for key, record in careers.items()}
+            for category, careers in self._categories.items()
+        }
+
+
+class CareerKBReloader:
+    """
+    Picks up new versions of a knowledge base artifact without a restart.
+
+    Callers invoke maybe_reload() on the request path; at most every
+    `check_seconds` it stats the artifact, and when a new file was moved in
+    it opens and prepares the new version on a background thread, then hands
+    it to `on_reload`. Requests keep using the old version until the swap, and
+    the old mapping is released once nothing refers to it anymore.
+    """
+
+    def __init__(self, kb: CareerKnowledgeBase, on_reload: Callable[[CareerKnowledgeBase], None],
+                 check_seconds: float = DEFAULT_RELOAD_SECONDS):
+        self.kb = kb
+        self.on_reload = on_reload
+        self.check_seconds = check_seconds
+
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._next_check = time.monotonic() + check_seconds
+        self._loading = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, career_database: Any,
+                     on_reload: Callable[[CareerKnowledgeBase], None]) -> Optional["CareerKBReloader"]:
+        """
+        Create a reloader when career_database is a knowledge base view.
+
+        CAREER_KB_RELOAD_SECONDS sets the check interval (0 disables reloading).
+        """
+        if not isinstance(career_database, CareerDatabaseView):
+            return None
+        check_seconds = float(os.getenv("CAREER_KB_RELOAD_SECONDS", str(DEFAULT_RELOAD_SECONDS)))
+        if check_seconds <= 0:
+            return None
+        return cls(career_database.knowledge_base, on_reload, check_seconds)
+
+    def maybe_reload(self):
+        """Start loading a new version if the artifact changed (cheap; call freely)."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if self._loading or now < self._next_check:
+                return
+            self._next_check = now + self.check_seconds
+            try:
+                stat = os.stat(self.kb.path)
+            except OSError as e:
+                self.last_error = str(e)
+                return
+            if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self.kb.stamp:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, name="career-kb-reload", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.kb.stats(), reloads=self.reloads, last_error=self.last_error)
+
+    def _load(self):
+        try:
+            kb = CareerKnowledgeBase(self.kb.path)
+            self.on_reload(kb)
+            self.kb = kb
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"Career knowledge base reloaded: version {kb.version}, {len(kb)} careers")
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Reloading the career knowledge base failed, keeping version {self.kb.version}: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+def as_plain_dict(career_database: Any) -> Dict:
+    """career_database as a plain nested dict, whether it is a dict or a knowledge base view."""
+    if isinstance(career_database, CareerDatabaseView):
+        return career_database.to_dict()
+    return career_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or inspect the career knowledge base artifact")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Compile a JSON/CSV dataset into an artifact")
+    build.add_argument("source", help="Dataset: nested JSON, JSON records, a model config JSON or CSV")
+    build.add_argument("output", help="Artifact path (replaced atomically; point CAREER_KB_PATH at it)")
+    build.add_argument("--version", default=None, help="Version label (default: content hash)")
+    info = subparsers.add_parser("info", help="Print the header of an artifact")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        header = compile_database(load_source(args.source), args.output, args.version)
+        print(f"Wrote {args.output}: version {header['version']}, {header['careers']} careers, "
+              f"{header['strings']} strings, {os.path.getsize(args.output)} bytes")
+    else:
+        print(json.dumps(CareerKnowledgeBase(args.path).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
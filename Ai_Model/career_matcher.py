@@ -0,0 +1,188 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from career_kb import CareerDatabaseView
+from career_terms import expand_terms, tokenize
+
+# Feature weights inside one career row
+REQUIRED_SKILL_WEIGHT = 1.0
+TRENDING_SKILL_WEIGHT = 0.5
+CATEGORY_WEIGHT = 1.0
+TITLE_WEIGHT = 0.8
+DESCRIPTION_WEIGHT = 0.4
+
+# How much each block contributes to the final match score
+SKILL_BLOCK_WEIGHT = 0.7
+INTEREST_BLOCK_WEIGHT = 0.3
+BASE_MATCH_SCORE = 50
+
+# Knowledge base fields of each block; a token seen in several fields keeps its largest weight
+SKILL_FIELDS = (("trending_skills", TRENDING_SKILL_WEIGHT), ("skills_required", REQUIRED_SKILL_WEIGHT))
+INTEREST_FIELDS = (("description", DESCRIPTION_WEIGHT), ("title", TITLE_WEIGHT), ("category", CATEGORY_WEIGHT))
+
+
+class _FeatureBlock:
+    """Row-normalized career x token matrix for one group of features."""
+
+    def __init__(self, row_count: int, rows: np.ndarray, columns: np.ndarray, weights: np.ndarray,
+                 vocabulary: Sequence[str]):
+        self.index = {token: i for i, token in enumerate(vocabulary)}
+
+        # Column-major so gathering the few columns a profile touches is cheap
+        matrix = np.zeros((row_count, len(vocabulary)), dtype=np.float32, order="F")
+        np.maximum.at(matrix, (rows, columns), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.matrix = np.asfortranarray(matrix / norms)
+
+    def score(self, tokens: Iterable[str]) -> np.ndarray:
+        """Cosine similarity of every career row against the set of profile tokens."""
+        # A token repeated in the profile (e.g. "programming" from both Python and Java) counts once
+        tokens = set(tokens)
+        columns = [self.index[token] for token in tokens if token in self.index]
+        if not columns:
+            return np.zeros(self.matrix.shape[0], dtype=np.float32)
+        # Unit-norm profile vector: unmatched tokens still count towards the norm
+        weight = np.float32(1 / np.sqrt(len(tokens)))
+        return self.matrix[:, columns].sum(axis=1) * weight
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, float]]) -> "_FeatureBlock":
+        """Block from one {token: weight} dict per career."""
+        vocabulary = sorted({token for row in rows for token in row})
+        index = {token: i for i, token in enumerate(vocabulary)}
+        entries = [(r, index[token], weight) for r, row in enumerate(rows) for token, weight in row.items()]
+        return cls(
+            len(rows),
+            np.array([entry[0] for entry in entries], dtype=np.int64),
+            np.array([entry[1] for entry in entries], dtype=np.int64),
+            np.array([entry[2] for entry in entries], dtype=np.float32),
+            vocabulary,
+        )
+
+
+class CareerMatcher:
+    """
+    Vectorized matcher that ranks every career in `career_database` against a profile.
+
+    The nested career database is compiled once into a skill block (required and
+    trending skills) and an interest block (category, title, description). A
+    profile is scored against all careers with one sparse column gather per block,
+    so ranking thousands of careers stays well under a millisecond.
+
+    A compiled knowledge base view is read column by column from the mapping
+    instead, so a worker does not build a dict per career to get its matcher.
+    """
+
+    def __init__(self, career_database: Dict):
+        """
+        Args:
+            career_database: Nested {category: {career_key: career_data}} dictionary
+        """
+        self.source = career_database
+        if isinstance(career_database, CareerDatabaseView):
+            kb = career_database.knowledge_base
+            self.careers: Sequence[Tuple[str, Dict]] = kb.entries()
+            self.skill_block = _FeatureBlock(len(kb), *kb.token_entries(SKILL_FIELDS, tokenize))
+            self.interest_block = _FeatureBlock(len(kb), *kb.token_entries(INTEREST_FIELDS, tokenize))
+            return
+
+        self.careers = [
+            (category, career)
+            for category, careers in (career_database or {}).items()
+            for career in careers.values()
+        ]
+
+        skill_rows, interest_rows = [], []
+        for category, career in self.careers:
+            skills: Dict[str, float] = {}
+            for skill in career.get("trending_skills", []):
+                for token in tokenize(skill):
+                    skills[token] = TRENDING_SKILL_WEIGHT
+            for skill in career.get("skills_required", []):
+                for token in tokenize(skill):
+                    skills[token] = REQUIRED_SKILL_WEIGHT
+            skill_rows.append(skills)
+
+            interests: Dict[str, float] = {}
+            for token in tokenize(career.get("description", "")):
+                interests[token] = DESCRIPTION_WEIGHT
+            for token in tokenize(career.get("title", "")):
+                interests[token] = TITLE_WEIGHT
+            for token in tokenize(category.replace("_", " ")):
+                interests[token] = CATEGORY_WEIGHT
+            interest_rows.append(interests)
+
+        self.skill_block = _FeatureBlock.from_rows(skill_rows)
+        self.interest_block = _FeatureBlock.from_rows(interest_rows)
+
+    def __len__(self) -> int:
+        return len(self.careers)
+
+    def score(self, user_profile: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Return per-career (skill, interest) cosine scores, in `self.careers` order."""
+        skill_tokens = expand_terms(user_profile.get("skills", []))
+        interest_tokens = expand_terms(
+            list(user_profile.get("interests", [])) + list(user_profile.get("work_values", []))
+        )
+        return self.skill_block.score(skill_tokens), self.interest_block.score(interest_tokens)
+
+    def recommend(self, user_profile: Dict, top_k: int = 5) -> List[Dict]:
+        """
+        Rank careers for a profile.
+
+        Args:
+            user_profile: Dictionary containing user's interests, skills, etc.
+            top_k: Maximum number of recommendations to return
+
+        Returns:
+            Recommendation dicts (same shape as the Gemini assessment), best first.
+            Empty when nothing in the profile matches the database.
+        """
+        if not self.careers:
+            return []
+
+        skill_scores, interest_scores = self.score(user_profile)
+        scores = SKILL_BLOCK_WEIGHT * skill_scores + INTEREST_BLOCK_WEIGHT * interest_scores
+        k = min(top_k, len(scores))
+        # Everything scoring at least the k-th best, in database order, so ties rank by that order
+        kth_best = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth_best)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+
+        user_skill_tokens = set(expand_terms(user_profile.get("skills", [])))
+        return [
+            self._to_recommendation(self.careers[i], float(scores[i]), user_skill_tokens, interest_scores[i] > 0)
+            for i in top if scores[i] > 0
+        ]
+
+    @staticmethod
+    def _to_recommendation(entry: Tuple[str, Dict], score: float, user_skill_tokens: set,
+                           interest_match: bool) -> Dict:
+        category, career = entry
+        required = career.get("skills_required", [])
+        matched = [skill for skill in required if set(tokenize(skill)) & user_skill_tokens]
+        missing = [skill for skill in required if skill not in matched]
+
+        reasons = []
+        if matched:
+            reasons.append(f"Memiliki skill yang relevan: {', '.join(matched)}")
+        if interest_match:
+            reasons.append(f"Sesuai dengan minat di bidang {category.replace('_', ' ')}")
+        if not reasons:
+            reasons.append("Skill Anda sejalan dengan tren di profesi ini")
+
+        next_steps = [f"Pelajari {skill}" for skill in missing[:2]]
+        trending = career.get("trending_skills", [])
+        if trending:
+            next_steps.append(f"Ikuti tren: {', '.join(trending[:2])}")
+
+        return {
+            "career_title": career.get("title", ""),
+            "match_score": int(round(BASE_MATCH_SCORE + (100 - BASE_MATCH_SCORE) * min(score, 1.0))),
+            "reasons": reasons,
+            "next_steps": next_steps,
+            "salary_range": career.get("salary_range", "Bervariasi"),
+            "growth_prospect": career.get("growth_prospects", "Tidak diketahui"),
+        }
@@ -0,0 +1,71 @@
+import re
+from typing import Iterable, List
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9+#]+")
+STOPWORDS = {
+    "dan", "and", "atau", "or", "the", "of", "untuk", "di", "yang", "dengan", "a", "an",
+    "saya", "aku", "ingin", "mau", "apa", "bagaimana", "cara", "ke", "dari", "ini", "itu",
+    "sebagai", "karir", "karier", "career", "tahun", "is", "to", "in", "for", "i", "my",
+}
+
+# User vocabulary (English, Indonesian, tools) -> terms used in career_database
+SYNONYMS = {
+    "python": "programming",
+    "java": "programming",
+    "javascript": "programming",
+    "coding": "programming",
+    "ngoding": "programming",
+    "pemrograman": "programming",
+    "programmer": "programming",
+    "developer": "programming",
+    "software": "programming",
+    "ml": "machine learning",
+    "ai": "machine learning",
+    "kecerdasan buatan": "machine learning",
+    "statistik": "statistics",
+    "analysis": "analytics",
+    "analisis": "analytics",
+    "analisa": "analytics",
+    "database": "sql",
+    "cloud": "cloud computing",
+    "aws": "cloud computing",
+    "gcp": "cloud computing",
+    "desain": "design",
+    "designer": "design",
+    "desainer": "design",
+    "riset pengguna": "user research",
+    "pemasaran": "marketing",
+    "media sosial": "social media",
+    "sosmed": "social media",
+    "konten": "content creation",
+    "komunikasi": "communication",
+    "bisnis": "business",
+    "teknologi": "technology",
+    "kreatif": "creative",
+    "seni": "creative",
+    "produk": "product",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-fold and split text into feature tokens ("Python/R" -> ["python", "r"])."""
+    return [token for token in TOKEN_PATTERN.findall(str(text).casefold()) if token not in STOPWORDS]
+
+
+def expand_terms(texts: Iterable[str]) -> List[str]:
+    """
+    Tokenize user-supplied text and add the canonical tokens of any synonyms found.
+
+    Both single tokens and two-word phrases are looked up, so "Python" also yields
+    "programming" and "media sosial" yields "social", "media".
+    """
+    expanded = []
+    for text in texts:
+        tokens = tokenize(text)
+        expanded.extend(tokens)
+        phrases = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for phrase in phrases:
+            canonical = SYNONYMS.get(phrase)
+            if canonical:
+                expanded.extend(tokenize(canonical))
+    return expanded
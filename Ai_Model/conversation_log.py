@@ -0,0 +1,162 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ConversationLog:
+    """
+    Append-only conversation log backed by SQLite in WAL mode.
+
+    Turns are queued by the request path and written by a background thread in
+    batches (one commit, and so one fsync, per batch). Reads are indexed by
+    session id, so sessions can be loaded lazily and history paged without
+    ever reading the whole log at startup.
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 0.2):
+        """
+        Args:
+            path: SQLite database file
+            batch_size: Maximum turns written per commit
+            flush_interval: Seconds to wait for more turns before committing a batch
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written_turns = 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._read_conn = self._connect()
+        self._read_conn.executescript("""
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                timestamp TEXT,
+                user TEXT,
+                assistant TEXT,
+                context TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id);
+        """)
+
+        self._writer = threading.Thread(target=self._run_writer, name="conversation-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> Optional["ConversationLog"]:
+        """Create a log from CONVERSATION_LOG_* environment variables (None if not configured)."""
+        path = os.getenv("CONVERSATION_LOG_PATH")
+        if not path:
+            return None
+        return cls(
+            path,
+            batch_size=int(os.getenv("CONVERSATION_LOG_BATCH_SIZE", "64")),
+            flush_interval=float(os.getenv("CONVERSATION_LOG_FLUSH_INTERVAL", "0.2")),
+        )
+
+    def append(self, session_id: str, turn: Dict[str, Any]):
+        """Queue one turn for durable storage (non-blocking)."""
+        self._queue.put((
+            session_id,
+            turn.get("timestamp"),
+            turn.get("user"),
+            turn.get("assistant"),
+            json.dumps(turn.get("context"), ensure_ascii=False, default=str),
+        ))
+
+    def load_session(self, session_id: str, limit: int) -> List[Dict]:
+        """Return the most recent `limit` turns of a session, oldest first."""
+        return list(reversed(self.page(session_id, limit=limit)))
+
+    def page(self, session_id: str, before_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        """
+        Return one page of a session's history, newest first.
+
+        Args:
+            session_id: Session identifier
+            before_id: Only return turns older than this turn id (pagination cursor)
+            limit: Page size
+
+        Returns:
+            Turn dictionaries including their "id" for the next cursor
+        """
+        query = "SELECT id, timestamp, user, assistant, context FROM turns WHERE session_id = ?"
+        params: list = [session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._read_lock:
+            rows = self._read_conn.execute(query, params).fetchall()
+        return [
+            {"id": row[0], "timestamp": row[1], "user": row[2], "assistant": row[3],
+             "context": json.loads(row[4]) if row[4] else None}
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending_writes": self._queue.qsize(),
+            "written_turns": self.written_turns,
+        }
+
+    def close(self):
+        """Flush queued turns and stop the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=10)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _run_writer(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO turns (session_id, timestamp, user, assistant, context) VALUES (?, ?, ?, ?, ?)",
+                        batch
+                    )
+                self.written_turns += len(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Error writing {len(batch)} turns to conversation log: {e}")
+        conn.close()
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import logging
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Profile headers of a batched assessment prompt ("PROFIL p3:")
+BATCH_PROFILE_PATTERN = re.compile(r"^PROFIL (p\d+):", re.MULTILINE)
+
+DEFAULT_TEXT_RESPONSE = """Terima kasih sudah bercerita tentang latar belakang Anda. Berdasarkan profil tersebut, ada beberapa jalur karir yang layak dipertimbangkan:
+
+1. Data Analyst - memanfaatkan kemampuan analisis dan pemahaman bisnis Anda.
+2. Software Engineer - cocok jika Anda menikmati problem solving dan membangun produk.
+3. Product Manager - pilihan bagus bila Anda senang berkoordinasi lintas tim.
+
+Langkah berikutnya: pilih satu jalur, ikuti kursus dasar selama 4-6 minggu, lalu buat satu proyek portofolio kecil untuk menguji minat Anda."""
+
+DEFAULT_JSON_RESPONSE = [
+    {
+        "career_title": "Data Analyst",
+        "match_score": 86,
+        "reasons": ["Kemampuan analisis yang kuat", "Minat pada teknologi"],
+        "next_steps": ["Pelajari SQL lanjutan", "Bangun dashboard portofolio"],
+        "salary_range": "Rp 7,000,000 - Rp 18,000,000/bulan",
+        "growth_prospect": "Tinggi"
+    },
+    {
+        "career_title": "Software Engineer",
+        "match_score": 80,
+        "reasons": ["Memiliki skill programming", "Sesuai dengan trend teknologi"],
+        "next_steps": ["Perkuat portfolio coding", "Pelajari framework terbaru"],
+        "salary_range": "Rp 8,000,000 - Rp 35,000,000/bulan",
+        "growth_prospect": "Sangat Tinggi"
+    }
+]
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for fake usage metadata."""
+    return max(1, len(text) // 4)
+
+
+class FakeBackendConfig:
+    """
+    Behaviour of the offline Gemini stand-in.
+
+    Latency is the full generation time of one call. Streaming calls deliver the
+    first chunk after `first_chunk_ratio` of it and spread the rest over the
+    remaining chunks.
+    """
+
+    def __init__(self, latency_ms: float = 800, latency_distribution: str = "lognormal",
+                 jitter_ms: float = 200, sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, key_rpm: int = 0, key_tpm: int = 0,
+                 stream_chunks: int = 8, first_chunk_ratio: float = 0.15,
+                 text_response: str = DEFAULT_TEXT_RESPONSE, json_response: Any = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Mean (fixed/uniform/normal) or median (lognormal) latency per call
+            latency_distribution: One of "fixed", "uniform", "normal", "lognormal"
+            jitter_ms: Half-width for "uniform", standard deviation for "normal"
+            sigma: Shape parameter for "lognormal"
+            error_rate: Probability that a call fails with 503 ServiceUnavailable
+            rate_limit_rate: Probability that a call fails with 429 ResourceExhausted
+            key_rpm: Requests per minute each API key may make before getting 429s (0 = unlimited)
+            key_tpm: Input tokens per minute each API key may use before getting 429s (0 = unlimited)
+            stream_chunks: Number of chunks a streamed response is split into
+            first_chunk_ratio: Fraction of the latency spent before the first streamed chunk
+            text_response: Canned reply for chat prompts
+            json_response: Canned reply (JSON-serializable) for assessment prompts
+            seed: Optional random seed for reproducible runs
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.jitter_ms = jitter_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.key_rpm = key_rpm
+        self.key_tpm = key_tpm
+        self.stream_chunks = max(1, stream_chunks)
+        self.first_chunk_ratio = first_chunk_ratio
+        self.text_response = text_response
+        self.json_response = DEFAULT_JSON_RESPONSE if json_response is None else json_response
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # (timestamp, input tokens) of the last minute's requests per (API key, model)
+        self._key_usage: Dict[tuple, deque] = defaultdict(deque)
+
+    @classmethod
+    def from_env(cls) -> "FakeBackendConfig":
+        """Create a config from FAKE_GEMINI_* environment variables."""
+        text_response = DEFAULT_TEXT_RESPONSE
+        json_response = None
+        responses_file = os.getenv("FAKE_GEMINI_RESPONSES_FILE")
+        if responses_file:
+            with open(responses_file, "r", encoding="utf-8") as f:
+                canned = json.load(f)
+            text_response = canned.get("text", text_response)
+            json_response = canned.get("json")
+
+        seed = os.getenv("FAKE_GEMINI_SEED")
+        return cls(
+            latency_ms=float(os.getenv("FAKE_GEMINI_LATENCY_MS", "800")),
+            latency_distribution=os.getenv("FAKE_GEMINI_LATENCY_DIST", "lognormal"),
+            jitter_ms=float(os.getenv("FAKE_GEMINI_JITTER_MS", "200")),
+            sigma=float(os.getenv("FAKE_GEMINI_SIGMA", "0.5")),
+            error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_GEMINI_RATE_LIMIT_RATE", "0")),
+            key_rpm=int(os.getenv("FAKE_GEMINI_KEY_RPM", "0")),
+            key_tpm=int(os.getenv("FAKE_GEMINI_KEY_TPM", "0")),
+            stream_chunks=int(os.getenv("FAKE_GEMINI_STREAM_CHUNKS", "8")),
+            text_response=text_response,
+            json_response=json_response,
+            seed=int(seed) if seed else None,
+        )
+
+    def sample_latency(self) -> float:
+        """Draw one call latency in seconds from the configured distribution."""
+        with self._lock:
+            if self.latency_distribution == "fixed":
+                latency_ms = self.latency_ms
+            elif self.latency_distribution == "uniform":
+                latency_ms = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.latency_distribution == "normal":
+                latency_ms = self._random.gauss(self.latency_ms, self.jitter_ms)
+            else:
+                latency_ms = self.latency_ms * self._random.lognormvariate(0, self.sigma)
+        return max(0.0, latency_ms) / 1000
+
+    def check_quota(self, api_key: Optional[str], model_name: str, tokens: int) -> Optional[Exception]:
+        """Count a request against its key's sliding one-minute quota for a model; 429 when it is used up."""
+        if not self.key_rpm and not self.key_tpm:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            usage = self._key_usage[api_key, model_name]
+            while usage and now - usage[0][0] >= 60:
+                usage.popleft()
+            over_rpm = self.key_rpm and len(usage) >= self.key_rpm
+            over_tpm = self.key_tpm and sum(used for _, used in usage) + tokens > self.key_tpm
+            if over_rpm or over_tpm:
+                return google_exceptions.ResourceExhausted(f"Fake Gemini: per-minute quota of key {api_key!r} exceeded")
+            usage.append((now, tokens))
+        return None
+
+    def sample_error(self) -> Optional[Exception]:
+        """Return the error this call should fail with, if any."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return google_exceptions.ResourceExhausted("Fake Gemini: quota exceeded")
+        if roll < self.rate_limit_rate + self.error_rate:
+            return google_exceptions.ServiceUnavailable("Fake Gemini: service unavailable")
+        return None
+
+
+class FakeResponse:
+    """Minimal stand-in for GenerateContentResponse (text, usage metadata, streaming)."""
+
+    def __init__(self, text: str, prompt_tokens: int, chunk_delays: Optional[List[float]] = None):
+        self.text = text
+        self.candidates = [SimpleNamespace(finish_reason=1, safety_ratings=[])]
+        self.prompt_feedback = SimpleNamespace(block_reason=None)
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=estimate_tokens(text),
+            total_token_count=prompt_tokens + estimate_tokens(text),
+        )
+        self._chunk_delays = chunk_delays or []
+
+    def _chunks(self) -> List[str]:
+        count = len(self._chunk_delays) or 1
+        size = -(-len(self.text) // count)
+        return [self.text[i:i + size] for i in range(0, len(self.text), size)] or [""]
+
+    def __iter__(self):
+        for delay, chunk in zip(self._chunk_delays or [0.0], self._chunks()):
+            time.sleep(delay)
+            yield FakeResponse(chunk, 0)
+
+    async def __aiter__(self):
+        for delay, chunk in zip(self._chunk_delays or [0.0], self._chunks()):
+            await asyncio.sleep(delay)
+            yield FakeResponse(chunk, 0)
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in replacement for genai.GenerativeModel that never touches the network.
+
+    Assessment prompts (JSON mime type or a prompt asking for "career_title")
+    get the canned JSON reply; everything else gets the canned text reply.
+    """
+
+    config: FakeBackendConfig = None
+
+    def __init__(self, model_name: str = "gemini-1.5-flash", generation_config: Dict = None,
+                 safety_settings: Any = None, system_instruction: Any = None, **kwargs):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self._generation_config = generation_config or {}
+        self._safety_settings = safety_settings
+        self.api_key: Optional[str] = None
+        # The system instruction is billed as input on every request, like the real API
+        self._system_tokens = estimate_tokens(self._flatten(system_instruction)) if system_instruction else 0
+        if FakeGenerativeModel.config is None:
+            FakeGenerativeModel.config = FakeBackendConfig.from_env()
+
+    def generate_content(self, contents: Any, generation_config: Dict = None,
+                         safety_settings: Any = None, stream: bool = False, **kwargs) -> FakeResponse:
+        latency, response = self._prepare(contents, generation_config, stream)
+        self._check_quota(response)
+        timeout = self._timeout(kwargs)
+        if not stream:
+            time.sleep(min(latency, timeout))
+            if latency > timeout:
+                raise google_exceptions.DeadlineExceeded("Fake Gemini: deadline exceeded")
+        error = self.config.sample_error()
+        if error:
+            raise error
+        return response
+
+    async def generate_content_async(self, contents: Any, generation_config: Dict = None,
+                                     safety_settings: Any = None, stream: bool = False,
+                                     **kwargs) -> FakeResponse:
+        latency, response = self._prepare(contents, generation_config, stream)
+        self._check_quota(response)
+        timeout = self._timeout(kwargs)
+        if not stream:
+            await asyncio.sleep(min(latency, timeout))
+            if latency > timeout:
+                raise google_exceptions.DeadlineExceeded("Fake Gemini: deadline exceeded")
+        error = self.config.sample_error()
+        if error:
+            raise error
+        return response
+
+    def use_api_key(self, api_key: str):
+        """Send this model's requests with its own key (counted against that key's quota)."""
+        self.api_key = api_key
+
+    def count_tokens(self, contents: Any, **kwargs) -> SimpleNamespace:
+        return SimpleNamespace(total_tokens=self._system_tokens + estimate_tokens(self._flatten(contents)))
+
+    async def count_tokens_async(self, contents: Any, **kwargs) -> SimpleNamespace:
+        return self.count_tokens(contents)
+
+    def _prepare(self, contents: Any, generation_config: Optional[Dict], stream: bool):
+        prompt = self._flatten(contents)
+        config = dict(self._generation_config, **(generation_config or {}))
+        wants_json = config.get("response_mime_type") == "application/json" or '"career_title"' in prompt
+        text = json.dumps(self.config.json_response, ensure_ascii=False) if wants_json else self.config.text_response
+        profile_ids = BATCH_PROFILE_PATTERN.findall(prompt)
+        if wants_json and profile_ids:
+            # Batched assessment: one recommendation list per profile id
+            text = json.dumps({profile_id: self.config.json_response for profile_id in profile_ids}, ensure_ascii=False)
+
+        latency = self.config.sample_latency()
+        chunk_delays = None
+        if stream:
+            first = latency * self.config.first_chunk_ratio
+            rest = (latency - first) / max(1, self.config.stream_chunks - 1)
+            chunk_delays = [first] + [rest] * (self.config.stream_chunks - 1)
+        return latency, FakeResponse(text, self._system_tokens + estimate_tokens(prompt), chunk_delays)
+
+    def _check_quota(self, response: FakeResponse):
+        error = self.config.check_quota(self.api_key, self.model_name, response.usage_metadata.prompt_token_count)
+        if error:
+            raise error
+
+    @staticmethod
+    def _timeout(kwargs: Dict) -> float:
+        """Per-call deadline from request_options, honoured like the real client does."""
+        timeout = (kwargs.get("request_options") or {}).get("timeout")
+        return timeout if timeout is not None else float("inf")
+
+    @staticmethod
+    def _flatten(contents: Any) -> str:
+        if isinstance(contents, str):
+            return contents
+        if isinstance(contents, (list, tuple)):
+            return "\n".join(FakeGenerativeModel._flatten(part) for part in contents)
+        if isinstance(contents, dict):
+            return FakeGenerativeModel._flatten(contents.get("parts", contents.get("text", "")))
+        return str(contents)
+
+
+def install_fake_backend(config: Optional[FakeBackendConfig] = None):
+    """
+    Route every genai.GenerativeModel created from now on to the offline stand-in.
+
+    Args:
+        config: Fake backend behaviour. If None, read from FAKE_GEMINI_* env variables
+    """
+    import google.generativeai as genai
+
+    FakeGenerativeModel.config = config or FakeBackendConfig.from_env()
+    genai.GenerativeModel = FakeGenerativeModel
+    logger.warning("Using offline fake Gemini backend (GEMINI_BACKEND=fake)")
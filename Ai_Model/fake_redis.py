@@ -0,0 +1,143 @@
+import fnmatch
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# Clients created from the same fake:// URL share one keyspace, like connections to one server
+_servers: Dict[str, "FakeRedis"] = {}
+_servers_lock = threading.Lock()
+
+
+class FakeRedis:
+    """
+    In-process stand-in for the subset of redis-py used by RedisSessionStore.
+
+    Supports list commands (rpush, lrange, ltrim, llen), expire/exists/delete,
+    scan_iter and pipelines. Values are returned as bytes, as redis-py does
+    without decode_responses.
+    """
+
+    def __init__(self):
+        self._lists: Dict[str, List[bytes]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_url(cls, url: str = "fake://") -> "FakeRedis":
+        with _servers_lock:
+            if url not in _servers:
+                _servers[url] = cls()
+            return _servers[url]
+
+    def ping(self) -> bool:
+        return True
+
+    def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._live(key)
+            if items is None:
+                items = self._lists[key] = []
+            items.extend(self._encode(value) for value in values)
+            return len(items)
+
+    def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            items = self._live(key) or []
+            return list(items[self._slice(len(items), start, end)])
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            items = self._live(key)
+            if items is not None:
+                items[:] = items[self._slice(len(items), start, end)]
+                if not items:
+                    self._delete(key)
+            return True
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._live(key) or [])
+
+    def exists(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._live(key) is not None for key in keys)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                if self._live(key) is not None:
+                    self._delete(key)
+                    deleted += 1
+            return deleted
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> Iterator[bytes]:
+        with self._lock:
+            keys = [key for key in list(self._lists) if self._live(key) is not None]
+        for key in keys:
+            if match is None or fnmatch.fnmatchcase(key, match):
+                yield key.encode("utf-8")
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def flushall(self):
+        with self._lock:
+            self._lists.clear()
+            self._expires.clear()
+
+    def _live(self, key: str) -> Optional[List[bytes]]:
+        """List stored at key, honouring expiry (caller holds the lock)."""
+        key = key.decode("utf-8") if isinstance(key, bytes) else key
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._delete(key)
+        return self._lists.get(key)
+
+    def _delete(self, key: str):
+        self._lists.pop(key, None)
+        self._expires.pop(key, None)
+
+    @staticmethod
+    def _slice(length: int, start: int, end: int) -> slice:
+        """Redis-style inclusive (possibly negative) range as a Python slice."""
+        start = max(length + start, 0) if start < 0 else start
+        end = length + end if end < 0 else end
+        if end < 0:
+            return slice(0, 0)
+        return slice(start, end + 1)
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+
+class FakePipeline:
+    """Queues commands and runs them atomically on execute()."""
+
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._commands: List = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        self._commands = []
+        return results
@@ -0,0 +1,443 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from prompt_budget import estimate_tokens
+from key_pool import KeyPool, KeySlot
+from metrics import GEMINI_TOKENS, SAFETY_BLOCKS
+from model_router import FLASH, PRO, TIERS, ModelRouter
+from prompt_cache import PromptCache, TokenUsage
+from resilience import ResilientCaller
+from single_flight import SingleFlight
+from tracing import record_span, record_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAMES = {
+    FLASH: "gemini-1.5-flash",
+    PRO: "gemini-1.5-pro",
+}
+
+# Per-key (requests, input tokens) per minute of each tier; override with GEMINI_<TIER>_RPM / _TPM
+DEFAULT_QUOTAS = {
+    FLASH: (2000, 4_000_000),
+    PRO: (1000, 4_000_000),
+}
+
+# Part of an attempt's timeout that waiting for key quota may not use up
+MIN_CALL_SECONDS = 1.0
+
+# Text sent with count_tokens to open the connections at startup
+WARM_UP_PROMPT = "ping"
+
+
+def is_safety_blocked(response: Any) -> bool:
+    """True when Gemini blocked the prompt or stopped the candidate for safety reasons."""
+    feedback = getattr(response, "prompt_feedback", None)
+    if getattr(feedback, "block_reason", None):
+        return True
+    candidates = getattr(response, "candidates", None) or []
+    if not candidates:
+        return False
+    finish_reason = getattr(candidates[0], "finish_reason", None)
+    # FinishReason.SAFETY; a proto enum in the SDK, a plain int elsewhere
+    return getattr(finish_reason, "name", None) == "SAFETY" or finish_reason == 3
+
+
+def bind_api_key(model: genai.GenerativeModel, api_key: str, for_async: bool = False):
+    """
+    Make a model send its requests with its own API key.
+
+    genai.configure() holds a single process-wide key, so models of the other
+    keys in the pool get their own generative service clients. The async
+    client is created on first async use, inside the event loop.
+    """
+    if hasattr(model, "use_api_key"):
+        # Offline stand-in: simulates each key's quota itself
+        model.use_api_key(api_key)
+        return
+
+    from google.ai import generativelanguage as glm
+
+    client_options = {"api_key": api_key}
+    if for_async:
+        model._async_client = glm.GenerativeServiceAsyncClient(client_options=client_options)
+    else:
+        model._client = glm.GenerativeServiceClient(client_options=client_options)
+
+
+class GeminiBackend:
+    """
+    Shared Gemini access layer for CareerChatbotModel, GeminiModelImplementation
+    and BasicCareerChatbot.
+
+    Holds one model per tier (flash/pro) with the static system prompt as its
+    system_instruction, and runs every call through the same pipeline:
+    single-flight coalescing, deadlines/retries/circuit breaker (one breaker per
+    tier), token accounting and per-tier latency recording for the router. A call
+    that fails on its tier is retried once on the other tier.
+
+    Every attempt first takes quota from the tier's KeyPool, which spreads calls
+    over the configured API keys and queues them while all keys are at their
+    per-minute limits.
+    """
+
+    def __init__(self, model_names: Dict[str, str] = None, router: ModelRouter = None,
+                 key_pools: Dict[str, KeyPool] = None, max_concurrency: int = 256):
+        """
+        Args:
+            model_names: Gemini model name per tier. Defaults to DEFAULT_MODEL_NAMES
+            router: Tier classifier. If None, one is created from environment variables
+            key_pools: API key pool per tier. If None, created from environment variables
+            max_concurrency: Max in-flight async Gemini calls
+        """
+        self.model_names = dict(model_names or DEFAULT_MODEL_NAMES)
+        self.router = router or ModelRouter.from_env()
+        self.key_pools = key_pools or {tier: KeyPool.from_env(tier, *DEFAULT_QUOTAS[tier]) for tier in TIERS}
+        self.max_concurrency = max_concurrency
+
+        self.system_instruction: Optional[str] = None
+        self._instruction_tokens = 0
+        # One model per (tier, key index)
+        self._models: Dict[Tuple[str, int], genai.GenerativeModel] = {}
+        self._prompt_caches: Dict[str, Optional[PromptCache]] = {}
+        # Concurrency limit for the async path (created lazily inside the event loop)
+        self._async_semaphore = None
+
+        self.resilience = {tier: ResilientCaller.from_env() for tier in TIERS}
+        self.single_flight = SingleFlight()
+        self.token_usage = TokenUsage()
+
+    @classmethod
+    def from_env(cls, max_concurrency: int = None) -> "GeminiBackend":
+        """Create a backend from GEMINI_FLASH_MODEL, GEMINI_PRO_MODEL and GEMINI_MAX_CONCURRENCY."""
+        return cls(
+            model_names={
+                FLASH: os.getenv("GEMINI_FLASH_MODEL", DEFAULT_MODEL_NAMES[FLASH]),
+                PRO: os.getenv("GEMINI_PRO_MODEL", DEFAULT_MODEL_NAMES[PRO]),
+            },
+            max_concurrency=max_concurrency or int(os.getenv("GEMINI_MAX_CONCURRENCY", "256")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        """True once configure() has created the models."""
+        return bool(self._models)
+
+    def configure(self, system_instruction: str):
+        """(Re)create the tier models with the static system prompt as their system_instruction."""
+        self.system_instruction = system_instruction
+        self._instruction_tokens = estimate_tokens(system_instruction)
+        models = {}
+        for tier, model_name in self.model_names.items():
+            for slot in self.key_pools[tier].slots:
+                model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+                if slot.api_key:
+                    bind_api_key(model, slot.api_key)
+                models[tier, slot.index] = model
+        self._models = models
+        self._prompt_caches = {
+            tier: PromptCache.from_env(model_name, system_instruction)
+            for tier, model_name in self.model_names.items()
+        }
+
+    def route(self, kind: str, message: str = "", history_turns: int = 0) -> str:
+        """Pick the tier for a request ("chat" or "assessment") and record the decision."""
+        return self.router.route(kind, message, history_turns)
+
+    def model_name_for(self, kind: str) -> str:
+        """Model name a request kind is normally routed to (e.g. for cache keys)."""
+        tier, _ = self.router.classify(kind)
+        return self.model_names[tier]
+
+    def generate(self, prompt: str, tier: str, **generate_kwargs) -> Any:
+        """
+        Call Gemini on a tier, falling back to the other tier on errors.
+
+        Raises:
+            The last error when every tier failed (CircuitOpenError while both
+            breakers are open)
+        """
+        error = None
+        for candidate in self._tier_order(tier):
+            try:
+                response = self._generate_on(candidate, prompt, generate_kwargs)
+            except Exception as e:
+                error = e
+                logger.warning(f"Gemini {candidate} call failed: {e}")
+                continue
+            if candidate != tier:
+                self.router.record_fallback(tier, candidate)
+            return response
+        raise error
+
+    async def generate_async(self, prompt: str, tier: str, **generate_kwargs) -> Any:
+        """Async variant of generate."""
+        error = None
+        for candidate in self._tier_order(tier):
+            try:
+                response = await self._generate_on_async(candidate, prompt, generate_kwargs)
+            except Exception as e:
+                error = e
+                logger.warning(f"Gemini {candidate} call failed: {e}")
+                continue
+            if candidate != tier:
+                self.router.record_fallback(tier, candidate)
+            return response
+        raise error
+
+    def stream(self, prompt: str, tier: str, **generate_kwargs) -> Iterator[str]:
+        """
+        Stream response text chunks from a tier.
+
+        Streams are not retried once a chunk was sent; a stream that fails before
+        its first chunk falls back to the other tier.
+        """
+        order = self._tier_order(tier)
+        for index, candidate in enumerate(order):
+            resilience = self.resilience[candidate]
+            sent = False
+            response = None
+            start = time.monotonic()
+            try:
+                with resilience.guard():
+                    slot, response = self._leased_call(
+                        candidate, prompt, resilience.attempt_timeout, dict(generate_kwargs, stream=True)
+                    )
+                    for chunk in response:
+                        if chunk.text:
+                            sent = True
+                            yield chunk.text
+                self._settle(candidate, slot, prompt, response)
+            except Exception as e:
+                self._record_call(candidate, start, response, ok=False)
+                if sent or index == len(order) - 1:
+                    raise
+                logger.warning(f"Gemini {candidate} stream failed: {e}")
+                continue
+
+            self._record_call(candidate, start, response, ok=True)
+            if candidate != tier:
+                self.router.record_fallback(tier, candidate)
+            return
+
+    async def stream_async(self, prompt: str, tier: str, **generate_kwargs) -> AsyncIterator[str]:
+        """Async variant of stream."""
+        order = self._tier_order(tier)
+        for index, candidate in enumerate(order):
+            resilience = self.resilience[candidate]
+            sent = False
+            response = None
+            start = time.monotonic()
+            try:
+                with resilience.guard():
+                    slot, response = await self._leased_call_async(
+                        candidate, prompt, resilience.attempt_timeout, dict(generate_kwargs, stream=True)
+                    )
+                    async for chunk in response:
+                        if chunk.text:
+                            sent = True
+                            yield chunk.text
+                self._settle(candidate, slot, prompt, response)
+            except Exception as e:
+                self._record_call(candidate, start, response, ok=False)
+                if sent or index == len(order) - 1:
+                    raise
+                logger.warning(f"Gemini {candidate} stream failed: {e}")
+                continue
+
+            self._record_call(candidate, start, response, ok=True)
+            if candidate != tier:
+                self.router.record_fallback(tier, candidate)
+            return
+
+    def count_tokens(self, prompt: str, tier: str = FLASH) -> Any:
+        """count_tokens on a tier model (includes the system instruction)."""
+        return self._models[tier, 0].count_tokens(prompt)
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Open every model's connection before serving traffic.
+
+        Sends a count_tokens call (no generation quota used) through each
+        (tier, key) model, which sets up the gRPC channel, TLS and auth, and
+        creates the context caches when enabled.
+
+        Returns:
+            Milliseconds per model, or the error message when its warm-up failed
+        """
+        results = {}
+        for (tier, index), model in self._models.items():
+            slot = self.key_pools[tier].slots[index]
+            start = time.monotonic()
+            try:
+                self._model(tier, slot)
+                model.count_tokens(WARM_UP_PROMPT, request_options={"timeout": self.resilience[tier].attempt_timeout})
+            except Exception as e:
+                logger.warning(f"Warm-up of Gemini {tier} key #{index} failed: {e}")
+                results[f"{tier}#{index}"] = str(e)
+                continue
+            results[f"{tier}#{index}"] = round((time.monotonic() - start) * 1000)
+        return results
+
+    async def warm_up_async(self) -> Dict[str, Any]:
+        """Async variant of warm_up; opens the asyncio channels, so run it on the serving event loop."""
+        results = {}
+        for (tier, index), model in self._models.items():
+            slot = self.key_pools[tier].slots[index]
+            start = time.monotonic()
+            try:
+                await self._model(tier, slot, for_async=True).count_tokens_async(
+                    WARM_UP_PROMPT, request_options={"timeout": self.resilience[tier].attempt_timeout}
+                )
+            except Exception as e:
+                logger.warning(f"Async warm-up of Gemini {tier} key #{index} failed: {e}")
+                results[f"{tier}#{index}"] = str(e)
+                continue
+            results[f"{tier}#{index}"] = round((time.monotonic() - start) * 1000)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": self.model_names,
+            "routing": self.router.stats(),
+            "calls": {tier: resilience.stats() for tier, resilience in self.resilience.items()},
+            "keys": {tier: key_pool.stats() for tier, key_pool in self.key_pools.items()},
+            "single_flight": self.single_flight.stats(),
+            "prompt_tokens": self.token_usage.stats(),
+            "prompt_cache": {
+                tier: prompt_cache.stats() for tier, prompt_cache in self._prompt_caches.items() if prompt_cache
+            } or None,
+        }
+
+    def _tier_order(self, tier: str) -> List[str]:
+        return [tier] + [other for other in TIERS if other != tier]
+
+    def _model(self, tier: str, slot: KeySlot, for_async: bool = False) -> genai.GenerativeModel:
+        """Model to send a key's requests through: the context-cached one when available."""
+        if slot.api_key is None:
+            # Cached contents live in the project of the genai.configure key only
+            prompt_cache = self._prompt_caches.get(tier)
+            cached_model = prompt_cache.get_model() if prompt_cache else None
+            if cached_model:
+                return cached_model
+
+        model = self._models[tier, slot.index]
+        if for_async and slot.api_key and getattr(model, "_async_client", None) is None:
+            bind_api_key(model, slot.api_key, for_async=True)
+        return model
+
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        """Lazily create the semaphore bounding in-flight async Gemini calls."""
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_semaphore
+
+    def _estimate_tokens(self, prompt: str) -> int:
+        return self._instruction_tokens + estimate_tokens(prompt)
+
+    def _leased_call(self, tier: str, prompt: str, timeout: float, generate_kwargs: Dict) -> Tuple[KeySlot, Any]:
+        """
+        Take quota from the tier's key pool, then call Gemini with that key.
+
+        Time spent waiting for quota counts against `timeout`, leaving at least
+        MIN_CALL_SECONDS for the call itself.
+
+        Raises:
+            QuotaWaitTimeout: If no key had quota within `timeout`
+        """
+        key_pool = self.key_pools[tier]
+        start = time.monotonic()
+        slot = key_pool.acquire(self._estimate_tokens(prompt), max(0.0, timeout - MIN_CALL_SECONDS))
+        record_span("key_wait", time.monotonic() - start)
+        try:
+            response = self._model(tier, slot).generate_content(
+                prompt, request_options={"timeout": timeout - (time.monotonic() - start)}, **generate_kwargs
+            )
+        except google_exceptions.ResourceExhausted:
+            key_pool.throttled(slot)
+            raise
+        return slot, response
+
+    async def _leased_call_async(self, tier: str, prompt: str, timeout: float,
+                                 generate_kwargs: Dict) -> Tuple[KeySlot, Any]:
+        """Async variant of _leased_call; the Gemini call itself is bounded by the concurrency semaphore."""
+        key_pool = self.key_pools[tier]
+        start = time.monotonic()
+        slot = await key_pool.acquire_async(self._estimate_tokens(prompt), max(0.0, timeout - MIN_CALL_SECONDS))
+        record_span("key_wait", time.monotonic() - start)
+        try:
+            async with self._get_async_semaphore():
+                response = await self._model(tier, slot, for_async=True).generate_content_async(
+                    prompt, request_options={"timeout": timeout - (time.monotonic() - start)}, **generate_kwargs
+                )
+        except google_exceptions.ResourceExhausted:
+            key_pool.throttled(slot)
+            raise
+        return slot, response
+
+    def _settle(self, tier: str, slot: KeySlot, prompt: str, response: Any):
+        """Replace the estimated input tokens taken from the key by the billed count."""
+        usage = getattr(response, "usage_metadata", None)
+        self.key_pools[tier].settle(slot, self._estimate_tokens(prompt), getattr(usage, "prompt_token_count", None))
+
+    def _record_call(self, tier: str, start: float, response: Any, ok: bool):
+        """Record a finished call's latency for the router and metrics, plus its tokens and safety blocks."""
+        elapsed = time.monotonic() - start
+        self.router.record_call(tier, elapsed, ok=ok)
+        record_stage("gemini_call", elapsed)
+        if response is None:
+            return
+        if is_safety_blocked(response):
+            SAFETY_BLOCKS.inc(tier=tier)
+        if not ok:
+            return
+        self.token_usage.record(response)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            GEMINI_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, tier=tier, direction="input")
+            GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, tier=tier, direction="output")
+
+    def _generate_on(self, tier: str, prompt: str, generate_kwargs: Dict) -> Any:
+        """One tier's call: single-flight shared, under that tier's retry/breaker policy."""
+        def attempt(timeout: float):
+            slot, response = self._leased_call(tier, prompt, timeout, generate_kwargs)
+            self._settle(tier, slot, prompt, response)
+            return response
+
+        def call():
+            start = time.monotonic()
+            try:
+                response = self.resilience[tier].call(attempt)
+            except Exception:
+                self._record_call(tier, start, None, ok=False)
+                raise
+            self._record_call(tier, start, response, ok=True)
+            return response
+
+        key = SingleFlight.make_key(self.model_names[tier], prompt, generate_kwargs)
+        return self.single_flight.do(key, call)
+
+    async def _generate_on_async(self, tier: str, prompt: str, generate_kwargs: Dict) -> Any:
+        async def attempt(timeout: float):
+            slot, response = await self._leased_call_async(tier, prompt, timeout, generate_kwargs)
+            self._settle(tier, slot, prompt, response)
+            return response
+
+        async def call():
+            start = time.monotonic()
+            try:
+                response = await self.resilience[tier].call_async(attempt)
+            except Exception:
+                self._record_call(tier, start, None, ok=False)
+                raise
+            self._record_call(tier, start, response, ok=True)
+            return response
+
+        key = SingleFlight.make_key(self.model_names[tier], prompt, generate_kwargs)
+        return await self.single_flight.do_async(key, call)
@@ -0,0 +1,238 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from model_router import FLASH
+from prompt_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Prompts whose local estimate is below this share of the budget skip the count_tokens round trip
+LOCAL_ESTIMATE_MARGIN = 0.5
+
+SUMMARY_PROMPT = """Perbarui ringkasan percakapan konseling karir berikut.
+
+RINGKASAN SEBELUMNYA:
+{summary}
+
+PERCAKAPAN BARU:
+{turns}
+
+Tulis ringkasan baru yang padat (maksimal {max_words} kata) dalam bahasa Indonesia. Pertahankan fakta penting tentang user: latar belakang, skill, minat, tujuan, kendala, serta rekomendasi dan keputusan yang sudah dibahas. Jawab hanya dengan ringkasannya."""
+
+
+class _SummaryState:
+    __slots__ = ("summary", "folded_through")
+
+    def __init__(self):
+        self.summary = ""
+        # Index of the newest turn already folded into the summary
+        self.folded_through = -1
+
+
+class RollingSummary:
+    """
+    Token-budgeted conversation history: a rolling summary plus the most recent turns.
+
+    After every reply the turns that just left the recent window are folded into
+    the session's summary by a background worker, so summarization never adds
+    latency to the request path. Summaries are written on the flash tier of the
+    shared GeminiBackend, so they take key quota and are bounded by its
+    deadline, retries and circuit breaker like any other call. Turns are
+    tracked by their "index" (see CareerAssistantMixin._record_turn); turns
+    without one are left out of the summary. When building a prompt, `fit`
+    enforces a maximum input size with count_tokens, dropping the oldest recent
+    turns and then shortening the summary until the prompt fits.
+    """
+
+    def __init__(self, backend: Any, recent_turns: int = 3, max_input_tokens: int = 3000,
+                 summary_max_tokens: int = 256, max_sessions: int = 10000, workers: int = 2):
+        """
+        Args:
+            backend: GeminiBackend the summaries are generated through
+            recent_turns: Turns sent verbatim; older turns are only present in the summary
+            max_input_tokens: Budget for the whole prompt, including the system instruction
+            summary_max_tokens: Output limit of one summary update
+            max_sessions: Summaries kept in memory (least recently used dropped first)
+            workers: Background summarization threads
+        """
+        self.backend = backend
+        self.recent_turns = recent_turns
+        self.max_input_tokens = max_input_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.max_sessions = max_sessions
+
+        self._states: "OrderedDict[str, _SummaryState]" = OrderedDict()
+        # Latest history per session waiting to be folded; at most one worker per session
+        self._pending: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="history-summary")
+
+        self.updates = 0
+        self.failures = 0
+        self.count_token_calls = 0
+        self.trimmed_prompts = 0
+        # Tokens count_tokens adds on top of the local estimate (mostly the system instruction)
+        self._overhead_tokens = 0
+
+    @classmethod
+    def from_env(cls, backend: Any) -> Optional["RollingSummary"]:
+        """Create a summarizer when HISTORY_MODE=summary (None keeps the plain last-turns history)."""
+        if os.getenv("HISTORY_MODE", "recent") != "summary":
+            return None
+        return cls(
+            backend=backend,
+            recent_turns=int(os.getenv("HISTORY_RECENT_TURNS", "3")),
+            max_input_tokens=int(os.getenv("HISTORY_MAX_INPUT_TOKENS", "3000")),
+            summary_max_tokens=int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "256")),
+        )
+
+    def get(self, session_id: Optional[str]) -> str:
+        """Return the current summary of a session ("" if none yet)."""
+        if not session_id:
+            return ""
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return ""
+            self._states.move_to_end(session_id)
+            return state.summary
+
+    def next_index(self, session_id: str, history: List[Dict]) -> int:
+        """
+        Index for the next turn of a session.
+
+        Follows both the newest stored turn and the newest folded one, so turns
+        restored from the conversation log (which carry no index) do not restart
+        the numbering below what the summary already covers.
+        """
+        last = history[-1].get("index", -1) if history else -1
+        with self._lock:
+            state = self._states.get(session_id)
+            folded_through = state.folded_through if state else -1
+        return max(last, folded_through) + 1
+
+    def schedule(self, session_id: Optional[str], turns: List[Dict]):
+        """
+        Queue a summary update after a reply (non-blocking).
+
+        Args:
+            session_id: Session identifier. Anonymous sessions are not summarized
+            turns: The session's stored history, oldest first
+        """
+        if not session_id:
+            return
+        with self._lock:
+            running = session_id in self._pending
+            self._pending[session_id] = turns
+        if not running:
+            self._executor.submit(self._run, session_id)
+
+    def fit(self, render: Callable[[str, List[Dict]], str], summary: str,
+            recent_turns: List[Dict], count_tokens: Callable[[str], Any]) -> str:
+        """
+        Render a prompt that fits max_input_tokens.
+
+        Args:
+            render: Callable (summary, recent_turns) -> prompt text
+            summary: Session summary
+            recent_turns: Most recent turns, oldest first
+            count_tokens: Model count_tokens method used to measure the prompt
+
+        Returns:
+            The rendered prompt, with the oldest recent turns dropped and then the
+            summary shortened as needed. A prompt that is still too large without
+            any history is returned as is.
+        """
+        recent_turns = list(recent_turns)
+        trimmed = False
+        while True:
+            prompt = render(summary, recent_turns)
+            if self._count(prompt, count_tokens) <= self.max_input_tokens:
+                break
+            if not trimmed:
+                trimmed = True
+                self.trimmed_prompts += 1
+            if recent_turns:
+                recent_turns.pop(0)
+            elif len(summary) > 200:
+                summary = summary[:len(summary) // 2].rsplit(" ", 1)[0] + " ..."
+            elif summary:
+                summary = ""
+            else:
+                break
+        return prompt
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "summary",
+                "summarized_sessions": len(self._states),
+                "pending_updates": len(self._pending),
+                "updates": self.updates,
+                "failures": self.failures,
+                "count_token_calls": self.count_token_calls,
+                "trimmed_prompts": self.trimmed_prompts,
+                "max_input_tokens": self.max_input_tokens,
+            }
+
+    def _count(self, prompt: str, count_tokens: Callable[[str], Any]) -> int:
+        estimate = estimate_tokens(prompt) + self._overhead_tokens
+        if estimate < self.max_input_tokens * LOCAL_ESTIMATE_MARGIN:
+            return estimate
+        try:
+            self.count_token_calls += 1
+            total_tokens = count_tokens(prompt).total_tokens
+        except Exception as e:
+            logger.warning(f"count_tokens failed, using local estimate: {e}")
+            return estimate
+        self._overhead_tokens = max(self._overhead_tokens, total_tokens - estimate_tokens(prompt))
+        return total_tokens
+
+    def _run(self, session_id: str):
+        """Fold pending turns for one session until no newer history was scheduled."""
+        while True:
+            with self._lock:
+                turns = self._pending[session_id]
+            try:
+                self._fold(session_id, turns)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error updating conversation summary for {session_id}: {e}")
+            with self._lock:
+                if self._pending[session_id] is turns:
+                    del self._pending[session_id]
+                    return
+
+    def _fold(self, session_id: str, turns: List[Dict]):
+        """Merge the turns that left the recent window into the session summary."""
+        with self._lock:
+            state = self._states.get(session_id) or _SummaryState()
+            summary, folded_through = state.summary, state.folded_through
+
+        older_turns = turns[:-self.recent_turns] if self.recent_turns else turns
+        new_turns = [turn for turn in older_turns if turn.get("index", -1) > folded_through]
+        if not new_turns:
+            return
+
+        prompt = SUMMARY_PROMPT.format(
+            summary=summary or "(belum ada)",
+            turns="\n".join(f"User: {turn['user']}\nCareerMentorAI: {turn['assistant']}" for turn in new_turns),
+            max_words=int(self.summary_max_tokens * 0.6),
+        )
+        response = self.backend.generate(
+            prompt, FLASH,
+            generation_config={"temperature": 0.2, "max_output_tokens": self.summary_max_tokens}
+        )
+
+        with self._lock:
+            state.summary = response.text.strip()
+            state.folded_through = new_turns[-1]["index"]
+            self._states[session_id] = state
+            self._states.move_to_end(session_id)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+            self.updates += 1
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from admission import identify_user
+from metrics import IDEMPOTENT_REPLAYS
+
+logger = logging.getLogger(__name__)
+
+# Request header carrying the client's key, and the header marking a response served from the store
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Longest accepted key; clients normally send a UUID
+MAX_KEY_LENGTH = 255
+
+# A stored response: (HTTP status, JSON body bytes)
+StoredResponse = Tuple[int, bytes]
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a request with a different body (HTTP 422)."""
+
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running after the wait limit (HTTP 409 + Retry-After)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def idempotency_scope(authorization: Optional[str] = None, session_id: Optional[str] = None,
+                      client_address: Optional[str] = None) -> str:
+    """
+    Namespace of a client's keys, so one client cannot replay another's responses.
+
+    Uses a hash of the whole Authorization header rather than the unverified
+    JWT subject identify_user trusts for fairness, then the session id and
+    client address.
+    """
+    if authorization:
+        return f"auth:{hashlib.sha256(authorization.encode('utf-8')).hexdigest()[:32]}"
+    return identify_user(None, session_id, client_address)
+
+
+class IdempotencyStore:
+    """
+    Responses of requests sent with an Idempotency-Key, for replaying client retries.
+
+    The first request with a key runs normally and its response is stored for
+    `ttl_seconds` (successful responses only, so a failed request can be
+    retried for real; the servers likewise abandon replies served from a
+    fallback after a Gemini failure). A retry arriving while the original is still running
+    attaches to it and gets the same response, waiting at most `wait_seconds`.
+    Either way the retry costs no Gemini call and adds no second turn to the
+    conversation history. Reusing a key with a different body is rejected.
+
+    Threads and asyncio tasks share the same table, like SingleFlight. The
+    store is per process: with several workers a retry is only replayed when it
+    reaches the worker that served the original.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 24 * 3600, wait_seconds: float = 60):
+        """
+        Args:
+            max_entries: Completed responses kept (least recently used dropped first)
+            ttl_seconds: How long a completed response is replayed
+            wait_seconds: How long a retry waits for the still-running original
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+
+        # key -> (body fingerprint, future of the StoredResponse, expiry or None while in flight)
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.replayed = 0
+        self.attached = 0
+        self.conflicts = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["IdempotencyStore"]:
+        """Create a store from IDEMPOTENCY_* environment variables (None if IDEMPOTENCY_TTL_SECONDS=0)."""
+        ttl_seconds = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+        if ttl_seconds <= 0:
+            return None
+        return cls(
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+            ttl_seconds=ttl_seconds,
+            wait_seconds=float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60")),
+        )
+
+    @staticmethod
+    def make_key(scope: str, path: str, idempotency_key: str) -> str:
+        """Store key of a client key, scoped to the client and the endpoint."""
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+        return f"{scope}|{path}|{idempotency_key}"
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        return hashlib.sha256(body or b"").hexdigest()
+
+    def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        Claim a key, or return the response of the request that already claimed it.
+
+        Returns:
+            None if the caller runs the request and must call finish() or
+            abandon() afterwards; otherwise the stored (status, body)
+
+        Raises:
+            IdempotencyConflict: If the key was used with a different body
+            IdempotencyInProgress: If the original request did not finish within wait_seconds
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            future = self._claim(key, fingerprint)
+            if future is None:
+                return None
+            try:
+                stored = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                raise IdempotencyInProgress(f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                                            retry_after=5)
+            if stored is not None:
+                return stored
+            # The original was abandoned; claim the key again and run the request
+
+    async def begin_async(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Async variant of `begin` that waits for the original without blocking the event loop."""
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            future = self._claim(key, fingerprint)
+            if future is None:
+                return None
+            try:
+                # Shielded: a retry that gives up must not cancel the future other retries share
+                stored = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                                timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress(f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                                            retry_after=5)
+            if stored is not None:
+                return stored
+
+    def finish(self, key: str, status_code: int, body: bytes):
+        """Record the response of a claimed key; retries waiting on it get the same response."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] is not None:
+                return
+            self._in_flight -= 1
+            future = entry[1]
+            if 200 <= status_code < 300:
+                entry[2] = time.monotonic() + self.ttl_seconds
+                self._entries.move_to_end(key)
+                self.stored += 1
+                self._evict()
+            else:
+                del self._entries[key]
+        future.set_result((status_code, body))
+
+    def abandon(self, key: str):
+        """Release a claimed key without a response (the request raised); a waiting retry runs it again."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] is not None:
+                return
+            self._in_flight -= 1
+            del self._entries[key]
+        entry[1].set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stored_responses": len(self._entries) - self._in_flight,
+                "in_flight": self._in_flight,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "stored": self.stored,
+                "replayed": self.replayed,
+                "attached": self.attached,
+                "conflicts": self.conflicts,
+                "evictions": self.evictions,
+            }
+
+    def _claim(self, key: str, fingerprint: str) -> Optional[Future]:
+        """Register the caller as the runner of a key (None), or return the future to wait on."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._entries[key] = [fingerprint, Future(), None]
+                self._in_flight += 1
+                return None
+            if entry[0] != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} was already used for a different request")
+            if entry[2] is None:
+                self.attached += 1
+                IDEMPOTENT_REPLAYS.inc(outcome="attached")
+            else:
+                self._entries.move_to_end(key)
+                self.replayed += 1
+                IDEMPOTENT_REPLAYS.inc(outcome="stored")
+            return entry[1]
+
+    def _evict(self):
+        """Drop the least recently used completed responses over max_entries (lock held)."""
+        excess = len(self._entries) - self._in_flight - self.max_entries
+        if excess <= 0:
+            return
+        completed = (key for key, entry in self._entries.items() if entry[2] is not None)
+        for key in list(itertools.islice(completed, excess)):
+            del self._entries[key]
+            self.evictions += 1
@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from resilience import LocalRejection
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep of a waiter before it re-checks the buckets
+MAX_WAIT_STEP = 0.05
+
+
+class QuotaWaitTimeout(LocalRejection):
+    """No API key had quota headroom before the caller's timeout."""
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously (capacity = one minute's allowance)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity wait for a full bucket)."""
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+    def take(self, amount: float):
+        self.available -= amount
+
+    def headroom(self) -> float:
+        return self.available / self.capacity if self.capacity else 0.0
+
+
+class KeySlot:
+    """One API key/project with its request and token buckets."""
+
+    def __init__(self, index: int, api_key: Optional[str], requests_per_minute: int, tokens_per_minute: int):
+        self.index = index
+        self.api_key = api_key
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.cooldown_until = 0.0
+        self.served = 0
+        self.throttled = 0
+
+    def wait_time(self, now: float, tokens: int) -> float:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.cooldown_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def headroom(self) -> float:
+        return min(self.requests.headroom(), self.tokens.headroom())
+
+
+class KeyPool:
+    """
+    Pool of Gemini API keys with client-side requests/tokens-per-minute limiting.
+
+    Each call takes one request and its estimated input tokens from the key
+    with the most headroom. When no key has room, callers queue in a shared
+    FIFO (threads and asyncio tasks alike) until one does, instead of failing
+    fast with a 429. A key that still gets a 429 from the API is cooled down
+    so traffic moves to the others.
+    """
+
+    def __init__(self, api_keys: List[Optional[str]], requests_per_minute: int = 1000,
+                 tokens_per_minute: int = 4_000_000, cooldown_seconds: float = 10):
+        """
+        Args:
+            api_keys: API keys/projects; None means the key set with genai.configure
+            requests_per_minute: Request quota of each key
+            tokens_per_minute: Input token quota of each key
+            cooldown_seconds: How long a key is skipped after the API throttled it
+        """
+        self.slots = [
+            KeySlot(index, api_key, requests_per_minute, tokens_per_minute)
+            for index, api_key in enumerate(api_keys or [None])
+        ]
+        self.cooldown_seconds = cooldown_seconds
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._waiters: deque = deque()
+        self._tickets = itertools.count()
+        self.waited = 0
+        self.wait_timeouts = 0
+
+    @classmethod
+    def from_env(cls, tier: str, default_rpm: int, default_tpm: int) -> "KeyPool":
+        """
+        Create the pool of one model tier.
+
+        Keys come from GEMINI_API_KEYS (comma separated; unset means the single
+        configured key). Per-key limits come from GEMINI_<TIER>_RPM / GEMINI_<TIER>_TPM.
+        """
+        api_keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+        prefix = f"GEMINI_{tier.upper()}"
+        return cls(
+            api_keys or [None],
+            requests_per_minute=int(os.getenv(f"{prefix}_RPM", str(default_rpm))),
+            tokens_per_minute=int(os.getenv(f"{prefix}_TPM", str(default_tpm))),
+            cooldown_seconds=float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "10")),
+        )
+
+    def acquire(self, tokens: int, timeout: float) -> KeySlot:
+        """
+        Take quota for one call from the key with the most headroom, waiting if needed.
+
+        Raises:
+            QuotaWaitTimeout: If no key had room within `timeout` seconds
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiters.append(ticket)
+            try:
+                waited = False
+                while True:
+                    slot, wait = self._try_take(ticket, tokens)
+                    if slot:
+                        return slot
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.wait_timeouts += 1
+                        raise QuotaWaitTimeout(f"No Gemini API key had quota within {timeout:.1f}s")
+                    if not waited:
+                        waited = True
+                        self.waited += 1
+                    self._condition.wait(min(wait, remaining))
+            finally:
+                self._leave(ticket)
+
+    async def acquire_async(self, tokens: int, timeout: float) -> KeySlot:
+        """Async variant of acquire; waits with asyncio.sleep so the event loop is never blocked."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            ticket = next(self._tickets)
+            self._waiters.append(ticket)
+        try:
+            waited = False
+            while True:
+                with self._lock:
+                    slot, wait = self._try_take(ticket, tokens)
+                    remaining = deadline - time.monotonic()
+                    if not slot and remaining <= 0:
+                        self.wait_timeouts += 1
+                    elif not slot and not waited:
+                        waited = True
+                        self.waited += 1
+                if slot:
+                    return slot
+                if remaining <= 0:
+                    raise QuotaWaitTimeout(f"No Gemini API key had quota within {timeout:.1f}s")
+                await asyncio.sleep(min(wait, remaining, MAX_WAIT_STEP))
+        finally:
+            with self._condition:
+                self._leave(ticket)
+
+    def settle(self, slot: KeySlot, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct a key's token bucket once the real prompt token count is known."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            slot.tokens.take(actual_tokens - estimated_tokens)
+
+    def throttled(self, slot: KeySlot):
+        """The API answered 429 for this key: skip it for cooldown_seconds."""
+        with self._lock:
+            slot.throttled += 1
+            slot.cooldown_until = time.monotonic() + self.cooldown_seconds
+        logger.warning(f"Gemini API key #{slot.index} throttled; cooling down for {self.cooldown_seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "keys": [
+                    {
+                        "key": slot.index,
+                        "served": slot.served,
+                        "throttled": slot.throttled,
+                        "cooling_down": slot.cooldown_until > now,
+                        "headroom": round(slot.headroom(), 3),
+                    }
+                    for slot in self.slots
+                ],
+                "waiting": len(self._waiters),
+                "waited": self.waited,
+                "wait_timeouts": self.wait_timeouts,
+            }
+
+    def _try_take(self, ticket: int, tokens: int) -> Tuple[Optional[KeySlot], float]:
+        """Take quota if this waiter is first in line and some key has room (caller holds the lock)."""
+        now = time.monotonic()
+        waits = [(slot.wait_time(now, tokens), slot) for slot in self.slots]
+        ready = [slot for wait, slot in waits if wait <= 0]
+        if not ready:
+            return None, min(wait for wait, _ in waits)
+        if self._waiters[0] != ticket:
+            # Earlier waiters go first
+            return None, MAX_WAIT_STEP
+
+        slot = max(ready, key=KeySlot.headroom)
+        slot.requests.take(1)
+        slot.tokens.take(min(tokens, slot.tokens.capacity))
+        slot.served += 1
+        return slot, 0.0
+
+    def _leave(self, ticket: int):
+        """Drop a waiter from the queue and wake the next one (caller holds the lock)."""
+        try:
+            self._waiters.remove(ticket)
+        except ValueError:
+            pass
+        self._condition.notify_all()
@@ -1,7 +1,11 @@
+import asyncio
+import json
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from starlette.background import BackgroundTask
+from typing import Awaitable, Callable, Dict, Any, List, Optional
 import os
 import sys
 
@@ -9,18 +13,42 @@ import sys
 # Asumsikan tes_gemini.py ada di direktori yang sama atau bisa diakses
 sys.path.append(os.path.dirname(__file__)) 
 
-# Impor model Anda
-# Jika Anda menggunakan CareerChatbotModel dari tes_gemini.py
-from tes_gemini import CareerChatbotModel 
-# Atau jika Anda menggunakan GeminiModelImplementation dari tes_implement_gemini.py
-from tes_implement_gemini import GeminiModelImplementation 
+# Model (tes_gemini / tes_implement_gemini) dan SDK Gemini (grpc, protobuf) tidak diimpor di sini:
+# keduanya dimuat di background saat startup agar server langsung bisa menjawab /healthz
+from sse import SSE_HEADERS, format_sse
+from admission import FORWARDED_FOR_HEADER, USER_HEADER, AdmissionController, AdmissionRejected, identify_user
+from preload import freeze, preload_enabled
+from startup import Startup
+from metrics import (CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, fallback_served, register_server_metrics,
+                     reset_fallback_served)
+from tracing import end_trace, span, start_trace
+from profiler import PROFILE_HEADER, SamplingProfiler
+from prompt_budget import PromptBudgetExceeded
+from idempotency import (IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyConflict, IdempotencyInProgress,
+                         IdempotencyStore, idempotency_scope)
 
 # Load environment variables (jika ada GOOGLE_API_KEY)
 from dotenv import load_dotenv
 load_dotenv()
 
+# Gunakan backend Gemini palsu (offline) untuk load test: GEMINI_BACKEND=fake
+if os.getenv("GEMINI_BACKEND") == "fake":
+    from fake_gemini import install_fake_backend
+    install_fake_backend()
+
+# PRELOAD_MODEL=1 dengan `gunicorn --preload -k uvicorn.workers.UvicornWorker`: data karir dimuat
+# sekali di proses master lalu dibagi copy-on-write ke semua worker. Riwayat percakapan antar worker
+# dibagi lewat SESSION_BACKEND=sqlite atau redis
+if preload_enabled():
+    from tes_gemini import CareerChatbotModel
+    CareerChatbotModel.preload()
+    freeze()
+
 app = FastAPI()
 
+# Admission control: batas request per user dan antrean fair antara /chat dan /assess-career
+admission = AdmissionController.from_env()
+
 # Configure CORS (penting untuk frontend React Anda)
 origins = [
     "http://localhost:5173",  # Ganti dengan URL frontend Anda (default Vite)  # Contoh lain
@@ -38,28 +66,95 @@ app.add_middleware(
 
 # Inisialisasi model chatbot di startup aplikasi
 # Pastikan GOOGLE_API_KEY diset di environment Anda
-chatbot_model: CareerChatbotModel # Atau GeminiModelImplementation
+chatbot_model = None  # CareerChatbotModel (atau GeminiModelImplementation), siap setelah startup
+startup = Startup.from_env()
 
-@app.on_event("startup")
-async def startup_event():
-    global chatbot_model
+# Respons request dengan header Idempotency-Key disimpan agar retry dari client tidak memanggil Gemini lagi
+idempotency = IdempotencyStore.from_env()
+
+# Ukuran riwayat percakapan dan antrean admission untuk /metrics
+register_server_metrics(admission.stats, lambda: chatbot_model.session_store.stats() if chatbot_model else None)
+
+# Profiler sampling opsional untuk request lambat (PROFILE_SAMPLE_RATE / PROFILE_ALLOW_HEADER)
+profiler = SamplingProfiler.from_env()
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # Rincian waktu per tahap (admission, prompt_build, gemini_call, ...) di header Server-Timing dan log JSON
+    trace, token = start_trace(request.method, request.url.path)
+    profile = profiler.start() if profiler and profiler.wants(request.headers.get(PROFILE_HEADER)) else None
+    status_code = 500
     try:
+        response = await call_next(request)
+        status_code = response.status_code
+    except Exception:
+        finish_trace(trace, profile, status_code)
+        raise
+    finally:
+        # Latensi per endpoint (template path, bukan URL mentah); streaming diukur sampai header terkirim
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(trace.elapsed, endpoint=getattr(route, "path", "unmatched"),
+                                method=request.method, status=status_code)
+        end_trace(token)
+    response.headers["Server-Timing"] = trace.server_timing()
+
+    # Log ditulis setelah body terkirim agar stream tercatat lengkap
+    body_iterator = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            finish_trace(trace, profile, status_code)
+
+    response.body_iterator = body_then_finish()
+    return response
+
+def finish_trace(trace, profile, status_code: int):
+    label = f"{trace.method} {trace.path}"
+    profile_path = profiler.finish(profile, trace.elapsed, label) if profile else None
+    # Probe dan scrape tidak dicatat
+    if trace.method != "GET" or profile_path:
+        trace.log(status_code, profile=profile_path)
+
+def load_model():
+    with startup.phase("imports"):
         # Jika menggunakan CareerChatbotModel
-        chatbot_model = CareerChatbotModel(api_key=os.getenv("GOOGLE_API_KEY"))
-        # Atau jika menggunakan GeminiModelImplementation (jika Anda ingin memuat dari file pkl)
-        # chatbot_model = GeminiModelImplementation(model_path="my_career_chatbot.pkl", api_key=os.getenv("GOOGLE_API_KEY"))
-        # Jika model_path tidak ditemukan, GeminiModelImplementation akan raise error.
-
-        print("Chatbot model initialized successfully!")
-    except ValueError as e:
-        raise HTTPException(status_code=500, detail=f"API Key Error: {e}. Please set GOOGLE_API_KEY environment variable.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to load chatbot model: {e}")
+        from tes_gemini import CareerChatbotModel
+        # Atau jika menggunakan GeminiModelImplementation dari tes_implement_gemini.py
+        # from tes_implement_gemini import GeminiModelImplementation
+    with startup.phase("model_load"):
+        try:
+            # Batas panggilan Gemini yang berjalan bersamaan diatur lewat GEMINI_MAX_CONCURRENCY
+            model = CareerChatbotModel(api_key=os.getenv("GOOGLE_API_KEY"))
+            # Atau jika menggunakan GeminiModelImplementation (jika Anda ingin memuat dari file config JSON)
+            # model = GeminiModelImplementation(model_path="my_career_chatbot.json", api_key=os.getenv("GOOGLE_API_KEY"))
+            # Jika model_path tidak ditemukan, GeminiModelImplementation akan raise error.
+        except ValueError as e:
+            raise RuntimeError(f"API Key Error: {e}. Please set GOOGLE_API_KEY environment variable.")
+    return model
+
+async def load_and_warm_up():
+    # Impor dan pemuatan model berjalan di thread lain; warm-up async harus di event loop server
+    model = await asyncio.to_thread(load_model)
+    with startup.phase("warm_up"):
+        warm_up = await model.warm_up_async()
+    global chatbot_model
+    chatbot_model = model
+    print("Chatbot model initialized successfully!")
+    return warm_up
+
+@app.on_event("startup")
+async def startup_event():
+    # Tidak menunggu model: server langsung menerima request, /readyz baru 200 setelah warm-up selesai
+    app.state.startup_task = asyncio.create_task(startup.run_async(load_and_warm_up))
 
 # Definisikan Pydantic models untuk request dan response
 class ChatRequest(BaseModel):
     user_message: str
     user_context: Dict[str, Any] = {}
+    session_id: Optional[str] = None  # Riwayat percakapan disimpan per sesi
 
 class ProfileAssessmentRequest(BaseModel):
     interests: List[str]
@@ -68,27 +163,177 @@ class ProfileAssessmentRequest(BaseModel):
     education: str
     work_values: List[str]
 
+async def admit(http_request: Request, kind: str, session_id: Optional[str] = None):
+    # Model belum siap (masih startup): 503 agar client mencoba lagi
+    if chatbot_model is None:
+        raise HTTPException(status_code=503, detail="Model is still starting up", headers={"Retry-After": "5"})
+    # Tunggu giliran di antrean; jika antrean terlalu panjang kembalikan 429 + Retry-After
+    user_id = identify_user(
+        http_request.headers.get("authorization"), session_id,
+        http_request.client.host if http_request.client else None,
+        forwarded_user=http_request.headers.get(USER_HEADER),
+        forwarded_for=http_request.headers.get(FORWARDED_FOR_HEADER),
+        trusted_proxies=admission.trusted_proxies,
+    )
+    try:
+        with span("admission"):
+            return await admission.acquire_async(user_id, kind)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def run_idempotent(http_request: Request, session_id: Optional[str], handler: Callable[[], Awaitable[Response]]):
+    # Tanpa Idempotency-Key request dijalankan biasa
+    idempotency_key = http_request.headers.get(IDEMPOTENCY_HEADER)
+    if idempotency is None or idempotency_key is None:
+        return await handler()
+    scope = idempotency_scope(
+        http_request.headers.get("authorization"), session_id,
+        http_request.client.host if http_request.client else None
+    )
+    try:
+        key = IdempotencyStore.make_key(scope, http_request.url.path, idempotency_key)
+        # Retry dengan key yang sama: respons tersimpan, atau menunggu request asli yang masih berjalan
+        stored = await idempotency.begin_async(key, IdempotencyStore.fingerprint(await http_request.body()))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if stored is not None:
+        status_code, body = stored
+        return Response(body, status_code=status_code, media_type="application/json", headers={REPLAYED_HEADER: "true"})
+
+    reset_fallback_served()
+    try:
+        response = await handler()
+    except HTTPException as e:
+        idempotency.finish(key, e.status_code, json.dumps({"detail": e.detail}).encode("utf-8"))
+        raise
+    except BaseException:
+        # Gagal tanpa respons (termasuk dibatalkan): retry yang menunggu menjalankan request sendiri
+        idempotency.abandon(key)
+        raise
+    if fallback_served():
+        # Jawaban cadangan saat Gemini gagal tidak disimpan; retry mencoba Gemini lagi
+        idempotency.abandon(key)
+    else:
+        idempotency.finish(key, response.status_code, response.body)
+    return response
+
 # Endpoint untuk chatting
 @app.post("/chat")
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
+    return await run_idempotent(http_request, request.session_id, lambda: chat_response(request, http_request))
+
+async def chat_response(request: ChatRequest, http_request: Request):
+    ticket = await admit(http_request, "chat", request.session_id)
     try:
-        response_text = chatbot_model.generate_response(request.user_message, request.user_context)
-        return {"response": response_text}
+        # Gunakan versi async agar satu panggilan Gemini tidak memblokir event loop
+        response_text = await chatbot_model.generate_response_async(
+            request.user_message, request.user_context, request.session_id
+        )
+        with span("serialize"):
+            return JSONResponse({"response": response_text})
+    except PromptBudgetExceeded as e:
+        # Pesan melebihi batas token prompt
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating chat response: {str(e)}")
+    finally:
+        ticket.release()
+
+# Endpoint untuk chatting dengan streaming (Server-Sent Events)
+@app.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest, http_request: Request):
+    # Slot antrean dipegang sampai stream selesai
+    ticket = await admit(http_request, "chat", request.session_id)
+    try:
+        # Tolak pesan yang terlalu panjang sebelum stream dimulai
+        chatbot_model.prompt_budget.check_message(request.user_message)
+    except PromptBudgetExceeded as e:
+        ticket.release()
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def generate_events():
+        try:
+            async for chunk in chatbot_model.generate_response_stream_async(
+                request.user_message, request.user_context, request.session_id
+            ):
+                yield format_sse({"text": chunk})
+            yield format_sse({"status": "success"}, event="done")
+        except Exception as e:
+            yield format_sse({"error": f"Error generating chat response: {str(e)}"}, event="error")
+        finally:
+            ticket.release()
+
+    # release() idempotent; background task menutup kasus stream yang tidak pernah dimulai
+    return StreamingResponse(
+        generate_events(), media_type="text/event-stream", headers=SSE_HEADERS,
+        background=BackgroundTask(ticket.release)
+    )
 
 # Endpoint untuk asesmen karir
 @app.post("/assess-career")
-async def assess_career(profile: ProfileAssessmentRequest):
+async def assess_career(profile: ProfileAssessmentRequest, http_request: Request):
+    return await run_idempotent(http_request, None, lambda: assessment_response(profile, http_request))
+
+async def assessment_response(profile: ProfileAssessmentRequest, http_request: Request):
+    ticket = await admit(http_request, "assessment")
     try:
         # Ubah Pydantic model ke dictionary yang diharapkan oleh model Python Anda
         user_profile_dict = profile.model_dump() # Menggunakan .model_dump() untuk Pydantic v2
-        recommendations = chatbot_model.assess_career_fit(user_profile_dict)
-        return {"recommendations": recommendations}
+        recommendations = await chatbot_model.assess_career_fit_async(user_profile_dict)
+        with span("serialize"):
+            return JSONResponse({"recommendations": recommendations})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error assessing career fit: {str(e)}")
+    finally:
+        ticket.release()
+
+# Liveness: proses hidup dan event loop responsif (tanpa syarat model sudah dimuat);
+# gagal (503) jika semua percobaan startup gagal agar orchestrator me-restart worker ini
+@app.get("/healthz")
+async def healthz():
+    uptime = startup.status()["uptime_seconds"]
+    if not startup.alive:
+        return JSONResponse({"status": "startup failed", "error": startup.error, "uptime_seconds": uptime},
+                            status_code=503)
+    return {"status": "alive", "uptime_seconds": uptime}
+
+# Readiness: model dimuat dan koneksi Gemini sudah hangat, jadi latensi request normal
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(startup.status(), status_code=200 if startup.ready else 503)
+
+# Metrik Prometheus
+@app.get("/metrics")
+async def metrics():
+    # Format teks Prometheus; setiap worker melaporkan angkanya sendiri. Dirender di thread lain
+    # karena statistik sesi sqlite/redis melakukan query
+    return PlainTextResponse(await asyncio.to_thread(REGISTRY.render), media_type=CONTENT_TYPE)
 
 # Endpoint sederhana untuk cek status
 @app.get("/status")
 async def get_status():
-    return {"status": "Career Chatbot API is running", "model_initialized": True if 'chatbot_model' in globals() else False}
\ No newline at end of file
+    model_initialized = chatbot_model is not None
+    status = {"status": "Career Chatbot API is running", "model_initialized": model_initialized}
+    # Durasi impor, pemuatan model dan warm-up
+    status["startup"] = startup.status()
+    # Kedalaman antrean, waktu tunggu dan jumlah request yang ditolak (429)
+    status["admission"] = admission.stats()
+    # Jumlah request yang diprofil dan profil yang ditulis (None jika profiler tidak aktif)
+    status["profiler"] = profiler.stats() if profiler else None
+    # Respons tersimpan untuk Idempotency-Key dan retry yang dijawab tanpa memanggil Gemini lagi
+    status["idempotency"] = idempotency.stats() if idempotency else None
+    if model_initialized:
+        # Statistik cache asesmen (hit/miss) untuk memantau efektivitas cache
+        status["assessment_cache"] = chatbot_model.assessment_cache.stats()
+        # Statistik micro-batching asesmen (None jika tidak aktif)
+        if chatbot_model.assessment_batcher:
+            status["assessment_batcher"] = chatbot_model.assessment_batcher.stats()
+        # Tingkat panggilan Gemini yang terbuang karena output asesmen tidak bisa diparse
+        status["assessment_parsing"] = chatbot_model.recommendation_parser.stats()
+        # Batas token per bagian prompt dan kalibrasi estimasi token lokal
+        status["prompt_budget"] = chatbot_model.prompt_budget.stats()
+        # Routing model, latensi per tier, circuit breaker, retry dan hedging panggilan Gemini
+        status["gemini"] = chatbot_model.backend.stats()
+    return status
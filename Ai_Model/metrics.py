@@ -0,0 +1,373 @@
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a local prompt build up to a slow pro-tier call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# A collector callback returns one value, or (labels, value) pairs
+Samples = Union[float, Iterable[Tuple[Dict[str, Any], float]]]
+
+# Results of once_per_render sources during the current MetricsRegistry.render call
+_render_results: ContextVar[Optional[Dict[Any, Any]]] = ContextVar("render_results", default=None)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._lines()
+
+    @abstractmethod
+    def _lines(self) -> List[str]:
+        """Sample lines of the metric, without the HELP and TYPE header."""
+
+
+class Counter(_Metric):
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _lines(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket histogram per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket (non-cumulative, +Inf last), sum]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, labels)
+
+    def _lines(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Collected(_Metric):
+    """Gauge or counter whose samples are read from a callback at scrape time (e.g. from a stats() dict)."""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Optional[Samples]],
+                 kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.collect = collect
+
+    def _lines(self) -> List[str]:
+        samples = self.collect()
+        if samples is None:
+            return []
+        if isinstance(samples, (int, float)):
+            return [f"{self.name} {_format_value(samples)}"]
+        lines = []
+        for labels, value in samples:
+            lines.append(f"{self.name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of one server process, rendered in the Prometheus text format.
+
+    Every worker process keeps its own registry, so with several workers each
+    scrape sees the worker that answered it; scrape the workers individually
+    (or run one worker per container) to get complete numbers.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self, name: str, documentation: str, collect: Callable[[], Optional[Samples]],
+                kind: str = "gauge") -> Collected:
+        """Register (or replace) a metric read from `collect` on every scrape."""
+        metric = Collected(name, documentation, collect, kind)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        token = _render_results.set({})
+        try:
+            for metric in metrics:
+                try:
+                    lines.extend(metric.render())
+                except Exception as e:
+                    # A failing collector must not break the whole scrape
+                    lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        finally:
+            _render_results.reset(token)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+
+def once_per_render(source: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Share one call of `source` between all collectors of a scrape.
+
+    For stats that are expensive to compute (e.g. a SCAN of the Redis session
+    keyspace) and feed several metrics. Outside of a render every call goes
+    through to `source`.
+    """
+    def shared():
+        results = _render_results.get()
+        if results is None:
+            return source()
+        if shared not in results:
+            try:
+                results[shared] = (source(), None)
+            except Exception as e:
+                results[shared] = (None, e)
+        value, error = results[shared]
+        if error is not None:
+            raise error
+        return value
+
+    return shared
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+def register_server_metrics(admission_stats: Callable[[], Dict[str, Any]],
+                            session_stats: Callable[[], Optional[Dict[str, Any]]]):
+    """
+    Export a server's admission controller and conversation history sizes.
+
+    Args:
+        admission_stats: AdmissionController.stats
+        session_stats: Returns the session store's stats(), or None while the model is not loaded
+    """
+    # Each is read once per scrape, however many metrics it feeds
+    admission_stats = once_per_render(admission_stats)
+    session_stats = once_per_render(session_stats)
+
+    def session_value(key: str) -> Optional[float]:
+        stats = session_stats()
+        return None if stats is None else stats.get(key)
+
+    def per_kind(key: str) -> List[Tuple[Dict[str, Any], float]]:
+        return [({"kind": kind}, value) for kind, value in admission_stats()[key].items()]
+
+    REGISTRY.collect("career_chatbot_history_sessions", "Conversation sessions with stored history",
+                     lambda: session_value("active_sessions"))
+    REGISTRY.collect("career_chatbot_history_turns", "Conversation turns held by the session store",
+                     lambda: session_value("stored_turns"))
+    REGISTRY.collect("career_chatbot_history_bytes", "Estimated size of the in-memory conversation history",
+                     lambda: session_value("estimated_bytes"))
+    REGISTRY.collect("career_chatbot_admission_in_flight", "Requests admitted and not yet finished",
+                     lambda: admission_stats()["in_flight"])
+    REGISTRY.collect("career_chatbot_admission_queued", "Requests waiting for admission per kind",
+                     lambda: per_kind("queued"))
+    REGISTRY.collect("career_chatbot_admission_admitted_total", "Requests admitted per kind",
+                     lambda: per_kind("admitted"), kind="counter")
+    REGISTRY.collect("career_chatbot_admission_rejected_total", "Requests shed with 429 per kind",
+                     lambda: per_kind("rejected"), kind="counter")
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "career_chatbot_request_duration_seconds",
+    "HTTP request latency per endpoint (streams: until the response started)",
+    ("endpoint", "method", "status"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "career_chatbot_stage_duration_seconds",
+    "Time spent per request stage (prompt_build, gemini_call, json_parse, history_write)",
+    ("stage",),
+)
+GEMINI_TOKENS = REGISTRY.counter(
+    "career_chatbot_gemini_tokens_total",
+    "Tokens billed by Gemini (usage_metadata) per tier and direction (input/output)",
+    ("tier", "direction"),
+)
+SAFETY_BLOCKS = REGISTRY.counter(
+    "career_chatbot_gemini_safety_blocks_total",
+    "Gemini responses blocked by safety filters, per tier",
+    ("tier",),
+)
+FALLBACK_RESPONSES = REGISTRY.counter(
+    "career_chatbot_fallback_responses_total",
+    "Canned chat replies and local assessment results served because Gemini failed",
+    ("kind",),
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "career_chatbot_prompt_tokens",
+    "Estimated tokens per prompt section after truncation",
+    ("section",),
+    buckets=(25, 50, 100, 250, 500, 1000, 1500, 2500, 4000, 8000),
+)
+PROMPT_TRUNCATIONS = REGISTRY.counter(
+    "career_chatbot_prompt_truncations_total",
+    "Prompt sections cut to their token budget",
+    ("section",),
+)
+PROMPT_REJECTIONS = REGISTRY.counter(
+    "career_chatbot_prompt_rejections_total",
+    "Requests rejected for exceeding the prompt budget (message or total)",
+    ("section",),
+)
+PROMPT_BUDGET_USAGE = REGISTRY.histogram(
+    "career_chatbot_prompt_budget_usage_ratio",
+    "Estimated prompt size as a share of the total prompt budget",
+    buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 1.0),
+)
+IDEMPOTENT_REPLAYS = REGISTRY.counter(
+    "career_chatbot_idempotent_replays_total",
+    "Retries with a known Idempotency-Key answered without running the request (stored or attached)",
+    ("outcome",),
+)
+REGISTRY.collect(
+    "process_resident_memory_bytes",
+    "Resident memory size in bytes",
+    process_rss_bytes,
+)
+
+# Set for the current request once a fallback was served, so servers do not store that reply
+_fallback_served: ContextVar[bool] = ContextVar("fallback_served", default=False)
+
+
+def record_fallback(kind: str):
+    """Count a fallback response and flag the current request as answered by a fallback."""
+    FALLBACK_RESPONSES.inc(kind=kind)
+    _fallback_served.set(True)
+
+
+def reset_fallback_served():
+    """Start a request with the fallback flag cleared (threads of a sync server are reused)."""
+    _fallback_served.set(False)
+
+
+def fallback_served() -> bool:
+    """Whether record_fallback was called since the last reset in this thread or task."""
+    return _fallback_served.get()
@@ -0,0 +1,70 @@
+import json
+import os
+import pickle
+from datetime import datetime
+from typing import Any, Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the config file changes
+CONFIG_FORMAT_VERSION = 2
+
+CONFIG_KEYS = ("system_prompt", "generation_config", "safety_settings", "career_database", "model_version")
+
+
+def save_config(filepath: str, model_data: Dict[str, Any]):
+    """
+    Atomically write the model configuration as a small versioned JSON file.
+
+    Conversation history is deliberately not part of the config; it lives in
+    the append-only ConversationLog.
+    """
+    payload = {key: model_data[key] for key in CONFIG_KEYS if key in model_data}
+    payload["config_format_version"] = CONFIG_FORMAT_VERSION
+    payload["created_at"] = model_data.get("created_at") or datetime.now().isoformat()
+
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def load_config(filepath: str) -> Dict[str, Any]:
+    """
+    Load a model configuration file.
+
+    JSON config files are read directly. Legacy `.pkl` files written by older
+    versions are still accepted; their conversation history is returned under
+    "conversation_history" so callers can migrate it.
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file is not a supported config format
+    """
+    if filepath.endswith(".pkl"):
+        logger.warning(f"Loading legacy pickle config {filepath}; re-save it as JSON for faster startup")
+        with open(filepath, "rb") as f:
+            model_data = pickle.load(f)
+    else:
+        with open(filepath, "r", encoding="utf-8") as f:
+            model_data = json.load(f)
+
+    if not isinstance(model_data, dict):
+        raise ValueError("Invalid model data format")
+
+    version = model_data.get("config_format_version", 1)
+    if version > CONFIG_FORMAT_VERSION:
+        raise ValueError(f"Unsupported config format version {version}")
+    return model_data
+
+
+def resolve_config_path(model_path: str) -> str:
+    """Prefer the JSON config next to a legacy `.pkl` path when it exists."""
+    if model_path.endswith(".pkl"):
+        json_path = model_path[:-len(".pkl")] + ".json"
+        if os.path.exists(json_path):
+            return json_path
+    return model_path
@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, Tuple
+
+from metrics import percentile
+
+FLASH = "flash"
+PRO = "pro"
+TIERS = (FLASH, PRO)
+
+# Planning/analysis intents that deserve the stronger model (Indonesian and English)
+DEEP_INTENT_KEYWORDS = (
+    "rencana", "roadmap", "strategi", "langkah-langkah", "jalur karir", "jalur karier", "pindah karir",
+    "pindah karier", "transisi", "bandingkan", "perbandingan", "evaluasi", "review cv", "resume",
+    "portofolio", "jangka panjang", "5 tahun", "plan", "strategy", "compare", "career change",
+    "switch career", "step by step",
+)
+# Short lookups a fast model answers just as well
+FACTUAL_PREFIXES = (
+    "apa itu", "apa arti", "berapa", "siapa", "kapan", "dimana", "di mana", "definisi",
+    "what is", "how much", "who is", "when is",
+)
+
+# Call latencies kept per tier for the percentiles in stats()
+LATENCY_WINDOW = 500
+
+
+class ModelRouter:
+    """
+    Cheap local classifier choosing the Gemini tier for a request.
+
+    Assessments and planning-type questions (intent keywords, long messages,
+    long-running sessions) go to the pro tier; short or factual questions go to
+    flash. Every decision and the latency/outcome of every call per tier is
+    recorded so the thresholds can be tuned from /status.
+    """
+
+    def __init__(self, enabled: bool = True, default_tier: str = FLASH,
+                 long_message_chars: int = 280, long_session_turns: int = 6):
+        """
+        Args:
+            enabled: When False every request uses `default_tier`
+            default_tier: Tier used when routing is disabled
+            long_message_chars: Messages at least this long are routed to pro
+            long_session_turns: Sessions with this many stored turns are routed to pro
+        """
+        self.enabled = enabled
+        self.default_tier = default_tier
+        self.long_message_chars = long_message_chars
+        self.long_session_turns = long_session_turns
+
+        self._lock = threading.Lock()
+        self._decisions: Counter = Counter()
+        self._calls: Counter = Counter()
+        self._errors: Counter = Counter()
+        self._fallbacks: Counter = Counter()
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Create a router configured from GEMINI_ROUTING / GEMINI_ROUTER_* environment variables."""
+        return cls(
+            enabled=os.getenv("GEMINI_ROUTING", "1") == "1",
+            default_tier=os.getenv("GEMINI_DEFAULT_TIER", FLASH),
+            long_message_chars=int(os.getenv("GEMINI_ROUTER_LONG_MESSAGE_CHARS", "280")),
+            long_session_turns=int(os.getenv("GEMINI_ROUTER_LONG_SESSION_TURNS", "6")),
+        )
+
+    def classify(self, kind: str, message: str = "", history_turns: int = 0) -> Tuple[str, str]:
+        """
+        Choose a tier without recording the decision.
+
+        Args:
+            kind: "chat" or "assessment"
+            message: User message (chat only)
+            history_turns: Stored turns of the session
+
+        Returns:
+            (tier, reason)
+        """
+        if not self.enabled:
+            return self.default_tier, "disabled"
+        if kind == "assessment":
+            return PRO, "assessment"
+
+        text = message.casefold().strip()
+        if any(keyword in text for keyword in DEEP_INTENT_KEYWORDS):
+            return PRO, "intent"
+        if text.startswith(FACTUAL_PREFIXES) and len(text) < self.long_message_chars:
+            return FLASH, "factual"
+        if len(text) >= self.long_message_chars:
+            return PRO, "length"
+        if history_turns >= self.long_session_turns:
+            return PRO, "session"
+        return FLASH, "short"
+
+    def route(self, kind: str, message: str = "", history_turns: int = 0) -> str:
+        """Choose a tier for a request and record the decision."""
+        tier, reason = self.classify(kind, message, history_turns)
+        with self._lock:
+            self._decisions[f"{tier}:{reason}"] += 1
+        return tier
+
+    def record_call(self, tier: str, seconds: float, ok: bool):
+        """Record the latency and outcome of one call on a tier."""
+        with self._lock:
+            self._calls[tier] += 1
+            if ok:
+                self._latencies[tier].append(seconds)
+            else:
+                self._errors[tier] += 1
+
+    def record_fallback(self, from_tier: str, to_tier: str):
+        with self._lock:
+            self._fallbacks[f"{from_tier}->{to_tier}"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {}
+            for tier in TIERS:
+                latencies = sorted(self._latencies[tier])
+                tiers[tier] = {
+                    "calls": self._calls[tier],
+                    "errors": self._errors[tier],
+                    "p50_latency_ms": round(percentile(latencies, 50) * 1000) if latencies else None,
+                    "p95_latency_ms": round(percentile(latencies, 95) * 1000) if len(latencies) >= 20 else None,
+                }
+            return {
+                "enabled": self.enabled,
+                "decisions": dict(self._decisions),
+                "fallbacks": dict(self._fallbacks),
+                "tiers": tiers,
+            }
@@ -0,0 +1,55 @@
+import gc
+import os
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PreloadedData:
+    """Read-only model data built once: config, career database and its compiled index/matcher."""
+
+    def __init__(self, career_database: Dict, config: Optional[Dict[str, Any]] = None):
+        # Imported here so the servers can check preload_enabled() without loading numpy
+        from career_index import CareerIndex
+        from career_matcher import CareerMatcher
+
+        self.config = config
+        self.career_database = career_database
+        self.career_index = CareerIndex(career_database)
+        self.career_matcher = CareerMatcher(career_database)
+
+
+_preloaded: Dict[str, PreloadedData] = {}
+
+
+def preload_enabled() -> bool:
+    """
+    True when PRELOAD_MODEL=1.
+
+    Meant for pre-forking servers (gunicorn --preload, also with uvicorn
+    workers): the master loads the model data once and every forked worker
+    shares those pages copy-on-write. Clients, threads and database
+    connections are still created per worker, after the fork.
+    """
+    return os.getenv("PRELOAD_MODEL") == "1"
+
+
+def register_preloaded(key: str, data: PreloadedData):
+    _preloaded[key] = data
+    logger.info(f"Preloaded model data for {key}")
+
+
+def get_preloaded(key: str) -> Optional[PreloadedData]:
+    return _preloaded.get(key)
+
+
+def freeze():
+    """
+    Exclude everything allocated so far from garbage collection.
+
+    Without this the first collection in each worker touches every preloaded
+    object and un-shares their pages.
+    """
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,154 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Request header that asks for a profile of that request (honoured when PROFILE_ALLOW_HEADER=1)
+PROFILE_HEADER = "X-Profile"
+
+
+class ProfileSession:
+    """Stack samples of one request's thread."""
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+
+
+class SamplingProfiler:
+    """
+    Opt-in sampling profiler for slow requests.
+
+    A single daemon thread samples the stacks of the threads serving profiled
+    requests every `interval_ms` (sys._current_frames, no tracing hooks, so
+    the profiled code runs at full speed). When a profiled request took at
+    least `slow_ms`, its samples are written in the folded-stack format that
+    flamegraph.pl, speedscope and inferno read; faster requests are discarded.
+
+    With an asyncio server the sampled thread is the event loop, so the profile
+    covers everything the loop ran while the request was in progress.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, allow_header: bool = False, slow_ms: int = 2000,
+                 interval_ms: float = 5, output_dir: str = "profiles"):
+        """
+        Args:
+            sample_rate: Fraction of requests profiled (0 = only on request header)
+            allow_header: Profile requests sent with the X-Profile: 1 header
+            slow_ms: Only requests at least this slow get their profile written
+            interval_ms: Sampling interval
+            output_dir: Directory the .folded profiles are written to
+        """
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+
+        self.profiled = 0
+        self.written = 0
+        self._sessions: Dict[int, ProfileSession] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> Optional["SamplingProfiler"]:
+        """
+        Create a profiler from PROFILE_SAMPLE_RATE and PROFILE_ALLOW_HEADER (None if both are off).
+
+        PROFILE_SLOW_MS, PROFILE_INTERVAL_MS and PROFILE_DIR tune it.
+        """
+        sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        allow_header = os.getenv("PROFILE_ALLOW_HEADER") == "1"
+        if sample_rate <= 0 and not allow_header:
+            return None
+        return cls(
+            sample_rate=sample_rate,
+            allow_header=allow_header,
+            slow_ms=int(os.getenv("PROFILE_SLOW_MS", "2000")),
+            interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+            output_dir=os.getenv("PROFILE_DIR", "profiles"),
+        )
+
+    def wants(self, header_value: Optional[str] = None) -> bool:
+        """Whether to profile a request, given its X-Profile header."""
+        if self.allow_header and header_value == "1":
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, thread_id: Optional[int] = None) -> ProfileSession:
+        """Start sampling a thread (the calling thread by default)."""
+        session = ProfileSession(thread_id or threading.get_ident())
+        with self._cond:
+            self._sessions[id(session)] = session
+            self.profiled += 1
+            if self._thread is None or not self._thread.is_alive():
+                # Also restarts the sampler in a forked worker
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return session
+
+    def finish(self, session: ProfileSession, elapsed_seconds: float, label: str) -> Optional[str]:
+        """
+        Stop sampling and write the profile if the request was slow.
+
+        Returns:
+            Path of the written .folded file, or None
+        """
+        with self._cond:
+            self._sessions.pop(id(session), None)
+        elapsed_ms = round(elapsed_seconds * 1000)
+        if elapsed_ms < self.slow_ms or not session.samples:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}-{elapsed_ms}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in session.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.written += 1
+        logger.info(f"Wrote profile of slow request {label} ({elapsed_ms} ms) to {path}")
+        return path
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sample_rate": self.sample_rate,
+            "allow_header": self.allow_header,
+            "slow_ms": self.slow_ms,
+            "profiled": self.profiled,
+            "written": self.written,
+        }
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._sessions:
+                    self._cond.wait()
+                sessions = list(self._sessions.values())
+            frames = sys._current_frames()
+            for session in sessions:
+                frame = frames.get(session.thread_id)
+                if frame is not None and session.thread_id != me:
+                    session.samples[self._fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _fold(frame) -> str:
+        """Stack of a frame as one folded line, root first."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(name.replace(";", ":") for name in reversed(names))
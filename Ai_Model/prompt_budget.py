@@ -0,0 +1,245 @@
+import os
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from metrics import PROMPT_BUDGET_USAGE, PROMPT_REJECTIONS, PROMPT_TOKENS, PROMPT_TRUNCATIONS
+
+logger = logging.getLogger(__name__)
+
+# Token limits per prompt section; override with PROMPT_<SECTION>_TOKENS
+DEFAULT_SECTION_LIMITS = {
+    "system": 2500,
+    "user_context": 300,
+    "career_data": 1500,
+    "history": 1500,
+    "message": 1000,
+}
+
+# Bounds of the ratio between count_tokens and the local estimate
+MIN_CALIBRATION = 0.5
+MAX_CALIBRATION = 3.0
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_WHITESPACE = re.compile(r"\s+")
+# Appended to a section that was cut
+TRUNCATION_MARKER = "\n..."
+
+PROFILE_LIST_FIELDS = ("interests", "skills", "work_values")
+PROFILE_TEXT_FIELDS = ("experience_level", "education")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token)."""
+    return len(text) // 4
+
+
+def clean_text(value: Any, max_chars: int) -> str:
+    """Single-line text without control characters, cut at a word boundary after max_chars."""
+    text = _WHITESPACE.sub(" ", _CONTROL_CHARS.sub("", str(value))).strip()
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + " ..."
+    return text
+
+
+class PromptBudgetExceeded(ValueError):
+    """A request that cannot be made to fit its prompt budget; rejected before calling Gemini."""
+
+    def __init__(self, section: str, tokens: int, limit: int):
+        self.section = section
+        self.tokens = tokens
+        self.limit = limit
+        what = "Message" if section == "message" else f"Prompt ({section})"
+        super().__init__(f"{what} is too long: about {tokens} tokens, the limit is {limit}")
+
+
+class PromptBudget:
+    """
+    Token budgets for the sections of a chat prompt.
+
+    Sections are measured with the local estimator: user_context and
+    career_data are cut at line boundaries to their limits, history drops its
+    oldest turns, and a message over its limit (or a prompt still over the
+    total) is rejected with PromptBudgetExceeded. A sample of prompts is
+    checked against count_tokens in the background and the ratio corrects
+    later estimates.
+    """
+
+    def __init__(self, max_total_tokens: int = 7000, section_limits: Dict[str, int] = None,
+                 verify_sample_rate: float = 0.01, max_list_items: int = 20, max_field_chars: int = 200):
+        """
+        Args:
+            max_total_tokens: Budget for the whole prompt, including the system instruction
+            section_limits: Token limit per section. Defaults to DEFAULT_SECTION_LIMITS
+            verify_sample_rate: Fraction of prompts measured with count_tokens
+            max_list_items: Items kept of list fields (interests, skills, ...)
+            max_field_chars: Characters kept of each context field and list item
+        """
+        self.max_total_tokens = max_total_tokens
+        self.section_limits = dict(DEFAULT_SECTION_LIMITS, **(section_limits or {}))
+        self.verify_sample_rate = verify_sample_rate
+        self.max_list_items = max_list_items
+        self.max_field_chars = max_field_chars
+
+        self._system_estimate = 0
+        # count_tokens / local estimate, learned from the verified sample
+        self.calibration = 1.0
+        self.verified = 0
+        self._verifying = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-budget")
+
+    @classmethod
+    def from_env(cls) -> "PromptBudget":
+        """Create a budget from PROMPT_MAX_TOTAL_TOKENS, PROMPT_<SECTION>_TOKENS and PROMPT_VERIFY_SAMPLE_RATE."""
+        return cls(
+            max_total_tokens=int(os.getenv("PROMPT_MAX_TOTAL_TOKENS", "7000")),
+            section_limits={
+                section: int(os.getenv(f"PROMPT_{section.upper()}_TOKENS", str(limit)))
+                for section, limit in DEFAULT_SECTION_LIMITS.items()
+            },
+            verify_sample_rate=float(os.getenv("PROMPT_VERIFY_SAMPLE_RATE", "0.01")),
+            max_list_items=int(os.getenv("PROMPT_MAX_LIST_ITEMS", "20")),
+            max_field_chars=int(os.getenv("PROMPT_MAX_FIELD_CHARS", "200")),
+        )
+
+    def estimate(self, text: str) -> int:
+        """Calibrated local token estimate."""
+        return round(estimate_tokens(text) * self.calibration)
+
+    @property
+    def system_tokens(self) -> int:
+        return round(self._system_estimate * self.calibration)
+
+    def set_system_prompt(self, system_prompt: str):
+        """Measure the static system instruction, which is part of every prompt."""
+        self._system_estimate = estimate_tokens(system_prompt or "")
+        if self.system_tokens > self.section_limits["system"]:
+            logger.warning(f"System prompt is about {self.system_tokens} tokens, "
+                           f"over its budget of {self.section_limits['system']}")
+
+    def check_message(self, message: str):
+        """
+        Reject a user message over the message budget.
+
+        Raises:
+            PromptBudgetExceeded: If the message is too long
+        """
+        tokens = self.estimate(message or "")
+        limit = self.section_limits["message"]
+        if tokens > limit:
+            PROMPT_REJECTIONS.inc(section="message")
+            raise PromptBudgetExceeded("message", tokens, limit)
+
+    def sanitize_profile(self, profile: Any) -> Dict:
+        """Copy of an assessment profile with bounded, single-line fields."""
+        if not isinstance(profile, dict):
+            return {}
+        sanitized = dict(profile)
+        for field in PROFILE_LIST_FIELDS:
+            values = profile.get(field) or []
+            if isinstance(values, str):
+                values = [values]
+            elif not isinstance(values, (list, tuple)):
+                values = []
+            # Repeated items add tokens but no information
+            items = dict.fromkeys(clean_text(value, self.max_field_chars) for value in values)
+            sanitized[field] = [item for item in items if item][:self.max_list_items]
+        for field in PROFILE_TEXT_FIELDS:
+            if profile.get(field) is not None:
+                sanitized[field] = clean_text(profile[field], self.max_field_chars)
+        return sanitized
+
+    def sanitize_context(self, user_context: Any) -> Dict:
+        """Copy of a chat user_context with the fields that go into the prompt sanitized."""
+        if not isinstance(user_context, dict):
+            return {}
+        sanitized = dict(user_context)
+        if user_context.get("assessment_data"):
+            sanitized["assessment_data"] = self.sanitize_profile(user_context["assessment_data"])
+        for field in ("career_stage", "goals"):
+            if user_context.get(field):
+                sanitized[field] = clean_text(user_context[field], self.max_field_chars)
+        return sanitized
+
+    def truncate(self, section: str, text: str) -> str:
+        """Cut a section to its token limit, keeping whole lines from the top."""
+        limit = self.section_limits[section]
+        if self.estimate(text) > limit:
+            PROMPT_TRUNCATIONS.inc(section=section)
+            # Leave room for the marker so the cut section stays within its limit
+            max_chars = max(0, int(limit * 4 / self.calibration) - len(TRUNCATION_MARKER))
+            cut = text[:max_chars]
+            text = (cut.rsplit("\n", 1)[0] if "\n" in cut else cut) + TRUNCATION_MARKER
+        PROMPT_TOKENS.observe(self.estimate(text), section=section)
+        return text
+
+    def trim_history(self, turns: List[Dict], render_turn: Callable[[Dict], str]) -> List[Dict]:
+        """Drop the oldest turns until the rendered history fits its limit."""
+        turns = list(turns)
+        sizes = [self.estimate(render_turn(turn)) for turn in turns]
+        limit = self.section_limits["history"]
+        if sum(sizes) > limit:
+            PROMPT_TRUNCATIONS.inc(section="history")
+            while turns and sum(sizes) > limit:
+                turns.pop(0)
+                sizes.pop(0)
+        PROMPT_TOKENS.observe(sum(sizes), section="history")
+        return turns
+
+    def finish(self, prompt: str, count_tokens: Optional[Callable[[str], Any]] = None) -> str:
+        """
+        Check the assembled prompt against the total budget and record its usage.
+
+        Args:
+            prompt: The rendered prompt (without the system instruction)
+            count_tokens: Model count_tokens used to verify a sample of estimates
+
+        Raises:
+            PromptBudgetExceeded: If the prompt is over the total budget
+        """
+        PROMPT_TOKENS.observe(self.system_tokens, section="system")
+        total = self.system_tokens + self.estimate(prompt)
+        PROMPT_BUDGET_USAGE.observe(total / self.max_total_tokens)
+        if total > self.max_total_tokens:
+            PROMPT_REJECTIONS.inc(section="total")
+            raise PromptBudgetExceeded("total", total, self.max_total_tokens)
+        if count_tokens and self.verify_sample_rate > 0 and random.random() < self.verify_sample_rate:
+            self._schedule_verify(prompt, count_tokens)
+        return prompt
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_total_tokens": self.max_total_tokens,
+            "section_limits": self.section_limits,
+            "system_tokens": self.system_tokens,
+            "calibration": round(self.calibration, 3),
+            "verified_prompts": self.verified,
+        }
+
+    def _schedule_verify(self, prompt: str, count_tokens: Callable[[str], Any]):
+        """Measure one prompt with count_tokens off the request path (skipped while one is running)."""
+        with self._lock:
+            if self._verifying:
+                return
+            self._verifying = True
+        self._executor.submit(self._verify, prompt, count_tokens)
+
+    def _verify(self, prompt: str, count_tokens: Callable[[str], Any]):
+        try:
+            actual = count_tokens(prompt).total_tokens
+            raw_estimate = self._system_estimate + estimate_tokens(prompt)
+            if actual and raw_estimate:
+                ratio = min(MAX_CALIBRATION, max(MIN_CALIBRATION, actual / raw_estimate))
+                with self._lock:
+                    # Moving average, so one unusual prompt does not swing the estimates
+                    self.calibration = ratio if not self.verified else 0.8 * self.calibration + 0.2 * ratio
+                    self.verified += 1
+        except Exception as e:
+            logger.warning(f"Verifying the prompt token estimate failed: {e}")
+        finally:
+            with self._lock:
+                self._verifying = False
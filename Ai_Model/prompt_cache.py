@@ -0,0 +1,173 @@
+import datetime
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning this prompt can never be cached (400, e.g. below the minimum size); anything else is retried
+PERMANENT_ERRORS = (google_exceptions.InvalidArgument,)
+
+# Backoff between failed cache creations or refreshes, doubled per failure
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 600
+
+
+class TokenUsage:
+    """Thread-safe running totals of input tokens, split into cached and uncached."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, response: Any):
+        """Add the usage_metadata of one Gemini response (ignored if missing)."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            self.cached_tokens += getattr(usage, "cached_content_token_count", 0) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else 0,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            }
+
+
+class PromptCache:
+    """
+    Server-side cached system instruction (Gemini context caching).
+
+    The static system prompt is uploaded once as CachedContent and requests are
+    sent through a model bound to it, so only the dynamic suffix is billed as
+    fresh input. The cache is refreshed shortly before its TTL expires by one
+    caller at a time, outside the lock, while the others keep using the current
+    model (or the plain system_instruction model until the first cache exists).
+    A failed create or refresh is retried with exponential backoff; only an
+    invalid-argument error (e.g. the prompt is below the model's minimum
+    cacheable size) disables caching for good.
+    """
+
+    def __init__(self, model_name: str, system_instruction: str,
+                 ttl_seconds: int = 3600, refresh_margin_seconds: int = 300):
+        """
+        Args:
+            model_name: Versioned model name that supports caching (e.g. gemini-1.5-flash-002)
+            system_instruction: Static prompt prefix to cache
+            ttl_seconds: Lifetime of the cached content
+            refresh_margin_seconds: Extend the TTL when less than this remains
+        """
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+
+        self.disabled = False
+        self.refreshes = 0
+        self.failures = 0
+        self._cached_content = None
+        self._model = None
+        self._expires_at = 0.0
+        self._updating = False
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_BASE_SECONDS
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, model_name: str, system_instruction: str) -> Optional["PromptCache"]:
+        """Create a cache when GEMINI_CONTEXT_CACHE=1 (None otherwise)."""
+        if os.getenv("GEMINI_CONTEXT_CACHE") != "1":
+            return None
+        return cls(
+            model_name=model_name,
+            system_instruction=system_instruction,
+            ttl_seconds=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600")),
+        )
+
+    def get_model(self) -> Optional[genai.GenerativeModel]:
+        """Return a model bound to the (fresh) cached content, or None if caching is unavailable."""
+        if self.disabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            model = self._model if now < self._expires_at else None
+            due = self._cached_content is None or self._expires_at - now < self.refresh_margin_seconds
+            if not due or self._updating or now < self._retry_at:
+                return model
+            # This caller creates or refreshes the cache; the others carry on with `model`
+            self._updating = True
+            cached_content = self._cached_content
+
+        try:
+            if cached_content is None:
+                cached_content, model = self._create()
+            else:
+                cached_content, model = self._refresh(cached_content)
+        except Exception as e:
+            self._record_failure(e)
+            return model if now < self._expires_at else None
+
+        with self._lock:
+            self._cached_content = cached_content
+            self._model = model
+            self._expires_at = now + self.ttl_seconds
+            self._updating = False
+            self._retry_delay = RETRY_BASE_SECONDS
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": not self.disabled,
+            "cached_content": getattr(self._cached_content, "name", None),
+            "expires_in_seconds": max(0, round(self._expires_at - time.time())) if self._cached_content else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+    def _record_failure(self, error: Exception):
+        with self._lock:
+            self._updating = False
+            self.failures += 1
+            if isinstance(error, PERMANENT_ERRORS):
+                logger.warning(f"Context caching unavailable, using system_instruction instead: {error}")
+                self.disabled = True
+                return
+            self._retry_at = time.time() + self._retry_delay
+            logger.warning(f"Context cache update failed, retrying in {self._retry_delay:.0f}s: {error}")
+            self._retry_delay = min(self._retry_delay * 2, RETRY_MAX_SECONDS)
+
+    def _create(self) -> Tuple[Any, genai.GenerativeModel]:
+        from google.generativeai import caching
+
+        cached_content = caching.CachedContent.create(
+            model=self.model_name,
+            system_instruction=self.system_instruction,
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+        )
+        logger.info(f"Created cached system prompt {cached_content.name}")
+        return cached_content, genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+    def _refresh(self, cached_content: Any) -> Tuple[Any, genai.GenerativeModel]:
+        try:
+            cached_content.update(ttl=datetime.timedelta(seconds=self.ttl_seconds))
+        except Exception as e:
+            # The cached content may already be gone; recreate it
+            logger.warning(f"Refreshing cached system prompt failed, recreating: {e}")
+            return self._create()
+        self.refreshes += 1
+        return cached_content, self._model
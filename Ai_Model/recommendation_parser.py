@@ -0,0 +1,214 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import traced
+
+# Gemini response_schema for one assessment: the same shape as basic_recommendations
+RECOMMENDATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "career_title": {"type": "string"},
+            "match_score": {"type": "integer"},
+            "reasons": {"type": "array", "items": {"type": "string"}},
+            "next_steps": {"type": "array", "items": {"type": "string"}},
+            "salary_range": {"type": "string"},
+            "growth_prospect": {"type": "string"},
+        },
+        "required": ["career_title", "match_score", "reasons", "next_steps"],
+    },
+}
+
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+SCORE_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Defaults for optional fields an item may omit
+DEFAULT_SALARY_RANGE = "Bervariasi"
+DEFAULT_GROWTH_PROSPECT = "Tidak diketahui"
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text: str) -> Any:
+    """
+    Pull a JSON value out of a model reply.
+
+    Handles ```json fences, commentary before or after the JSON, and arrays cut
+    off mid-way (e.g. by max_output_tokens): the complete leading items of a
+    truncated array are returned.
+
+    Raises:
+        ValueError: If no JSON value can be recovered
+    """
+    match = FENCE_PATTERN.search(text)
+    if match:
+        text = match.group(1)
+
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON found in response")
+    start = min(starts)
+
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+        return value
+    except json.JSONDecodeError:
+        if text[start] != "[":
+            raise ValueError("Unparseable JSON object in response")
+    return _salvage_array(text, start)
+
+
+def _salvage_array(text: str, start: int) -> List[Any]:
+    """Decode the complete items of a truncated JSON array."""
+    items = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    if not items:
+        raise ValueError("Truncated JSON array without complete items")
+    return items
+
+
+def _as_text_list(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    if isinstance(value, str) and value.strip():
+        return [value.strip()]
+    return []
+
+
+def _as_score(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        score = float(value)
+    else:
+        match = SCORE_PATTERN.search(str(value))
+        if not match:
+            return None
+        score = float(match.group().replace(",", "."))
+    if 0 < score <= 1:
+        # Fractions such as 0.85 are percentages
+        score *= 100
+    return int(round(min(max(score, 0), 100)))
+
+
+def repair_recommendation(item: Any) -> Tuple[Optional[Dict], bool]:
+    """
+    Validate one recommendation, repairing what can be repaired.
+
+    Returns:
+        (recommendation, repaired); recommendation is None when the item is
+        unusable (not an object, or without a career title or score)
+    """
+    if not isinstance(item, dict):
+        return None, False
+
+    title = str(item.get("career_title") or item.get("title") or "").strip()
+    score = _as_score(item.get("match_score"))
+    if not title or score is None:
+        return None, False
+
+    recommendation = {
+        "career_title": title,
+        "match_score": score,
+        "reasons": _as_text_list(item.get("reasons")),
+        "next_steps": _as_text_list(item.get("next_steps")),
+        "salary_range": str(item.get("salary_range") or DEFAULT_SALARY_RANGE),
+        "growth_prospect": str(item.get("growth_prospect") or item.get("growth_prospects") or DEFAULT_GROWTH_PROSPECT),
+    }
+    repaired = any(recommendation[key] != item.get(key) for key in recommendation)
+    return recommendation, repaired
+
+
+class RecommendationParser:
+    """
+    Tolerant parser for assessment replies that keeps track of wasted Gemini calls.
+
+    A call is wasted when nothing usable could be recovered from its reply and
+    the caller had to fall back to local recommendations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.wasted_calls = 0
+        self.repaired_items = 0
+        self.dropped_items = 0
+
+    @traced("json_parse")
+    def parse(self, response_text: str) -> Optional[List[Dict]]:
+        """Parse a single-profile reply into recommendations (None if unusable)."""
+        try:
+            value = extract_json(response_text)
+        except ValueError:
+            value = None
+        if isinstance(value, dict):
+            # A lone object or {"recommendations": [...]} wrapper
+            value = value.get("recommendations", [value])
+        recommendations = self._validate(value)
+        self._count_call(recommendations)
+        return recommendations
+
+    @traced("json_parse")
+    def parse_batch(self, response_text: str) -> Dict[str, List[Dict]]:
+        """Parse a batched reply {profile_id: [...]} into usable recommendations per profile id."""
+        try:
+            value = extract_json(response_text)
+        except ValueError:
+            value = None
+
+        results = {}
+        if isinstance(value, dict):
+            for profile_id, items in value.items():
+                recommendations = self._validate(items)
+                if recommendations:
+                    results[profile_id] = recommendations
+        self._count_call(results or None)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "wasted_calls": self.wasted_calls,
+                "wasted_call_rate": round(self.wasted_calls / self.calls, 4) if self.calls else 0.0,
+                "repaired_items": self.repaired_items,
+                "dropped_items": self.dropped_items,
+            }
+
+    def _validate(self, items: Any) -> Optional[List[Dict]]:
+        if not isinstance(items, list):
+            return None
+
+        recommendations = []
+        repaired_items = dropped_items = 0
+        for item in items:
+            recommendation, repaired = repair_recommendation(item)
+            if recommendation is None:
+                dropped_items += 1
+                continue
+            repaired_items += repaired
+            recommendations.append(recommendation)
+
+        with self._lock:
+            self.repaired_items += repaired_items
+            self.dropped_items += dropped_items
+        return recommendations or None
+
+    def _count_call(self, result: Any):
+        with self._lock:
+            self.calls += 1
+            if not result:
+                self.wasted_calls += 1
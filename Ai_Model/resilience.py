@@ -0,0 +1,353 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+from google.api_core import exceptions as google_exceptions
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Transient failures worth another attempt: 429, 500, 503 and per-attempt timeouts
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+)
+
+# Successful latencies kept for the hedging percentile, and how many are needed before hedging
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+# Share of attempts that may be hedged; the losing attempt still spends a key-pool token and quota
+DEFAULT_HEDGE_BUDGET = 0.05
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+
+class LocalRejection(Exception):
+    """A call refused locally before reaching Gemini; says nothing about Gemini's health, so the breaker ignores it."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail immediately with CircuitOpenError. After `reset_timeout` seconds a
+    single trial call is let through (half-open); its outcome closes the
+    breaker again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._opened_at = 0.0
+        self._trial_started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_started_at = None
+            if self.state == self.HALF_OPEN:
+                # One trial at a time; a trial that never reported back is replaced after reset_timeout
+                trial_stale = self._trial_started_at is not None and now - self._trial_started_at >= self.reset_timeout
+                if self._trial_started_at is None or trial_stale:
+                    self._trial_started_at = now
+                    return
+            self.short_circuited += 1
+            raise CircuitOpenError("Gemini circuit breaker is open")
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Gemini circuit breaker opened after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_started_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class ResilientCaller:
+    """
+    Deadline, retry, circuit-breaker and hedging policy around one Gemini call.
+
+    `fn(timeout)` performs a single attempt and must honour `timeout` seconds
+    (e.g. via request_options={"timeout": timeout}). Attempts are retried with
+    exponential backoff and full jitter on 429/5xx/timeouts until `max_attempts`
+    or the overall `deadline` is used up. With hedging enabled, a second attempt
+    is fired when the first one is slower than the observed p95 latency, and
+    whichever finishes first wins. Hedges are capped at `hedge_budget` of all
+    attempts, since the losing attempt is not cancelled on Gemini's side.
+    """
+
+    def __init__(self, deadline: float = 20, attempt_timeout: float = 10, max_attempts: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 4,
+                 breaker: CircuitBreaker = None, hedge: bool = False, hedge_workers: int = 32,
+                 hedge_budget: float = DEFAULT_HEDGE_BUDGET):
+        """
+        Args:
+            deadline: Total seconds a call may take across all attempts
+            attempt_timeout: Upper bound for a single attempt
+            max_attempts: Attempts including the first one
+            backoff_base: First retry delay cap in seconds (doubled per retry)
+            backoff_max: Largest retry delay cap
+            breaker: Circuit breaker shared by all calls. If None, a default one is created
+            hedge: Fire a second attempt when the first exceeds the p95 latency
+            hedge_workers: Threads used for hedged attempts on the synchronous path
+            hedge_budget: Largest fraction of attempts that may be hedged
+        """
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_budget = hedge_budget
+
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="gemini-hedge") if hedge else None
+        self._lock = threading.Lock()
+
+        self.retries = 0
+        self.timeouts = 0
+        self.attempts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_over_budget = 0
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        """Create a caller configured from GEMINI_* environment variables."""
+        return cls(
+            deadline=float(os.getenv("GEMINI_DEADLINE_SECONDS", "20")),
+            attempt_timeout=float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "10")),
+            max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+            backoff_base=float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+            ),
+            hedge=os.getenv("GEMINI_HEDGE") == "1",
+            hedge_budget=float(os.getenv("GEMINI_HEDGE_BUDGET", str(DEFAULT_HEDGE_BUDGET))),
+        )
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """Run `fn(timeout)` under the policy, raising the last error (or CircuitOpenError)."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            try:
+                result = self._attempt(fn, timeout)
+            except Exception as e:
+                self._record_error(e)
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, fn: Callable[[float], Awaitable[Any]]) -> Any:
+        """Async variant of `call`; `fn(timeout)` returns an awaitable."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            try:
+                result = await self._attempt_async(fn, timeout)
+            except Exception as e:
+                self._record_error(e)
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    @contextmanager
+    def guard(self):
+        """Breaker bookkeeping for calls that cannot be retried or hedged, such as streams."""
+        self.breaker.before_call()
+        try:
+            yield
+        except LocalRejection:
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+
+    def p95_latency(self) -> Optional[float]:
+        """p95 of recent successful attempts in seconds (None until enough samples)."""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return percentile(ordered, 95)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95_latency()
+        return {
+            "breaker": self.breaker.stats(),
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_over_budget": self.hedges_over_budget,
+            "p95_latency_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+    def _timed(self, fn: Callable[[float], Any], timeout: float) -> Any:
+        start = time.monotonic()
+        result = fn(timeout)
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        return result
+
+    def _hedge_after(self, timeout: float) -> Optional[float]:
+        """Seconds to wait before hedging this attempt, or None to run it alone."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            self.attempts += 1
+        hedge_after = self.p95_latency()
+        if hedge_after is None or hedge_after >= timeout:
+            return None
+        return hedge_after
+
+    def _claim_hedge(self) -> bool:
+        """Count a hedge if the budget allows one more (the first is always allowed)."""
+        with self._lock:
+            if self.hedges + 1 > max(1.0, self.hedge_budget * self.attempts):
+                self.hedges_over_budget += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def _attempt(self, fn: Callable[[float], Any], timeout: float) -> Any:
+        hedge_after = self._hedge_after(timeout)
+        if hedge_after is None:
+            return self._timed(fn, timeout)
+
+        first = self._executor.submit(self._timed, fn, timeout)
+        done, _ = wait([first], timeout=hedge_after)
+        if done or not self._claim_hedge():
+            return first.result()
+
+        second = self._executor.submit(self._timed, fn, timeout - hedge_after)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _attempt_async(self, fn: Callable[[float], Awaitable[Any]], timeout: float) -> Any:
+        async def timed(attempt_timeout: float):
+            start = time.monotonic()
+            result = await asyncio.wait_for(fn(attempt_timeout), attempt_timeout)
+            with self._lock:
+                self._latencies.append(time.monotonic() - start)
+            return result
+
+        hedge_after = self._hedge_after(timeout)
+        if hedge_after is None:
+            return await timed(timeout)
+
+        first = asyncio.ensure_future(timed(timeout))
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done or not self._claim_hedge():
+            return await first
+
+        second = asyncio.ensure_future(timed(timeout - hedge_after))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _record_error(self, error: Exception):
+        if isinstance(error, LocalRejection):
+            return
+        if isinstance(error, (google_exceptions.DeadlineExceeded, asyncio.TimeoutError)):
+            self.timeouts += 1
+        self.breaker.record_failure()
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None when the error is final."""
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        # Leave room for at least a short attempt after sleeping
+        if time.monotonic() + delay + 0.1 >= deadline:
+            return None
+        self.retries += 1
+        return delay
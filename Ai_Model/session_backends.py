@@ -0,0 +1,355 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSessionStore(ABC):
+    """
+    Base for session stores shared by several worker processes.
+
+    Same interface as the in-memory SessionStore, but the turns live outside
+    the process so every worker sees the same history. Subclasses implement
+    _read, _write, _seed, clear, export_turns and stats.
+    """
+
+    backend = "shared"
+
+    def __init__(self, max_turns: int = 10, ttl_seconds: float = 3600,
+                 loader: Optional[Callable[[str, int], List[Dict]]] = None):
+        """
+        Args:
+            max_turns: Turns kept per session (oldest dropped first)
+            ttl_seconds: Idle time after which a session expires
+            loader: Optional callable (session_id, max_turns) -> turns used to restore
+                sessions missing from the store (e.g. ConversationLog.load_session)
+        """
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.loader = loader
+        # Process-local; the stores do not track a global "last write"
+        self.last_interaction: Optional[str] = None
+
+    def get_history(self, session_id: Optional[str], limit: Optional[int] = None) -> List[Dict]:
+        """Return the stored turns for a session, oldest first (see SessionStore.get_history)."""
+        if not session_id:
+            return []
+        turns = self._read(session_id, min(limit or self.max_turns, self.max_turns))
+        if not turns and self.loader is not None:
+            turns = self._restore(session_id)
+        return turns[-limit:] if limit else turns
+
+    def append_turn(self, session_id: Optional[str], turn: Dict[str, Any]):
+        """Append a completed turn to a session (anonymous turns are not stored)."""
+        if not session_id:
+            return
+        self._write(session_id, turn)
+        self.last_interaction = turn.get("timestamp")
+
+    def load_turns(self, turns: List[Dict]):
+        """Seed the store from turns produced by export_turns (untagged turns are skipped)."""
+        for turn in turns:
+            turn = dict(turn)
+            session_id = turn.pop("session_id", None)
+            self.append_turn(session_id, turn)
+
+    @property
+    def turn_count(self) -> int:
+        return self.stats()["stored_turns"]
+
+    def __len__(self) -> int:
+        return self.stats()["active_sessions"]
+
+    def _restore(self, session_id: str) -> List[Dict]:
+        try:
+            turns = self.loader(session_id, self.max_turns)
+        except Exception as e:
+            logger.error(f"Error restoring session {session_id}: {e}")
+            return []
+        if turns:
+            self._seed(session_id, turns[-self.max_turns:])
+        return self._read(session_id, self.max_turns)
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """Forget a session entirely."""
+
+    @abstractmethod
+    def export_turns(self) -> List[Dict]:
+        """Flatten all live sessions into a list of turns tagged with their session id."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Store statistics; must include active_sessions and stored_turns."""
+
+    @abstractmethod
+    def _read(self, session_id: str, limit: int) -> List[Dict]:
+        """The last `limit` turns of a session, oldest first."""
+
+    @abstractmethod
+    def _write(self, session_id: str, turn: Dict[str, Any]):
+        """Append one turn, trimming the session to max_turns and refreshing its TTL."""
+
+    @abstractmethod
+    def _seed(self, session_id: str, turns: List[Dict]):
+        """Store restored turns unless another worker already wrote the session."""
+
+
+class SqliteSessionStore(SharedSessionStore):
+    """
+    Session store in a SQLite file (WAL mode), shared by the workers of one host.
+
+    Every thread of every process gets its own connection; connections are
+    reopened after a fork. Expired sessions are swept at most once per
+    `sweep_interval` seconds per process.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, max_turns: int = 10, ttl_seconds: float = 3600,
+                 sweep_interval: float = 60, loader: Optional[Callable[[str, int], List[Dict]]] = None):
+        """
+        Args:
+            path: SQLite database file
+            max_turns: Turns kept per session
+            ttl_seconds: Idle time after which a session expires
+            sweep_interval: Seconds between deletions of expired sessions
+            loader: See SharedSessionStore
+        """
+        super().__init__(max_turns, ttl_seconds, loader)
+        self.path = path
+        self.sweep_interval = sweep_interval
+        # Sliding expiry is refreshed at most this often per session to keep reads mostly read-only
+        self._touch_interval = min(60.0, ttl_seconds / 10)
+        self._local = threading.local()
+        self._last_sweep = 0.0
+
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS session_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                turn TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_turns ON session_turns (session_id, id);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions (last_access);
+        """)
+
+    @classmethod
+    def from_env(cls) -> "SqliteSessionStore":
+        """Create a store from SESSION_SQLITE_PATH and SESSION_* environment variables."""
+        return cls(
+            os.getenv("SESSION_SQLITE_PATH", "sessions.db"),
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "10")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+        )
+
+    def clear(self, session_id: str):
+        """Forget a session entirely."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def export_turns(self) -> List[Dict]:
+        """Flatten all live sessions into a list of turns tagged with their session id."""
+        rows = self._conn().execute(
+            "SELECT t.session_id, t.turn FROM session_turns t JOIN sessions s USING (session_id) "
+            "WHERE s.last_access >= ? ORDER BY t.id",
+            (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        return [dict(json.loads(turn), session_id=session_id) for session_id, turn in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        cutoff = time.time() - self.ttl_seconds
+        active_sessions = conn.execute("SELECT COUNT(*) FROM sessions WHERE last_access >= ?", (cutoff,)).fetchone()[0]
+        stored_turns = conn.execute("SELECT COUNT(*) FROM session_turns").fetchone()[0]
+        return {
+            "backend": self.backend,
+            "path": self.path,
+            "active_sessions": active_sessions,
+            "stored_turns": stored_turns,
+        }
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connection of the current thread, reopened in a forked child."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _read(self, session_id: str, limit: int) -> List[Dict]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return []
+        if now - row[0] > self.ttl_seconds:
+            self.clear(session_id)
+            return []
+        if now - row[0] > self._touch_interval:
+            with conn:
+                conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+
+        rows = conn.execute(
+            "SELECT turn FROM session_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?", (session_id, limit)
+        ).fetchall()
+        return [json.loads(turn) for turn, in reversed(rows)]
+
+    def _write(self, session_id: str, turn: Dict[str, Any]):
+        with self._conn() as conn:
+            self._insert(conn, session_id, [turn])
+        self._maybe_sweep()
+
+    def _seed(self, session_id: str, turns: List[Dict]):
+        conn = self._conn()
+        with conn:
+            exists = conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if not exists:
+                self._insert(conn, session_id, turns)
+
+    def _insert(self, conn: sqlite3.Connection, session_id: str, turns: List[Dict]):
+        """Append turns, refresh the session and trim it to max_turns (inside the caller's transaction)."""
+        conn.executemany(
+            "INSERT INTO session_turns (session_id, turn) VALUES (?, ?)",
+            [(session_id, json.dumps(turn, ensure_ascii=False, default=str)) for turn in turns]
+        )
+        conn.execute(
+            "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time())
+        )
+        conn.execute(
+            "DELETE FROM session_turns WHERE session_id = ? AND id <= ("
+            "SELECT id FROM session_turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (session_id, session_id, self.max_turns)
+        )
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        cutoff = now - self.ttl_seconds
+        with self._conn() as conn:
+            conn.execute(
+                "DELETE FROM session_turns WHERE session_id IN (SELECT session_id FROM sessions WHERE last_access < ?)",
+                (cutoff,)
+            )
+            conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+
+
+class RedisSessionStore(SharedSessionStore):
+    """
+    Session store in Redis (or anything speaking its protocol), shared across hosts.
+
+    Each session is a capped list of JSON turns whose key expires after
+    `ttl_seconds` without activity. `client` is a redis-py style client; use
+    the `redis` package for a real server or fake_redis.FakeRedis in tests.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Any, max_turns: int = 10, ttl_seconds: float = 3600,
+                 prefix: str = "career-chat:session:",
+                 loader: Optional[Callable[[str, int], List[Dict]]] = None):
+        """
+        Args:
+            client: redis-py compatible client
+            max_turns: Turns kept per session
+            ttl_seconds: Idle time after which a session expires
+            prefix: Key prefix of the session lists
+            loader: See SharedSessionStore
+        """
+        super().__init__(max_turns, ttl_seconds, loader)
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls) -> "RedisSessionStore":
+        """
+        Create a store from SESSION_REDIS_URL and SESSION_* environment variables.
+
+        A URL starting with fake:// uses the in-process stand-in (fake_redis).
+        """
+        url = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+        if url.startswith("fake://"):
+            from fake_redis import FakeRedis
+            client = FakeRedis.from_url(url)
+        else:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        return cls(
+            client,
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "10")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+            prefix=os.getenv("SESSION_REDIS_PREFIX", "career-chat:session:"),
+        )
+
+    def clear(self, session_id: str):
+        """Forget a session entirely."""
+        self.client.delete(self._key(session_id))
+
+    def export_turns(self) -> List[Dict]:
+        """Flatten all live sessions into a list of turns tagged with their session id."""
+        turns = []
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            session_id = key[len(self.prefix):]
+            turns.extend(dict(json.loads(value), session_id=session_id) for value in self.client.lrange(key, 0, -1))
+        return turns
+
+    def stats(self) -> Dict[str, Any]:
+        # SCAN walks the keyspace; fine for /status, not for the request path
+        active_sessions = stored_turns = 0
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            active_sessions += 1
+            stored_turns += self.client.llen(key)
+        return {
+            "backend": self.backend,
+            "active_sessions": active_sessions,
+            "stored_turns": stored_turns,
+        }
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _read(self, session_id: str, limit: int) -> List[Dict]:
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.lrange(key, -limit, -1)
+        pipe.expire(key, int(self.ttl_seconds))
+        values, _ = pipe.execute()
+        return [json.loads(value) for value in values]
+
+    def _write(self, session_id: str, turn: Dict[str, Any]):
+        self._push(session_id, [turn])
+
+    def _seed(self, session_id: str, turns: List[Dict]):
+        # Racing restores of the same session can at worst duplicate turns once; the list stays capped
+        if not self.client.exists(self._key(session_id)):
+            self._push(session_id, turns)
+
+    def _push(self, session_id: str, turns: List[Dict]):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *[json.dumps(turn, ensure_ascii=False, default=str) for turn in turns])
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, int(self.ttl_seconds))
+        pipe.execute()
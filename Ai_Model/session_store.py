@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough per-turn bookkeeping cost (dict, deque slot, timestamp) on top of the text itself
+TURN_OVERHEAD_BYTES = 256
+
+
+class _Session:
+    """Ring buffer of (size, turn) pairs plus LRU/TTL bookkeeping for one session."""
+
+    __slots__ = ("turns", "size", "last_access")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.size = 0
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Bounded, thread-safe store of conversation turns keyed by session id.
+
+    Each session keeps at most `max_turns` turns in a ring buffer. Whole sessions
+    are evicted least-recently-used first when they are idle for longer than
+    `ttl_seconds`, when there are more than `max_sessions` of them, or when the
+    estimated memory footprint exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_turns: int = 10, max_sessions: int = 10000,
+                 ttl_seconds: float = 3600, max_bytes: int = 64 * 1024 * 1024,
+                 loader: Optional[Callable[[str, int], List[Dict]]] = None):
+        """
+        Args:
+            max_turns: Turns kept per session (oldest dropped first)
+            max_sessions: Maximum number of live sessions
+            ttl_seconds: Idle time after which a session expires
+            max_bytes: Hard cap on the estimated size of all stored turns
+            loader: Optional callable (session_id, max_turns) -> turns used to lazily
+                restore sessions that are not in memory (e.g. ConversationLog.load_session)
+        """
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.loader = loader
+
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.turn_count = 0
+        self.evictions = 0
+        self.last_interaction: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """
+        Create a store configured from SESSION_* environment variables.
+
+        SESSION_BACKEND selects where turns live: "memory" (default, per process),
+        "sqlite" (shared by the workers of one host) or "redis" (shared across
+        hosts). The shared backends are required when running several workers.
+        """
+        backend = os.getenv("SESSION_BACKEND", "memory")
+        if backend == "sqlite":
+            from session_backends import SqliteSessionStore
+            return SqliteSessionStore.from_env()
+        if backend == "redis":
+            from session_backends import RedisSessionStore
+            return RedisSessionStore.from_env()
+        if backend != "memory":
+            raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+        return cls(
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "10")),
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+
+    def get_history(self, session_id: Optional[str], limit: Optional[int] = None) -> List[Dict]:
+        """
+        Return the stored turns for a session, oldest first.
+
+        Args:
+            session_id: Session identifier. None means an anonymous, stateless request
+            limit: Only return the most recent `limit` turns
+
+        Returns:
+            List of turn dictionaries (empty for unknown or expired sessions that the
+            loader, if any, cannot restore)
+        """
+        if not session_id:
+            return []
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            now = time.monotonic()
+            if session is not None and now - session.last_access > self.ttl_seconds:
+                self._drop(session_id)
+                session = None
+
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+                turns = [turn for _, turn in session.turns]
+                return turns[-limit:] if limit else turns
+
+        if self.loader is None:
+            return []
+        turns = self._restore(session_id)
+        return turns[-limit:] if limit else turns
+
+    def append_turn(self, session_id: Optional[str], turn: Dict[str, Any]):
+        """
+        Append a completed turn to a session, evicting old data as needed.
+
+        Args:
+            session_id: Session identifier. Anonymous turns (None) are not stored
+            turn: Turn dictionary with at least "user" and "assistant" keys
+        """
+        if not session_id:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._add(session_id, turn, now)
+            self.last_interaction = turn.get("timestamp")
+            self._evict(now)
+
+    def clear(self, session_id: str):
+        """Forget a session entirely."""
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def export_turns(self) -> List[Dict]:
+        """Flatten all live sessions into a list of turns tagged with their session id."""
+        with self._lock:
+            return [
+                dict(turn, session_id=session_id)
+                for session_id, session in self._sessions.items()
+                for _, turn in session.turns
+            ]
+
+    def load_turns(self, turns: List[Dict]):
+        """Seed the store from turns produced by export_turns (untagged turns are skipped)."""
+        for turn in turns:
+            turn = dict(turn)
+            session_id = turn.pop("session_id", None)
+            self.append_turn(session_id, turn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return store size and eviction counters."""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "active_sessions": len(self._sessions),
+                "stored_turns": self.turn_count,
+                "estimated_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _restore(self, session_id: str) -> List[Dict]:
+        """Lazily load a session that is not in memory through the loader."""
+        try:
+            turns = self.loader(session_id, self.max_turns)
+        except Exception as e:
+            logger.error(f"Error restoring session {session_id}: {e}")
+            return []
+
+        with self._lock:
+            # Another request may have restored or written the session meanwhile
+            if session_id not in self._sessions:
+                for turn in turns:
+                    self._add(session_id, turn, time.monotonic())
+                self._evict(time.monotonic())
+            session = self._sessions.get(session_id)
+            return [turn for _, turn in session.turns] if session else []
+
+    def _add(self, session_id: str, turn: Dict[str, Any], now: float):
+        """Append a turn to a session's ring buffer (caller holds the lock)."""
+        size = self._estimate_size(turn)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session(self.max_turns)
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+
+        if len(session.turns) == session.turns.maxlen:
+            dropped_size, _ = session.turns.popleft()
+            session.size -= dropped_size
+            self.total_bytes -= dropped_size
+            self.turn_count -= 1
+
+        session.turns.append((size, turn))
+        session.size += size
+        session.last_access = now
+        self.total_bytes += size
+        self.turn_count += 1
+
+    def _evict(self, now: float):
+        """Drop expired sessions, then LRU sessions until within count and memory caps."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            expired = now - session.last_access > self.ttl_seconds
+            over_capacity = len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+            if not (expired or over_capacity):
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self.total_bytes -= session.size
+        self.turn_count -= len(session.turns)
+
+    @staticmethod
+    def _estimate_size(turn: Dict[str, Any]) -> int:
+        return TURN_OVERHEAD_BYTES + sum(
+            len(value) if isinstance(value, str) else len(str(value))
+            for value in turn.values()
+        )
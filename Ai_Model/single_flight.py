@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Collapse identical concurrent Gemini calls into one.
+
+    The first caller for a key runs the call; callers arriving with the same key
+    while it is in flight wait for that result (or exception) instead of issuing
+    their own request. Threads and asyncio tasks share the same in-flight table,
+    so it serves both the threaded Flask server and the FastAPI event loop.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, request_options: Dict[str, Any]) -> str:
+        """Hash of the model name, rendered prompt and request options (generation config etc.)."""
+        payload = json.dumps([model_name, prompt, request_options], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` unless an identical call is in flight, in which case wait for its result."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of `do`; `fn` is a coroutine function."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        # Shielded so a disconnecting leader does not cancel the call its followers wait on
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._resolve(key, future, done))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+            }
+
+    def _join(self, key: str):
+        """Return (future, is_leader) for a key, registering a new call if none is in flight."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str):
+        with self._lock:
+            del self._in_flight[key]
+            self.calls += 1
+
+    def _resolve(self, key: str, future: Future, task: "asyncio.Future"):
+        self._finish(key)
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
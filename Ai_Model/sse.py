@@ -0,0 +1,25 @@
+import json
+from typing import Any, Dict, Optional
+
+# Headers that keep proxies (nginx) from buffering the event stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Serialize one Server-Sent Event.
+
+    Args:
+        data: JSON-serializable payload for the event's data field
+        event: Optional event name (clients default to "message")
+
+    Returns:
+        The event encoded as text, terminated by a blank line
+    """
+    message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """
+    Startup phases and readiness of one server process.
+
+    The server binds its port right away and answers liveness probes, while
+    the heavy imports, model loading and Gemini warm-up run in the background.
+    Readiness only flips once that finished, so load balancers and
+    autoscalers send traffic to warm instances only. A failed startup is
+    retried with exponential backoff; once `max_attempts` runs failed the
+    process reports itself as not alive, so the orchestrator restarts it
+    instead of keeping a worker that can never become ready.
+    """
+
+    def __init__(self, max_attempts: int = 3, retry_seconds: float = 2.0):
+        """
+        Args:
+            max_attempts: Startup runs before giving up (liveness then fails)
+            retry_seconds: Delay before the first retry, doubled per retry
+        """
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.started_at = time.monotonic()
+        self.phases: Dict[str, int] = {}
+        self.ready = False
+        self.failed = False
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.warm_up: Optional[Dict[str, Any]] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Startup":
+        """Create startup tracking configured from STARTUP_MAX_ATTEMPTS and STARTUP_RETRY_SECONDS."""
+        return cls(
+            max_attempts=int(os.getenv("STARTUP_MAX_ATTEMPTS", "3")),
+            retry_seconds=float(os.getenv("STARTUP_RETRY_SECONDS", "2")),
+        )
+
+    @property
+    def alive(self) -> bool:
+        """False once every startup attempt failed (report it on the liveness probe)."""
+        return not self.failed
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase (reported in milliseconds by status())."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.monotonic() - start) * 1000)
+            logger.info(f"Startup phase {name} took {self.phases[name]} ms")
+
+    def run_in_background(self, fn: Callable[[], Any]):
+        """
+        Run `fn` once per process in a daemon thread and become ready when it returns.
+
+        A run that raises is retried after a backoff, up to max_attempts runs.
+
+        Safe to call repeatedly (e.g. from every request); a forked worker starts
+        its own run because threads do not survive fork().
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.started_at = time.monotonic()
+        threading.Thread(target=self._run, args=(fn,), name="startup", daemon=True).start()
+
+    async def run_async(self, fn: Callable[[], Awaitable[Any]]):
+        """Async variant of run_in_background for servers with an event loop (await it as a task)."""
+        self._pid = os.getpid()
+        while True:
+            self.attempts += 1
+            try:
+                self.warm_up = await fn()
+            except Exception as e:
+                delay = self._failed(e)
+                if delay is None:
+                    return
+                await asyncio.sleep(delay)
+                continue
+            self._ready()
+            return
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "alive": self.alive,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "attempts": self.attempts,
+            "phases_ms": dict(self.phases),
+            "warm_up": self.warm_up,
+            "error": self.error,
+        }
+
+    def _run(self, fn: Callable[[], Any]):
+        while True:
+            self.attempts += 1
+            try:
+                self.warm_up = fn()
+            except Exception as e:
+                delay = self._failed(e)
+                if delay is None:
+                    return
+                time.sleep(delay)
+                continue
+            self._ready()
+            return
+
+    def _ready(self):
+        self.ready = True
+        self.error = None
+        self.phases["total"] = round((time.monotonic() - self.started_at) * 1000)
+        logger.info(f"Ready to serve after {self.phases['total']} ms")
+
+    def _failed(self, error: Exception) -> Optional[float]:
+        """Record a failed run; returns the delay before the next one, or None after the last attempt."""
+        self.error = str(error)
+        if self.attempts >= self.max_attempts:
+            self.failed = True
+            logger.error(f"Startup failed after {self.attempts} attempts, reporting not alive: {error}")
+            return None
+        delay = self.retry_seconds * 2 ** (self.attempts - 1)
+        logger.error(f"Startup attempt {self.attempts} failed, retrying in {delay:.0f}s: {error}")
+        return delay
@@ -1,22 +1,47 @@
 import google.generativeai as genai
-import json
 import os
-import pickle
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict
 import logging
 
+from assessment_batcher import AssessmentBatcher
+from assessment_cache import AssessmentCache
+from career_assistant import CareerAssistantMixin
+from career_kb import CareerKBReloader, CareerKnowledgeBase, as_plain_dict
+from conversation_log import ConversationLog
+from gemini_backend import GeminiBackend
+from history_summary import RollingSummary
+from model_config import load_config, save_config
+from preload import PreloadedData, get_preloaded, register_preloaded
+from prompt_budget import PromptBudget
+from recommendation_parser import RecommendationParser
+from session_store import SessionStore
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class CareerChatbotModel:
-    def __init__(self, api_key: str = None):
+
+class CareerChatbotModel(CareerAssistantMixin):
+    # Key of the data shared by forked workers in preload mode
+    PRELOAD_KEY = "career_chatbot_model"
+    
+    def __init__(self, api_key: str = None, max_concurrency: int = None,
+                 session_store: SessionStore = None, assessment_cache: AssessmentCache = None,
+                 conversation_log: ConversationLog = None):
         """
         Initialize Career Chatbot with Gemini AI
         
         Args:
             api_key: Google AI API key. If None, will look for GOOGLE_API_KEY env variable
+            max_concurrency: Max in-flight async Gemini calls. If None, will look for
+                GEMINI_MAX_CONCURRENCY env variable (default 256)
+            session_store: Per-session conversation store. If None, one is created from
+                SESSION_* env variables
+            assessment_cache: Cache for assess_career_fit results. If None, one is created
+                from ASSESSMENT_CACHE_* env variables
+            conversation_log: Durable append-only history. If None, one is created when
+                CONVERSATION_LOG_PATH is set
         """
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
@@ -25,8 +50,8 @@ class CareerChatbotModel:
         # Configure Gemini AI
         genai.configure(api_key=self.api_key)
         
-        # Initialize model
-        self.model = genai.GenerativeModel('gemini-pro')
+        # Flash/pro models behind one routed call pipeline; created once the system prompt is known
+        self.backend = GeminiBackend.from_env(max_concurrency=max_concurrency)
         
         # Model configuration
         self.generation_config = {
@@ -56,14 +81,44 @@ class CareerChatbotModel:
             }
         ]
         
+        # Token budgets per prompt section; oversized messages are rejected before calling Gemini
+        self.prompt_budget = PromptBudget.from_env()
+        
         # System prompt
         self.system_prompt = self._create_system_prompt()
+        self.backend.configure(self.system_prompt)
+        self.prompt_budget.set_system_prompt(self.system_prompt)
+        
+        # Career database for context (shared copy-on-write with the master when preloaded)
+        preloaded = get_preloaded(self.PRELOAD_KEY)
+        self.career_database = preloaded.career_database if preloaded else self._load_career_database()
+        self._career_matcher = preloaded.career_matcher if preloaded else None
+        self._career_index = preloaded.career_index if preloaded else None
+        # New versions of a compiled knowledge base are picked up without a restart
+        self.career_kb = CareerKBReloader.for_database(self.career_database, self._install_career_kb)
+        
+        # "gemini" (default) or "local" to answer assessments with the career matcher only
+        self.assessment_backend = os.getenv("ASSESSMENT_BACKEND", "gemini")
+        
+        # Conversation history, bounded and kept per session (an empty store is falsy, so test for None)
+        self.session_store = session_store if session_store is not None else SessionStore.from_env()
         
-        # Career database for context
-        self.career_database = self._load_career_database()
+        # Durable history; sessions missing from memory are loaded lazily from the log
+        self.conversation_log = conversation_log or ConversationLog.from_env()
+        if self.conversation_log and self.session_store.loader is None:
+            self.session_store.loader = self.conversation_log.load_session
         
-        # Conversation history
-        self.conversation_history = []
+        # Memoized career assessments keyed on the normalized profile
+        self.assessment_cache = assessment_cache or AssessmentCache.from_env()
+        # ASSESSMENT_BATCH_SIZE > 1: coalesce concurrent assessments into one Gemini call
+        self.assessment_batcher = AssessmentBatcher.from_env(self._assess_batch)
+        
+        # Ask Gemini for schema-constrained JSON and parse replies tolerantly
+        self.structured_output = os.getenv("ASSESSMENT_STRUCTURED_OUTPUT", "1") == "1"
+        self.recommendation_parser = RecommendationParser()
+        
+        # HISTORY_MODE=summary: rolling summary + recent turns under a token budget
+        self.history_summary = RollingSummary.from_env(self.backend)
         
         logger.info("Career Chatbot Model initialized successfully")
     
@@ -163,8 +218,18 @@ KONTEKS INDONESIA:
 
 Mulai setiap percakapan dengan assessment ringan untuk memahami konteks user, lalu berikan guidance yang personal dan practical."""
 
-    def _load_career_database(self) -> Dict:
+    @classmethod
+    def preload(cls):
+        """Build the career database and its compiled index/matcher once, before workers fork"""
+        register_preloaded(cls.PRELOAD_KEY, PreloadedData(cls._load_career_database()))
+    
+    @staticmethod
+    def _load_career_database() -> Dict:
         """Load career database for context and recommendations"""
+        # CAREER_KB_PATH: compiled, memory-mapped knowledge base (python career_kb.py build ...)
+        knowledge_base = CareerKnowledgeBase.from_env()
+        if knowledge_base:
+            return knowledge_base.as_database()
         return {
             "technology": {
                 "software_engineer": {
@@ -234,214 +299,36 @@ Mulai setiap percakapan dengan assessment ringan untuk memahami konteks user, la
             }
         }
 
-    def generate_response(self, user_message: str, user_context: Dict = None) -> str:
-        """
-        Generate AI response based on user message and context
-        
-        Args:
-            user_message: User's input message
-            user_context: Additional context about user (assessment data, history, etc.)
-        
-        Returns:
-            AI generated response
-        """
-        try:
-            # Build conversation context
-            conversation_context = self._build_context(user_message, user_context)
-            
-            # Generate response
-            response = self.model.generate_content(
-                conversation_context,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            
-            # Store conversation
-            self.conversation_history.append({
-                "user": user_message,
-                "assistant": response.text,
-                "timestamp": datetime.now().isoformat(),
-                "context": user_context
-            })
-            
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return self._get_fallback_response()
-
-    def _build_context(self, user_message: str, user_context: Dict = None) -> str:
-        """Build complete context for AI model"""
-        
-        context_parts = [self.system_prompt]
-        
-        # Add user context if available
-        if user_context:
-            context_parts.append(f"\nKONTEKS USER:")
-            if user_context.get("assessment_data"):
-                assessment = user_context["assessment_data"]
-                context_parts.append(f"- Minat: {', '.join(assessment.get('interests', []))}")
-                context_parts.append(f"- Skills: {', '.join(assessment.get('skills', []))}")
-                context_parts.append(f"- Pengalaman: {assessment.get('experience_level', 'Tidak disebutkan')}")
-                context_parts.append(f"- Pendidikan: {assessment.get('education', 'Tidak disebutkan')}")
-                context_parts.append(f"- Work Values: {', '.join(assessment.get('work_values', []))}")
-            
-            if user_context.get("career_stage"):
-                context_parts.append(f"- Career Stage: {user_context['career_stage']}")
-            
-            if user_context.get("goals"):
-                context_parts.append(f"- Goals: {user_context['goals']}")
-        
-        # Add recent conversation history
-        if self.conversation_history:
-            context_parts.append(f"\nRIWAYAT PERCAKAPAN TERBARU:")
-            for conv in self.conversation_history[-3:]:  # Last 3 conversations
-                context_parts.append(f"User: {conv['user']}")
-                context_parts.append(f"CareerMentorAI: {conv['assistant'][:200]}...")
-        
-        # Add current user message
-        context_parts.append(f"\nUser: {user_message}")
-        context_parts.append("CareerMentorAI:")
-        
-        return "\n".join(context_parts)
-
-    def _get_fallback_response(self) -> str:
-        """Fallback response when AI generation fails"""
-        return """Maaf, saya mengalami kendala teknis saat ini. 
-        
-Sebagai alternatif, saya tetap bisa membantu Anda dengan:
-- Memberikan informasi umum tentang berbagai profesi
-- Membantu Anda memahami skill yang dibutuhkan untuk karir tertentu  
-- Memberikan panduan pengembangan karir secara umum
-
-Silakan ajukan pertanyaan spesifik Anda, dan saya akan berusaha membantu dengan pengetahuan yang ada."""
-
-    def assess_career_fit(self, user_profile: Dict) -> List[Dict]:
-        """
-        Assess career fit based on user profile
-        
-        Args:
-            user_profile: Dictionary containing user's interests, skills, etc.
-        
-        Returns:
-            List of career recommendations with fit scores
-        """
-        recommendations = []
-        
-        try:
-            # Build assessment prompt
-            assessment_prompt = f"""
-Berdasarkan profil berikut, berikan 5 rekomendasi karir terbaik dengan scoring:
-
-PROFIL USER:
-- Minat: {', '.join(user_profile.get('interests', []))}
-- Skills: {', '.join(user_profile.get('skills', []))}
-- Pengalaman: {user_profile.get('experience_level', 'Tidak disebutkan')}
-- Pendidikan: {user_profile.get('education', 'Tidak disebutkan')}
-- Work Values: {', '.join(user_profile.get('work_values', []))}
-
-Format output sebagai JSON dengan struktur:
-[
-  {{
-    "career_title": "Nama Profesi",
-    "match_score": 85,
-    "reasons": ["Alasan 1", "Alasan 2"],
-    "next_steps": ["Langkah 1", "Langkah 2"],
-    "salary_range": "Range gaji",
-    "growth_prospect": "Prospek karir"
-  }}
-]
-"""
-            
-            response = self.model.generate_content(
-                self.system_prompt + "\n\n" + assessment_prompt,
-                generation_config=self.generation_config
-            )
-            
-            # Try to parse JSON response
-            try:
-                recommendations = json.loads(response.text)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create structured response manually
-                recommendations = self._create_basic_recommendations(user_profile)
-            
-        except Exception as e:
-            logger.error(f"Error in career assessment: {str(e)}")
-            recommendations = self._create_basic_recommendations(user_profile)
-        
-        return recommendations
-
-    def _create_basic_recommendations(self, user_profile: Dict) -> List[Dict]:
-        """Create basic recommendations when AI assessment fails"""
-        user_skills = [skill.lower() for skill in user_profile.get('skills', [])]
-        user_interests = [interest.lower() for interest in user_profile.get('interests', [])]
-        
-        recommendations = []
-        
-        # Simple matching logic
-        if any(skill in ['programming', 'coding', 'software'] for skill in user_skills):
-            recommendations.append({
-                "career_title": "Software Engineer",
-                "match_score": 80,
-                "reasons": ["Memiliki skill programming", "Sesuai dengan trend teknologi"],
-                "next_steps": ["Perkuat portfolio coding", "Pelajari framework terbaru"],
-                "salary_range": "Rp 8,000,000 - Rp 35,000,000/bulan",
-                "growth_prospect": "Sangat Tinggi"
-            })
-        
-        if any(skill in ['data', 'analysis', 'statistics'] for skill in user_skills):
-            recommendations.append({
-                "career_title": "Data Scientist",
-                "match_score": 75,
-                "reasons": ["Memiliki kemampuan analisis", "Data science sedang berkembang"],
-                "next_steps": ["Pelajari machine learning", "Buat project data analysis"],
-                "salary_range": "Rp 12,000,000 - Rp 40,000,000/bulan",
-                "growth_prospect": "Sangat Tinggi"
-            })
-        
-        # Add more basic recommendations...
-        if not recommendations:
-            recommendations.append({
-                "career_title": "Business Analyst",
-                "match_score": 60,
-                "reasons": ["Karir yang versatile", "Cocok untuk berbagai background"],
-                "next_steps": ["Pelajari business analysis fundamentals", "Dapatkan sertifikasi"],
-                "salary_range": "Rp 8,000,000 - Rp 22,000,000/bulan",
-                "growth_prospect": "Tinggi"
-            })
-        
-        return recommendations
-
-    def save_model_config(self, filepath: str = "career_chatbot_model.pkl"):
-        """Save model configuration and conversation history"""
+    def save_model_config(self, filepath: str = "career_chatbot_model.json"):
+        """Save model configuration (conversation history lives in the conversation log)"""
         model_data = {
             "system_prompt": self.system_prompt,
             "generation_config": self.generation_config,
             "safety_settings": self.safety_settings,
-            "career_database": self.career_database,
-            "conversation_history": self.conversation_history,
+            "career_database": as_plain_dict(self.career_database),
             "model_version": "1.0",
             "created_at": datetime.now().isoformat()
         }
         
         try:
-            with open(filepath, 'wb') as f:
-                pickle.dump(model_data, f)
+            save_config(filepath, model_data)
             logger.info(f"Model configuration saved to {filepath}")
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
 
-    def load_model_config(self, filepath: str = "career_chatbot_model.pkl"):
-        """Load model configuration and conversation history"""
+    def load_model_config(self, filepath: str = "career_chatbot_model.json"):
+        """Load model configuration (legacy .pkl files are still accepted)"""
         try:
-            with open(filepath, 'rb') as f:
-                model_data = pickle.load(f)
+            model_data = load_config(filepath)
             
             self.system_prompt = model_data.get("system_prompt", self.system_prompt)
             self.generation_config = model_data.get("generation_config", self.generation_config)
             self.safety_settings = model_data.get("safety_settings", self.safety_settings)
             self.career_database = model_data.get("career_database", self.career_database)
-            self.conversation_history = model_data.get("conversation_history", [])
+            # Legacy pickles carried history; keep any session-tagged turns
+            self.session_store.load_turns(model_data.get("conversation_history", []))
+            self.backend.configure(self.system_prompt)
+            self.prompt_budget.set_system_prompt(self.system_prompt)
             
             logger.info(f"Model configuration loaded from {filepath}")
             return True
@@ -452,12 +339,21 @@ Format output sebagai JSON dengan struktur:
     def get_model_info(self) -> Dict:
         """Get model information and statistics"""
         return {
-            "model_name": "gemini-1.5-pro-002",
+            "models": self.backend.model_names,
             "system_prompt_length": len(self.system_prompt),
             "career_database_size": sum(len(category) for category in self.career_database.values()),
-            "conversation_count": len(self.conversation_history),
+            "career_knowledge_base": self.career_kb.stats() if self.career_kb else None,
+            "conversation_count": self.session_store.turn_count,
+            "sessions": self.session_store.stats(),
+            "assessment_cache": self.assessment_cache.stats(),
+            "assessment_batcher": self.assessment_batcher.stats() if self.assessment_batcher else None,
+            "assessment_parsing": self.recommendation_parser.stats(),
+            "conversation_log": self.conversation_log.stats() if self.conversation_log else None,
+            "history_summary": self.history_summary.stats() if self.history_summary else None,
+            "prompt_budget": self.prompt_budget.stats(),
+            "gemini": self.backend.stats(),
             "generation_config": self.generation_config,
-            "last_interaction": self.conversation_history[-1]["timestamp"] if self.conversation_history else None
+            "last_interaction": self.session_store.last_interaction
         }
 
 def main():
@@ -495,7 +391,7 @@ def main():
         print("AI Response:", response1)
         
         # Save model configuration
-        chatbot.save_model_config("my_career_chatbot.pkl")
+        chatbot.save_model_config("my_career_chatbot.json")
         
         # Get model info
         info = chatbot.get_model_info()
@@ -1,38 +1,88 @@
-import pickle
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional
 import google.generativeai as genai
-from datetime import datetime
-import json
 import logging
 
+from assessment_batcher import AssessmentBatcher
+from assessment_cache import AssessmentCache
+from career_assistant import CareerAssistantMixin
+from career_kb import CareerKBReloader, CareerKnowledgeBase
+from conversation_log import ConversationLog
+from gemini_backend import GeminiBackend
+from history_summary import RollingSummary
+from model_config import load_config, resolve_config_path
+from preload import PreloadedData, get_preloaded, register_preloaded
+from prompt_budget import PromptBudget
+from recommendation_parser import RecommendationParser
+from session_store import SessionStore
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class GeminiModelImplementation:
+
+class GeminiModelImplementation(CareerAssistantMixin):
     """
     Implementation class for loading and using a saved CareerChatbot configuration.
     """
     
-    def __init__(self, model_path: str = "my_career_chatbot.pkl", api_key: Optional[str] = None):
+    def __init__(self, model_path: str = "my_career_chatbot.json", api_key: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, session_store: Optional[SessionStore] = None,
+                 assessment_cache: Optional[AssessmentCache] = None,
+                 conversation_log: Optional[ConversationLog] = None):
         """
         Initialize the Gemini model implementation.
         
         Args:
-            model_path (str): Path to the saved model configuration file
+            model_path (str): Path to the saved model configuration file (JSON; legacy .pkl
+                is still accepted and a sibling .json is preferred when present)
             api_key (str, optional): Google AI API key. If None, will try to get from environment
+            max_concurrency (int, optional): Max in-flight async Gemini calls. If None, will try
+                GEMINI_MAX_CONCURRENCY from environment (default 256)
+            session_store (SessionStore, optional): Per-session conversation store. If None,
+                one is created from SESSION_* environment variables
+            assessment_cache (AssessmentCache, optional): Cache for assess_career_fit results.
+                If None, one is created from ASSESSMENT_CACHE_* environment variables
+            conversation_log (ConversationLog, optional): Durable append-only history. If None,
+                one is created when CONVERSATION_LOG_PATH is set
         """
-        self.model_path = model_path
+        self.model_path = resolve_config_path(model_path)
         self.model_data = None
-        self.model = None
+        # Flash/pro models behind one routed call pipeline; ready once load_model configures it
+        self.backend = GeminiBackend.from_env(max_concurrency=max_concurrency)
         
         # Configuration from saved data
         self.system_prompt = None
         self.generation_config = None
         self.safety_settings = None
         self.career_database = None
-        self.conversation_history = []
+        self._career_matcher = None
+        self._career_index = None
+        self.career_kb = None
+        
+        # "gemini" (default) or "local" to answer assessments with the career matcher only
+        self.assessment_backend = os.getenv('ASSESSMENT_BACKEND', 'gemini')
+        
+        # An empty store is falsy (len() counts its sessions), so test for None
+        self.session_store = session_store if session_store is not None else SessionStore.from_env()
+        
+        # Durable history; sessions missing from memory are loaded lazily from the log
+        self.conversation_log = conversation_log or ConversationLog.from_env()
+        if self.conversation_log and self.session_store.loader is None:
+            self.session_store.loader = self.conversation_log.load_session
+        self.assessment_cache = assessment_cache or AssessmentCache.from_env()
+        # ASSESSMENT_BATCH_SIZE > 1: coalesce concurrent assessments into one Gemini call
+        self.assessment_batcher = AssessmentBatcher.from_env(self._assess_batch)
+        
+        # Ask Gemini for schema-constrained JSON and parse replies tolerantly
+        self.structured_output = os.getenv('ASSESSMENT_STRUCTURED_OUTPUT', '1') == '1'
+        self.recommendation_parser = RecommendationParser()
+        
+        # HISTORY_MODE=summary: rolling summary + recent turns under a token budget
+        self.history_summary = RollingSummary.from_env(self.backend)
+        
+        # Token budgets per prompt section; oversized messages are rejected before calling Gemini
+        self.prompt_budget = PromptBudget.from_env()
         
         # Set up API key
         self.api_key = api_key or os.getenv('GOOGLE_API_KEY') or os.getenv('GOOGLE_AI_API_KEY')
@@ -44,11 +94,31 @@ class GeminiModelImplementation:
         
         self.load_model()
     
+    @classmethod
+    def preload(cls, model_path: str = "my_career_chatbot.json"):
+        """
+        Load a configuration file and compile its career database once, before workers fork.
+        
+        Instances created afterwards for the same path reuse this data instead of
+        reading and compiling it again.
+        """
+        model_path = resolve_config_path(model_path)
+        model_data = load_config(model_path)
+        register_preloaded(model_path, PreloadedData(cls._load_career_database(model_data), model_data))
+    
+    @staticmethod
+    def _load_career_database(model_data: Dict[str, Any]) -> Dict:
+        """Career data: the compiled knowledge base at CAREER_KB_PATH, else the config's career_database."""
+        knowledge_base = CareerKnowledgeBase.from_env()
+        if knowledge_base:
+            return knowledge_base.as_database()
+        return model_data.get('career_database', {})
+    
     def load_model(self):
-        """Load the saved model configuration from pickle file."""
+        """Load the saved model configuration file (history is not loaded at startup)."""
         try:
-            with open(self.model_path, 'rb') as f:
-                self.model_data = pickle.load(f)
+            preloaded = get_preloaded(self.model_path)
+            self.model_data = preloaded.config if preloaded else load_config(self.model_path)
             
             logger.info(f"Model configuration loaded successfully from {self.model_path}")
             
@@ -57,15 +127,24 @@ class GeminiModelImplementation:
                 self.system_prompt = self.model_data.get('system_prompt', '')
                 self.generation_config = self.model_data.get('generation_config', {})
                 self.safety_settings = self.model_data.get('safety_settings', [])
-                self.career_database = self.model_data.get('career_database', {})
-                self.conversation_history = self.model_data.get('conversation_history', [])
+                self.career_database = (
+                    preloaded.career_database if preloaded else self._load_career_database(self.model_data)
+                )
+                # New versions of a compiled knowledge base are picked up without a restart
+                self.career_kb = CareerKBReloader.for_database(self.career_database, self._install_career_kb)
+                if preloaded:
+                    self._career_index = preloaded.career_index
+                    self._career_matcher = preloaded.career_matcher
+                # Legacy pickles carried history; keep any session-tagged turns
+                self.session_store.load_turns(self.model_data.get('conversation_history', []))
                 
-                # Initialize the Gemini model with loaded configuration
-                self.model = genai.GenerativeModel('gemini-1.5-flash')
+                # Initialize the Gemini model with the loaded system prompt as its system instruction
+                self.backend.configure(self.system_prompt)
+                self.prompt_budget.set_system_prompt(self.system_prompt)
                 
                 logger.info("Model initialized successfully with loaded configuration")
                 logger.info(f"System prompt length: {len(self.system_prompt)}")
-                logger.info(f"Conversation history: {len(self.conversation_history)} messages")
+                logger.info(f"Conversation history: {self.session_store.turn_count} messages")
                 
             else:
                 raise ValueError("Invalid model data format")
@@ -77,202 +156,9 @@ class GeminiModelImplementation:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
-    def generate_response(self, user_message: str, user_context: Dict = None) -> str:
-        """
-        Generate a response using the loaded model configuration.
-        
-        Args:
-            user_message (str): User's input message
-            user_context (dict): Additional context about user
-            
-        Returns:
-            str: Generated response
-        """
-        if not self.model:
-            return "Error: Model not loaded properly."
-        
-        try:
-            # Build conversation context (similar to original implementation)
-            conversation_context = self._build_context(user_message, user_context)
-            
-            # Generate response
-            response = self.model.generate_content(
-                conversation_context,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            
-            # Store conversation in history
-            self.conversation_history.append({
-                "user": user_message,
-                "assistant": response.text,
-                "timestamp": datetime.now().isoformat(),
-                "context": user_context
-            })
-            
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return self._get_fallback_response()
-    
-    def _build_context(self, user_message: str, user_context: Dict = None) -> str:
-        """Build complete context for AI model (same logic as original)"""
-        
-        context_parts = [self.system_prompt]
-        
-        # Add user context if available
-        if user_context:
-            context_parts.append(f"\nKONTEKS USER:")
-            if user_context.get("assessment_data"):
-                assessment = user_context["assessment_data"]
-                context_parts.append(f"- Minat: {', '.join(assessment.get('interests', []))}")
-                context_parts.append(f"- Skills: {', '.join(assessment.get('skills', []))}")
-                context_parts.append(f"- Pengalaman: {assessment.get('experience_level', 'Tidak disebutkan')}")
-                context_parts.append(f"- Pendidikan: {assessment.get('education', 'Tidak disebutkan')}")
-                context_parts.append(f"- Work Values: {', '.join(assessment.get('work_values', []))}")
-            
-            if user_context.get("career_stage"):
-                context_parts.append(f"- Career Stage: {user_context['career_stage']}")
-            
-            if user_context.get("goals"):
-                context_parts.append(f"- Goals: {user_context['goals']}")
-        
-        # Add recent conversation history
-        if self.conversation_history:
-            context_parts.append(f"\nRIWAYAT PERCAKAPAN TERBARU:")
-            for conv in self.conversation_history[-3:]:  # Last 3 conversations
-                context_parts.append(f"User: {conv['user']}")
-                context_parts.append(f"CareerMentorAI: {conv['assistant'][:200]}...")
-        
-        # Add current user message
-        context_parts.append(f"\nUser: {user_message}")
-        context_parts.append("CareerMentorAI:")
-        
-        return "\n".join(context_parts)
-    
-    def _get_fallback_response(self) -> str:
-        """Fallback response when AI generation fails"""
-        return """Maaf, saya mengalami kendala teknis saat ini. 
-        
-Sebagai alternatif, saya tetap bisa membantu Anda dengan:
-- Memberikan informasi umum tentang berbagai profesi
-- Membantu Anda memahami skill yang dibutuhkan untuk karir tertentu  
-- Memberikan panduan pengembangan karir secara umum
-
-Silakan ajukan pertanyaan spesifik Anda, dan saya akan berusaha membantu dengan pengetahuan yang ada."""
-    
-    def assess_career_fit(self, user_profile: Dict) -> List[Dict]:
-        """
-        Assess career fit based on user profile (same logic as original)
-        
-        Args:
-            user_profile: Dictionary containing user's interests, skills, etc.
-        
-        Returns:
-            List of career recommendations with fit scores
-        """
-        recommendations = []
-        
-        if not self.model:
-            return self._create_basic_recommendations(user_profile)
-        
-        try:
-            # Build assessment prompt
-            assessment_prompt = f"""
-Berdasarkan profil berikut, berikan 5 rekomendasi karir terbaik dengan scoring:
-
-PROFIL USER:
-- Minat: {', '.join(user_profile.get('interests', []))}
-- Skills: {', '.join(user_profile.get('skills', []))}
-- Pengalaman: {user_profile.get('experience_level', 'Tidak disebutkan')}
-- Pendidikan: {user_profile.get('education', 'Tidak disebutkan')}
-- Work Values: {', '.join(user_profile.get('work_values', []))}
-
-Format output sebagai JSON dengan struktur:
-[
-  {{
-    "career_title": "Nama Profesi",
-    "match_score": 85,
-    "reasons": ["Alasan 1", "Alasan 2"],
-    "next_steps": ["Langkah 1", "Langkah 2"],
-    "salary_range": "Range gaji",
-    "growth_prospect": "Prospek karir"
-  }}
-]
-"""
-            
-            response = self.model.generate_content(
-                self.system_prompt + "\n\n" + assessment_prompt,
-                generation_config=self.generation_config
-            )
-            
-            # Try to parse JSON response
-            try:
-                recommendations = json.loads(response.text)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create structured response manually
-                recommendations = self._create_basic_recommendations(user_profile)
-            
-        except Exception as e:
-            logger.error(f"Error in career assessment: {str(e)}")
-            recommendations = self._create_basic_recommendations(user_profile)
-        
-        return recommendations
-    
-    def _create_basic_recommendations(self, user_profile: Dict) -> List[Dict]:
-        """Create basic recommendations when AI assessment fails"""
-        user_skills = [skill.lower() for skill in user_profile.get('skills', [])]
-        
-        recommendations = []
-        
-        # Simple matching logic using career database
-        if self.career_database:
-            tech_careers = self.career_database.get('technology', {})
-            business_careers = self.career_database.get('business', {})
-            
-            # Check for tech skills
-            if any(skill in ['programming', 'coding', 'software', 'python'] for skill in user_skills):
-                if 'software_engineer' in tech_careers:
-                    career_data = tech_careers['software_engineer']
-                    recommendations.append({
-                        "career_title": career_data['title'],
-                        "match_score": 80,
-                        "reasons": ["Memiliki skill programming", "Sesuai dengan trend teknologi"],
-                        "next_steps": ["Perkuat portfolio coding", "Pelajari framework terbaru"],
-                        "salary_range": career_data['salary_range'],
-                        "growth_prospect": career_data['growth_prospects']
-                    })
-            
-            # Check for data skills
-            if any(skill in ['data', 'analysis', 'statistics'] for skill in user_skills):
-                if 'data_scientist' in tech_careers:
-                    career_data = tech_careers['data_scientist']
-                    recommendations.append({
-                        "career_title": career_data['title'],
-                        "match_score": 75,
-                        "reasons": ["Memiliki kemampuan analisis", "Data science sedang berkembang"],
-                        "next_steps": ["Pelajari machine learning", "Buat project data analysis"],
-                        "salary_range": career_data['salary_range'],
-                        "growth_prospect": career_data['growth_prospects']
-                    })
-        
-        # Add fallback recommendation
-        if not recommendations:
-            recommendations.append({
-                "career_title": "Business Analyst",
-                "match_score": 60,
-                "reasons": ["Karir yang versatile", "Cocok untuk berbagai background"],
-                "next_steps": ["Pelajari business analysis fundamentals", "Dapatkan sertifikasi"],
-                "salary_range": "Rp 8,000,000 - Rp 22,000,000/bulan",
-                "growth_prospect": "Tinggi"
-            })
-        
-        return recommendations
-    
     def chat_session(self):
         """Start an interactive chat session."""
-        if not self.model:
+        if not self.backend.ready:
             print("Error: Model not loaded properly.")
             return
         
@@ -287,7 +173,7 @@ Format output sebagai JSON dengan struktur:
                 break
             
             try:
-                response = self.generate_response(user_input)
+                response = self.generate_response(user_input, session_id="cli")
                 print(f"\nCareerMentorAI: {response}")
             except Exception as e:
                 print(f"Error: {str(e)}")
@@ -297,13 +183,23 @@ Format output sebagai JSON dengan struktur:
         if self.model_data:
             return {
                 "model_path": self.model_path,
-                "model_loaded": self.model is not None,
+                "model_loaded": self.backend.ready,
                 "system_prompt_length": len(self.system_prompt) if self.system_prompt else 0,
                 "career_database_size": sum(len(category) for category in self.career_database.values()) if self.career_database else 0,
-                "conversation_count": len(self.conversation_history),
+                "career_knowledge_base": self.career_kb.stats() if self.career_kb else None,
+                "conversation_count": self.session_store.turn_count,
+                "sessions": self.session_store.stats(),
+                "assessment_cache": self.assessment_cache.stats(),
+                "assessment_batcher": self.assessment_batcher.stats() if self.assessment_batcher else None,
+                "assessment_parsing": self.recommendation_parser.stats(),
+                "conversation_log": self.conversation_log.stats() if self.conversation_log else None,
+                "history_summary": self.history_summary.stats() if self.history_summary else None,
+                "prompt_budget": self.prompt_budget.stats(),
+                "models": self.backend.model_names,
+                "gemini": self.backend.stats(),
                 "model_version": self.model_data.get("model_version", "Unknown"),
                 "created_at": self.model_data.get("created_at", "Unknown"),
-                "last_interaction": self.conversation_history[-1]["timestamp"] if self.conversation_history else None
+                "last_interaction": self.session_store.last_interaction
             }
         return {"error": "No model data loaded"}
 
@@ -316,7 +212,7 @@ def main():
     try:
         # Load the model (make sure to set your API key)
         model_impl = GeminiModelImplementation(
-            model_path=r"Ai_Model\my_career_chatbot.pkl", 
+            model_path=r"Ai_Model\my_career_chatbot.json", 
             api_key=""  # Replace with your actual API key
         )
         
@@ -375,7 +271,7 @@ def main():
     except Exception as e:
         print(f"Error initializing model: {str(e)}")
         print("Make sure:")
-        print("1. The model file 'my_career_chatbot.pkl' exists")
+        print("1. The model file 'my_career_chatbot.json' exists")
         print("2. Your Google AI API key is correct")
         print("3. You have internet connection")
 
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# Every test runs offline against the fake Gemini backend; set before the modules read their environment
+os.environ.setdefault("GEMINI_BACKEND", "fake")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("FAKE_GEMINI_LATENCY_MS", "0")
+os.environ.setdefault("GEMINI_MAX_ATTEMPTS", "1")
+os.environ.setdefault("GEMINI_BACKOFF_BASE_SECONDS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import FakeBackendConfig, install_fake_backend  # noqa: E402
+
+
+@pytest.fixture
+def fake_gemini():
+    """A fresh, instant fake backend; tests change its error rates while it is installed."""
+    config = FakeBackendConfig(latency_ms=0, jitter_ms=0, seed=0)
+    install_fake_backend(config)
+    return config
@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController, AdmissionRejected, identify_user
+
+CHAT_BODY = {"user_message": "Halo", "session_id": "s1"}
+
+
+def bearer(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"Bearer header.{payload}.signature"
+
+
+def test_identify_user_prefers_token_subject_then_session_then_address():
+    assert identify_user(bearer({"sub": 42}), "s1", "10.0.0.1") == "user:42"
+    assert identify_user("Bearer opaque-token", "s1").startswith("token:")
+    assert identify_user(None, "s1", "10.0.0.1") == "session:s1"
+    assert identify_user(None, None, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_trusted_proxy_headers_identify_the_user():
+    proxies = {"10.0.0.5"}
+    assert identify_user(None, "s1", "10.0.0.5", forwarded_user="42", trusted_proxies=proxies) == "user:42"
+    assert identify_user(None, None, "10.0.0.5", forwarded_for="1.2.3.4, 203.0.113.7",
+                         trusted_proxies=proxies) == "ip:203.0.113.7"
+    assert identify_user(None, None, "10.0.0.5", trusted_proxies=proxies) == "ip:10.0.0.5"
+    # A bearer token still wins over the forwarded header
+    assert identify_user(bearer({"sub": 7}), None, "10.0.0.5", forwarded_user="42",
+                         trusted_proxies=proxies) == "user:7"
+
+
+def test_forwarded_headers_from_other_clients_are_ignored():
+    assert identify_user(None, None, "198.51.100.9", forwarded_user="42", forwarded_for="1.2.3.4",
+                         trusted_proxies={"10.0.0.5"}) == "ip:198.51.100.9"
+    assert identify_user(None, None, "10.0.0.5", forwarded_user="42") == "ip:10.0.0.5"
+
+
+def test_trusted_proxy_address_is_not_limited_per_user():
+    controller = AdmissionController(max_in_flight=10, per_user_in_flight=1, max_queue_wait=0.2,
+                                     trusted_proxies={"10.0.0.5"})
+    proxied = [controller.acquire("ip:10.0.0.5", "chat") for _ in range(3)]
+    assert controller.stats()["in_flight"] == 3
+
+    # A direct client keeps its per-user limit
+    direct = controller.acquire("ip:198.51.100.9", "chat")
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("ip:198.51.100.9", "chat")
+
+    for ticket in proxied + [direct]:
+        ticket.release()
+
+
+def test_trusted_proxies_from_env(monkeypatch):
+    monkeypatch.setenv("ADMISSION_TRUSTED_PROXIES", "10.0.0.5, ::1,")
+    assert AdmissionController.from_env().trusted_proxies == {"10.0.0.5", "::1"}
+
+
+def test_waiting_users_are_served_in_fair_order():
+    controller = AdmissionController(max_in_flight=1, per_user_in_flight=10)
+    order = []
+
+    async def request(user):
+        ticket = await controller.acquire_async(user, "chat")
+        order.append(user)
+        await asyncio.sleep(0)
+        ticket.release()
+
+    async def scenario():
+        holder = await controller.acquire_async("holder", "chat")
+        tasks = []
+        for user in ["spammer"] * 4 + ["quiet"]:
+            tasks.append(asyncio.ensure_future(request(user)))
+            await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # The quiet user waits for one of the spammer's requests, not all of them
+    assert order == ["spammer", "quiet", "spammer", "spammer", "spammer"]
+
+
+def test_per_user_limit_does_not_block_other_users():
+    controller = AdmissionController(max_in_flight=10, per_user_in_flight=1, max_queue_wait=5)
+    first = controller.acquire("a", "chat")
+
+    async def scenario():
+        second = asyncio.ensure_future(controller.acquire_async("a", "chat"))
+        other = await asyncio.wait_for(controller.acquire_async("b", "chat"), 1)
+        assert not second.done()
+        first.release()
+        (await asyncio.wait_for(second, 1)).release()
+        other.release()
+
+    asyncio.run(scenario())
+    assert controller.stats()["admitted"] == {"chat": 3}
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_request_is_shed_when_the_predicted_wait_is_too_long():
+    controller = AdmissionController(max_in_flight=1, max_queue_wait=0.5)
+    with controller.acquire("a", "chat"):
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire("b", "chat")
+    assert rejected.value.retry_after == 1
+    assert controller.stats()["rejected"] == {"chat": 1}
+
+
+def test_queued_request_is_shed_after_max_queue_wait():
+    controller = AdmissionController(max_in_flight=1, max_queue_wait=0.1)
+    # Recent requests were quick, so queueing looks worthwhile
+    controller._service_time = 0.01
+    with controller.acquire("a", "assessment"):
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected):
+            controller.acquire("b", "assessment")
+        assert time.monotonic() - start >= 0.1
+    assert controller.stats()["queue_timeouts"] == {"assessment": 1}
+    assert controller.stats()["queued"]["assessment"] == 0
+
+
+def test_fastapi_answers_shed_requests_with_429_and_retry_after(fake_gemini, monkeypatch):
+    import main_api
+    from tes_gemini import CareerChatbotModel
+
+    controller = AdmissionController(max_in_flight=1, max_queue_wait=0.5)
+    monkeypatch.setattr(main_api, "admission", controller)
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    client = TestClient(main_api.app)
+
+    with controller.acquire("someone-else", "chat"):
+        response = client.post("/chat", json=CHAT_BODY)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    assert client.post("/chat", json=CHAT_BODY).status_code == 200
+
+
+def test_flask_answers_shed_requests_with_429_and_retry_after(fake_gemini, monkeypatch):
+    import app as flask_app
+
+    deadline = time.monotonic() + 30
+    while not flask_app.startup.ready and time.monotonic() < deadline:
+        time.sleep(0.05)
+    controller = AdmissionController(max_in_flight=1, max_queue_wait=0.5)
+    monkeypatch.setattr(flask_app, "admission", controller)
+    client = flask_app.app.test_client()
+
+    with controller.acquire("someone-else", "assessment"):
+        response = client.post("/assess-career", json={"interests": ["data"], "skills": ["SQL"]})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_fastapi_keys_proxied_requests_by_the_forwarded_user(fake_gemini, monkeypatch):
+    import main_api
+    from tes_gemini import CareerChatbotModel
+
+    controller = AdmissionController(trusted_proxies={"testclient"})
+    monkeypatch.setattr(main_api, "admission", controller)
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    users = []
+    acquire_async = controller.acquire_async
+
+    async def recording_acquire(user, kind):
+        users.append(user)
+        return await acquire_async(user, kind)
+
+    monkeypatch.setattr(controller, "acquire_async", recording_acquire)
+    client = TestClient(main_api.app)
+
+    body = {"user_message": "Halo"}
+    assert client.post("/chat", json=body, headers={"X-User-Id": "42"}).status_code == 200
+    assert client.post("/chat", json=body).status_code == 200
+    assert users == ["user:42", "ip:testclient"]
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from assessment_batcher import AssessmentBatcher
+from resilience import CircuitOpenError
+
+def settled_stats(batcher, batches):
+    """Batcher stats once `batches` batches were counted (counters update after the futures resolve)."""
+    deadline = time.monotonic() + 1
+    while batcher.stats()["batches"] < batches and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return batcher.stats()
+
+
+PROFILES = [
+    {"interests": ["data"], "skills": ["Python", "SQL"]},
+    {"interests": ["desain"], "skills": ["Figma"]},
+    {"interests": ["bisnis"], "skills": ["Excel"]},
+    {"interests": ["teknologi"], "skills": ["Java"]},
+]
+
+
+def test_concurrent_profiles_share_one_call():
+    calls = []
+
+    def run_batch(items):
+        calls.append(items)
+        return {profile_id: [{"career_title": profile["skills"][0]}] for profile_id, profile in items}
+
+    batcher = AssessmentBatcher(run_batch, window_ms=2000, max_batch=len(PROFILES))
+    futures = [batcher.submit(profile) for profile in PROFILES]
+
+    # A full batch is sent without waiting for the window to close
+    results = [future.result(timeout=1) for future in futures]
+    assert len(calls) == 1
+    assert results == [[{"career_title": profile["skills"][0]}] for profile in PROFILES]
+    assert settled_stats(batcher, 1)["avg_batch_size"] == len(PROFILES)
+
+
+def test_missing_and_failed_items_resolve_to_none():
+    replies = iter([{"p0": [{"career_title": "Data Analyst"}]}, RuntimeError("boom")])
+    lock = threading.Lock()
+
+    def run_batch(items):
+        with lock:
+            reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    batcher = AssessmentBatcher(run_batch, window_ms=2000, max_batch=2)
+    first = [batcher.submit(profile) for profile in PROFILES[:2]]
+    assert [future.result(timeout=1) for future in first] == [[{"career_title": "Data Analyst"}], None]
+
+    second = [batcher.submit(profile) for profile in PROFILES[2:]]
+    assert [future.result(timeout=1) for future in second] == [None, None]
+
+    stats = settled_stats(batcher, 2)
+    assert stats["failed_items"] == 3
+    assert stats["failed_batches"] == 1
+
+
+def test_refused_batches_raise_in_every_caller():
+    calls = []
+
+    def run_batch(items):
+        calls.append(items)
+        raise CircuitOpenError("Gemini circuit breaker is open")
+
+    batcher = AssessmentBatcher(run_batch, window_ms=2000, max_batch=2)
+    futures = [batcher.submit(profile) for profile in PROFILES[:2]]
+
+    for future in futures:
+        with pytest.raises(CircuitOpenError):
+            future.result(timeout=1)
+    assert len(calls) == 1
+    assert settled_stats(batcher, 1)["failed_items"] == 2
+
+
+def test_wait_gives_up_on_a_stuck_batch():
+    release = threading.Event()
+
+    def run_batch(items):
+        release.wait(5)
+        return {}
+
+    batcher = AssessmentBatcher(run_batch, window_ms=0, max_batch=1, result_timeout=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.wait(PROFILES[0])
+        with pytest.raises(TimeoutError):
+            asyncio.run(batcher.wait_async(PROFILES[1]))
+    finally:
+        release.set()
+
+
+def gemini_calls(model):
+    return sum(key["served"] for pool in model.backend.key_pools.values() for key in pool.stats()["keys"])
+
+
+def test_model_batches_concurrent_assessments(fake_gemini, monkeypatch):
+    monkeypatch.setenv("ASSESSMENT_BATCH_SIZE", str(len(PROFILES)))
+    monkeypatch.setenv("ASSESSMENT_BATCH_WINDOW_MS", "2000")
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+
+    async def assess_all():
+        return await asyncio.gather(*(model.assess_career_fit_async(profile) for profile in PROFILES))
+
+    results = asyncio.run(assess_all())
+    assert all(recommendations and recommendations[0]["career_title"] for recommendations in results)
+    stats = settled_stats(model.assessment_batcher, 1)
+    assert stats["batches"] == 1
+    assert stats["failed_items"] == 0
+
+
+def test_model_falls_back_per_profile_when_the_batch_fails(fake_gemini, monkeypatch):
+    monkeypatch.setenv("ASSESSMENT_BATCH_SIZE", "2")
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+    fake_gemini.error_rate = 1.0
+
+    async def assess_two():
+        return await asyncio.gather(*(model.assess_career_fit_async(profile) for profile in PROFILES[:2]))
+
+    results = asyncio.run(assess_two())
+    # Single-profile retries fail too, so both get the local recommendations
+    assert results == [model.basic_recommendations(profile) for profile in PROFILES[:2]]
+    assert settled_stats(model.assessment_batcher, 1)["failed_batches"] == 1
+
+
+def test_model_does_not_fan_out_when_gemini_refuses_the_batch(fake_gemini, monkeypatch):
+    monkeypatch.setenv("ASSESSMENT_BATCH_SIZE", "2")
+    monkeypatch.setenv("ASSESSMENT_BATCH_WINDOW_MS", "2000")
+    monkeypatch.setenv("GEMINI_KEY_COOLDOWN_SECONDS", "0")
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+    fake_gemini.rate_limit_rate = 1.0
+
+    async def assess_two():
+        return await asyncio.gather(*(model.assess_career_fit_async(profile) for profile in PROFILES[:2]))
+
+    results = asyncio.run(assess_two())
+    assert results == [model.basic_recommendations(profile) for profile in PROFILES[:2]]
+    # One batch call per tier and no single-profile retries
+    assert gemini_calls(model) == 2
+
+
+def test_sync_assessment_falls_back_when_the_batch_times_out(fake_gemini, monkeypatch):
+    monkeypatch.setenv("ASSESSMENT_BATCH_SIZE", "2")
+    monkeypatch.setenv("ASSESSMENT_BATCH_TIMEOUT_SECONDS", "0.1")
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+    fake_gemini.latency_ms = 1000
+
+    assert model.assess_career_fit(PROFILES[0]) == model.basic_recommendations(PROFILES[0])
@@ -0,0 +1,143 @@
+import sqlite3
+
+import pytest
+
+import assessment_cache
+from assessment_cache import AssessmentCache, canonicalize_profile, career_data_version, config_version
+
+PROFILE = {
+    "interests": ["Teknologi", "Desain"],
+    "skills": ["Python", "SQL"],
+    "work_values": ["Work-life balance"],
+    "experience_level": "Entry level",
+    "education": "S1 Informatika",
+}
+RECOMMENDATIONS = [{"career_title": "Data Analyst", "match_score": 80}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(assessment_cache.time, "time", clock.time)
+    return clock
+
+
+def db_keys(path):
+    with sqlite3.connect(path) as db:
+        return {row[0] for row in db.execute("SELECT key FROM assessments")}
+
+
+def test_equivalent_profiles_share_a_key():
+    shuffled = {
+        "interests": ["  desain", "TEKNOLOGI", "Desain"],
+        "skills": ["sql", "python", ""],
+        "work_values": ["work-life   balance"],
+        "experience_level": " entry  LEVEL ",
+        "education": "s1 informatika",
+    }
+
+    assert canonicalize_profile(shuffled) == canonicalize_profile(PROFILE)
+    assert AssessmentCache.make_key(shuffled, "v1") == AssessmentCache.make_key(PROFILE, "v1")
+
+
+def test_key_depends_on_profile_and_version():
+    other = dict(PROFILE, skills=["Python", "Excel"])
+
+    assert AssessmentCache.make_key(other, "v1") != AssessmentCache.make_key(PROFILE, "v1")
+    assert AssessmentCache.make_key(PROFILE, "v2") != AssessmentCache.make_key(PROFILE, "v1")
+
+
+def test_config_version_covers_career_data():
+    config = {"temperature": 0.7}
+    base = config_version("gemini-flash", "prompt", config, career_data_version({"tech": {"a": 1}}))
+
+    assert base == config_version("gemini-flash", "prompt", dict(config), career_data_version({"tech": {"a": 1}}))
+    assert base != config_version("gemini-flash", "prompt", config, career_data_version({"tech": {"a": 2}}))
+    assert base != config_version("gemini-flash", "prompt", {"temperature": 0.2},
+                                  career_data_version({"tech": {"a": 1}}))
+
+
+def test_hits_return_copies():
+    cache = AssessmentCache()
+    cache.put("k", RECOMMENDATIONS)
+
+    cached = cache.get("k")
+    cached[0]["match_score"] = 0
+
+    assert cache.get("k") == RECOMMENDATIONS
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AssessmentCache(max_entries=2)
+    cache.put("a", RECOMMENDATIONS)
+    cache.put("b", RECOMMENDATIONS)
+    cache.get("a")
+    cache.put("c", RECOMMENDATIONS)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["entries"] == 2
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AssessmentCache(ttl_seconds=60)
+    cache.put("k", RECOMMENDATIONS)
+
+    clock.now += 59
+    assert cache.get("k") == RECOMMENDATIONS
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_sqlite_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    AssessmentCache(persist_path=path).put("k", RECOMMENDATIONS)
+
+    restarted = AssessmentCache(persist_path=path)
+    assert restarted.stats()["entries"] == 0
+    assert restarted.get("k") == RECOMMENDATIONS
+    assert restarted.stats()["entries"] == 1
+
+
+def test_sqlite_file_is_bounded_by_max_entries(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = AssessmentCache(max_entries=2, persist_path=path)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.put(key, RECOMMENDATIONS)
+
+    assert db_keys(path) == {"b", "c"}
+
+
+def test_expired_sqlite_rows_are_deleted_on_lookup(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    AssessmentCache(ttl_seconds=60, persist_path=path).put("k", RECOMMENDATIONS)
+
+    # A worker started before the entry expired still has the row in its file
+    reader = AssessmentCache(ttl_seconds=60, persist_path=path)
+    clock.now += 61
+
+    assert reader.get("k") is None
+    assert db_keys(path) == set()
+    assert reader.stats()["entries"] == 0
+
+
+def test_expired_sqlite_rows_are_dropped_on_open(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    AssessmentCache(ttl_seconds=60, persist_path=path).put("k", RECOMMENDATIONS)
+    clock.now += 61
+
+    AssessmentCache(ttl_seconds=60, persist_path=path)
+    assert db_keys(path) == set()
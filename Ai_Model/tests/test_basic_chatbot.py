@@ -0,0 +1,91 @@
+import pytest
+
+from career_assistant import ASSESSMENT_OUTPUT_FORMAT
+from fake_gemini import FakeGenerativeModel
+from model_router import FLASH, PRO
+from recommendation_parser import RECOMMENDATION_SCHEMA
+
+
+@pytest.fixture
+def chatbot(fake_gemini, monkeypatch):
+    monkeypatch.setenv("GEMINI_KEY_COOLDOWN_SECONDS", "0")
+    from app import BasicCareerChatbot
+    return BasicCareerChatbot(api_key="test-key")
+
+
+@pytest.fixture
+def calls(chatbot, monkeypatch):
+    """(model name, prompt, generation_config) of the fake Gemini calls made by `chatbot`."""
+    recorded = []
+    generate_content = FakeGenerativeModel.generate_content
+    models = set(map(id, chatbot.backend._models.values()))
+
+    def recording(self, contents, generation_config=None, **kwargs):
+        # Background work left over from other tests uses other model instances
+        if id(self) in models:
+            recorded.append((self.model_name, contents, generation_config))
+        return generate_content(self, contents, generation_config=generation_config, **kwargs)
+
+    monkeypatch.setattr(FakeGenerativeModel, "generate_content", recording)
+    return recorded
+
+
+def model_name(chatbot, tier):
+    return f"models/{chatbot.backend.model_names[tier]}"
+
+
+def test_short_questions_go_to_flash_and_planning_to_pro(chatbot, calls):
+    chatbot.generate_response("Apa itu data analyst?", session_id="s1")
+    chatbot.generate_response("Tolong buatkan rencana transisi ke data science", session_id="s1")
+
+    assert [call[0] for call in calls] == [model_name(chatbot, FLASH), model_name(chatbot, PRO)]
+    assert calls[0][2] == chatbot.generation_config
+    decisions = chatbot.backend.stats()["routing"]["decisions"]
+    assert decisions == {"flash:factual": 1, "pro:intent": 1}
+
+
+def test_assessment_uses_the_shared_prompt_and_merged_config(chatbot, calls):
+    profile = {"interests": ["Technology"], "skills": ["SQL"], "work_values": ["Impact"]}
+
+    recommendations = chatbot.assess_career_fit(profile)
+
+    assert recommendations[0]["career_title"] == "Data Analyst"
+    name, prompt, generation_config = calls[0]
+    assert name == model_name(chatbot, PRO)
+    assert "berikan 5 rekomendasi" in prompt and prompt.endswith(ASSESSMENT_OUTPUT_FORMAT)
+    assert "- Work Values: Impact" in prompt
+    assert generation_config == dict(chatbot.generation_config, response_mime_type="application/json",
+                                      response_schema=RECOMMENDATION_SCHEMA)
+
+
+def test_requests_fall_back_to_the_other_tier(chatbot, calls):
+    breaker = chatbot.backend.resilience[PRO].breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    recommendations = chatbot.assess_career_fit({"interests": ["Design"], "skills": ["Figma"]})
+
+    assert recommendations[0]["career_title"] == "Data Analyst"
+    assert [call[0] for call in calls] == [model_name(chatbot, FLASH)]
+    assert chatbot.backend.stats()["routing"]["fallbacks"] == {"pro->flash": 1}
+
+
+def test_both_tiers_failing_gives_the_fallback_reply(chatbot, fake_gemini):
+    fake_gemini.error_rate = 1.0
+
+    assert chatbot.generate_response("Apa itu UX designer?") == chatbot.FALLBACK_RESPONSE
+    assert chatbot.assess_career_fit({"skills": ["SQL"]})[0]["career_title"] == "Konsultasi Lebih Lanjut Diperlukan"
+    tiers = chatbot.backend.stats()["routing"]["tiers"]
+    assert tiers[FLASH]["errors"] == tiers[PRO]["errors"] == 2
+
+
+def test_stream_falls_back_before_the_first_chunk(chatbot, calls):
+    breaker = chatbot.backend.resilience[FLASH].breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    reply = "".join(chatbot.generate_response_stream("Apa itu data analyst?", session_id="s2"))
+
+    assert reply.startswith("Terima kasih")
+    assert [call[0] for call in calls] == [model_name(chatbot, PRO)]
+    assert chatbot.session_store.get_history("s2")[0]["assistant"] == reply
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from bulk_assess import EXIT_QUOTA, BulkAssessment, Checkpoint, read_profiles
+
+
+def write_profiles(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            profile = {
+                "id": f"p{i}",
+                "interests": ["Teknologi", f"Minat {i}"],
+                "skills": ["Python", f"Skill {i}"],
+                "experience_level": "Entry",
+                "education": "S1",
+            }
+            f.write(json.dumps(profile) + "\n")
+
+
+def read_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def model(fake_gemini, monkeypatch):
+    # A throttled key would otherwise be skipped for 10s before the quota error surfaces
+    monkeypatch.setenv("GEMINI_KEY_COOLDOWN_SECONDS", "0")
+    from tes_gemini import CareerChatbotModel
+    return CareerChatbotModel()
+
+
+def run(model, input_path, output_path, **kwargs):
+    kwargs.setdefault("concurrency", 1)
+    kwargs.setdefault("checkpoint_every", 1)
+    kwargs.setdefault("report_seconds", 60)
+    return asyncio.run(BulkAssessment(model, str(input_path), str(output_path), **kwargs).run())
+
+
+def test_checkpoint_watermark_absorbs_out_of_order_indexes(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint.json"), "profiles.jsonl")
+    for index in (1, 3, 0):
+        checkpoint.mark_done(index)
+
+    assert checkpoint.watermark == 2
+    assert checkpoint.done == {3}
+    assert checkpoint.completed == 3
+    assert [checkpoint.is_done(i) for i in range(5)] == [True, True, False, True, False]
+
+
+def test_checkpoint_round_trip_and_input_check(tmp_path):
+    path = str(tmp_path / "run.checkpoint.json")
+    checkpoint = Checkpoint(path, "profiles.jsonl")
+    for index in (0, 1, 4):
+        checkpoint.mark_done(index)
+    checkpoint.counters["fallback"] = 1
+    checkpoint.save(output_bytes=123, elapsed=4.5)
+
+    loaded = Checkpoint.load(path, "profiles.jsonl")
+    assert (loaded.watermark, loaded.done, loaded.output_bytes) == (2, {4}, 123)
+    assert loaded.counters["fallback"] == 1
+    assert loaded.elapsed == 4.5
+
+    with pytest.raises(ValueError):
+        Checkpoint.load(path, "other.jsonl")
+
+
+def test_read_profiles_splits_csv_lists(tmp_path):
+    path = tmp_path / "profiles.csv"
+    path.write_text("id,interests,skills,education\nu1,Data; Desain,SQL;Python,S1\n,Seni,,\n", encoding="utf-8")
+
+    rows = list(read_profiles(str(path)))
+    assert rows[0] == (0, "u1", {"interests": ["Data", "Desain"], "skills": ["SQL", "Python"], "education": "S1"})
+    # A blank id falls back to the row number and blank cells are dropped
+    assert rows[1] == (1, "1", {"interests": ["Seni"]})
+
+
+def test_run_writes_one_result_per_profile(model, tmp_path):
+    input_path, output_path = tmp_path / "profiles.jsonl", tmp_path / "results.jsonl"
+    write_profiles(input_path, 5)
+
+    assert run(model, input_path, output_path, concurrency=3) == 0
+
+    results = read_results(output_path)
+    assert sorted(result["index"] for result in results) == list(range(5))
+    assert {result["id"] for result in results} == {f"p{i}" for i in range(5)}
+    assert not any(result["fallback"] for result in results)
+    assert all(result["recommendations"] for result in results)
+
+
+def test_failed_profiles_get_marked_basic_recommendations(model, fake_gemini, tmp_path):
+    input_path, output_path = tmp_path / "profiles.jsonl", tmp_path / "results.jsonl"
+    write_profiles(input_path, 2)
+    fake_gemini.error_rate = 1.0
+
+    assert run(model, input_path, output_path) == 0
+
+    results = read_results(output_path)
+    assert [result["fallback"] for result in results] == [True, True]
+    assert all(result["error"] and result["recommendations"] for result in results)
+    checkpoint = Checkpoint.load(f"{output_path}.checkpoint.json", str(input_path))
+    assert checkpoint.counters["fallback"] == 2
+
+
+def test_quota_stop_resumes_without_duplicates(model, fake_gemini, tmp_path):
+    input_path, output_path = tmp_path / "profiles.jsonl", tmp_path / "results.jsonl"
+    checkpoint_path = f"{output_path}.checkpoint.json"
+    write_profiles(input_path, 6)
+    fake_gemini.rate_limit_rate = 1.0
+
+    assert run(model, input_path, output_path) == EXIT_QUOTA
+    assert read_results(output_path) == []
+
+    # Let a few profiles through, then run out of quota again
+    fake_gemini.rate_limit_rate = 0.0
+    fake_gemini.key_rpm = 2
+    assert run(model, input_path, output_path) == EXIT_QUOTA
+    stopped = Checkpoint.load(checkpoint_path, str(input_path))
+    assert 0 < stopped.completed < 6
+    assert len(read_results(output_path)) == stopped.completed
+
+    # A crash after the last save leaves a partial line behind; resuming cuts it off
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.write('{"index": 99, "partial')
+
+    fake_gemini.key_rpm = 0
+    assert run(model, input_path, output_path) == 0
+
+    results = read_results(output_path)
+    assert [result["index"] for result in results] == list(range(6))
+    assert Checkpoint.load(checkpoint_path, str(input_path)).completed == 6
@@ -0,0 +1,107 @@
+import pytest
+
+from career_index import CareerIndex
+
+
+def career(title, skills, trending=(), **fields):
+    return dict({"title": title, "skills_required": list(skills), "trending_skills": list(trending)}, **fields)
+
+
+DATABASE = {
+    "technology": {
+        "software_engineer": career("Software Engineer", ["Programming", "Problem Solving"], ["Cloud Computing"],
+                                    salary_range="Rp 8-35 juta", growth_prospects="Sangat Tinggi",
+                                    career_path="Junior → Senior → Lead"),
+        "data_analyst": career("Data Analyst", ["SQL", "Statistics"], ["Machine Learning"]),
+        "devops_engineer": career("DevOps Engineer", ["Linux"], ["Cloud Computing"]),
+    },
+    "design": {
+        "ux_designer": career("UX Designer", ["User Research", "Figma"]),
+    },
+    "marketing": {
+        "content_writer": career("Content Writer", ["Writing"], ["SEO"]),
+    },
+}
+
+
+def titles(matches):
+    return [career["title"] for _, career in matches]
+
+
+@pytest.fixture
+def index():
+    return CareerIndex(DATABASE)
+
+
+def test_lookup_by_skill_and_title(index):
+    assert titles(index.search(["SQL"])) == ["Data Analyst"]
+    assert titles(index.search(["Figma"])) == ["UX Designer"]
+    # Title tokens count as much as required skills
+    assert titles(index.search(["writer"])) == ["Content Writer"]
+
+
+def test_synonyms_are_expanded_before_lookup(index):
+    # "ngoding" -> programming, "statistik" -> statistics
+    assert titles(index.search(["Saya suka ngoding"])) == ["Software Engineer"]
+    assert titles(index.search(["statistik"])) == ["Data Analyst"]
+
+
+def test_weak_matches_are_ignored(index):
+    # A category (0.3) or trending skill (0.5) alone is below MIN_RELEVANCE
+    assert index.search(["marketing"]) == []
+    assert index.search(["SEO"]) == []
+    # Together they reach it
+    assert titles(index.search(["SEO marketing"])) == ["Content Writer"]
+    assert index.search(["resep masakan"]) == []
+    assert index.search([]) == []
+
+
+def test_top_k_keeps_the_highest_scores(index):
+    # Engineer in both titles (1.0) plus Cloud Computing (0.5 + 0.5) and Linux (1.0) for DevOps
+    matches = index.search(["engineer", "cloud", "linux"], top_k=1)
+    assert titles(matches) == ["DevOps Engineer"]
+
+    matches = index.search(["engineer", "cloud", "linux", "sql"], top_k=3)
+    assert titles(matches) == ["DevOps Engineer", "Software Engineer", "Data Analyst"]
+
+
+def test_ties_keep_database_order(index):
+    # Both careers score 1.0 + 0.5 + 0.5 for "engineer cloud computing"
+    assert titles(index.search(["engineer cloud computing"])) == ["Software Engineer", "DevOps Engineer"]
+    assert titles(index.search(["engineer cloud computing"], top_k=1)) == ["Software Engineer"]
+
+
+def test_build_context_renders_the_selected_careers(index):
+    context = index.build_context(["Programming"])
+
+    lines = context.splitlines()
+    assert lines[1] == "DATA KARIR RELEVAN (gunakan untuk gaji & jalur karir):"
+    assert lines[2] == (
+        "- Software Engineer (technology): gaji Rp 8-35 juta; prospek Sangat Tinggi; "
+        "jalur Junior → Senior → Lead; skill inti Programming, Problem Solving; skill tren Cloud Computing"
+    )
+    assert len(lines) == 3
+
+
+def test_build_context_is_empty_without_matches(index):
+    assert index.build_context(["resep masakan"]) == ""
+    assert CareerIndex({}).build_context(["SQL"]) == ""
+
+
+def test_build_context_honours_top_k(index):
+    context = index.build_context(["engineer", "cloud", "linux", "sql", "figma"], top_k=2)
+    assert context.count("\n- ") == 2
+    assert "Data Analyst" not in context and "UX Designer" not in context
+
+
+def test_chat_prompt_carries_only_relevant_careers(fake_gemini):
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+
+    prompt = model._build_context("Bagaimana cara jadi UX designer? Saya bisa Figma", session_id="s1")
+
+    career_lines = [line for line in prompt.splitlines() if line.startswith("- ") and "gaji" in line]
+    assert "DATA KARIR RELEVAN" in prompt
+    assert career_lines[0].startswith("- UX/UI Designer (creative):")
+    assert len(career_lines) <= 3
+    assert "Data Scientist" not in prompt
@@ -0,0 +1,167 @@
+import time
+
+import numpy as np
+import pytest
+
+from career_index import CareerIndex
+from career_kb import CareerKBReloader, CareerKnowledgeBase, as_plain_dict, compile_database, load_source
+from career_matcher import CareerMatcher
+
+
+def career(title, skills):
+    return {
+        "title": title,
+        "description": f"Deskripsi {title}",
+        "skills_required": skills,
+        "education": "S1",
+        "salary_range": "Rp 8,000,000 - Rp 20,000,000/bulan",
+        "growth_prospects": "Tinggi",
+        "career_path": "Junior → Senior",
+        "trending_skills": ["AI"],
+    }
+
+
+DATABASE = {
+    "technology": {"data_analyst": career("Data Analyst", ["SQL", "Python"])},
+    "design": {"ux_designer": career("UX/UI Designer", ["Figma", "User Research"])},
+}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_compiled_artifact_reads_back_like_the_source(tmp_path):
+    path = str(tmp_path / "careers.ckb")
+    header = compile_database(DATABASE, path)
+
+    kb = CareerKnowledgeBase(path)
+    assert len(kb) == header["careers"] == 2
+    assert kb.version == header["version"]
+    assert as_plain_dict(kb.as_database()) == DATABASE
+    assert kb.as_database()["technology"]["data_analyst"]["skills_required"] == ["SQL", "Python"]
+
+
+def test_version_defaults_to_a_content_hash(tmp_path):
+    first = compile_database(DATABASE, str(tmp_path / "a.ckb"))
+    second = compile_database(DATABASE, str(tmp_path / "b.ckb"))
+    changed = compile_database({"technology": DATABASE["technology"]}, str(tmp_path / "c.ckb"))
+    assert first["version"] == second["version"] != changed["version"]
+    assert compile_database(DATABASE, str(tmp_path / "d.ckb"), version="2024-06")["version"] == "2024-06"
+
+
+def test_csv_sources_split_list_fields(tmp_path):
+    source = tmp_path / "careers.csv"
+    source.write_text("category,title,skills_required\ntechnology,Data Analyst,SQL; Python\n", encoding="utf-8")
+    assert load_source(str(source)) == {
+        "technology": {"data_analyst": {"title": "Data Analyst", "skills_required": ["SQL", "Python"],
+                                        "trending_skills": []}}
+    }
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not-a-kb.ckb"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        CareerKnowledgeBase(str(path))
+
+
+def test_list_field_empty_for_every_career(tmp_path):
+    database = {"technology": {key: dict(record, trending_skills=[]) for key, record in DATABASE["technology"].items()}}
+    path = str(tmp_path / "careers.ckb")
+    compile_database(database, path)
+
+    kb = CareerKnowledgeBase(path)
+    assert kb.field(0, "trending_skills") == []
+    assert as_plain_dict(kb.as_database()) == database
+    rows, string_ids = kb.field_entries("trending_skills")
+    assert len(rows) == len(string_ids) == 0
+
+
+def test_empty_database_opens(tmp_path):
+    path = str(tmp_path / "careers.ckb")
+    compile_database({}, path)
+
+    kb = CareerKnowledgeBase(path)
+    assert len(kb) == 0
+    assert as_plain_dict(kb.as_database()) == {}
+    assert CareerMatcher(kb.as_database()).recommend({"skills": ["SQL"]}) == []
+
+
+def test_matcher_and_index_read_the_mapped_columns(tmp_path):
+    database = dict(DATABASE, business={
+        "business_analyst": career("Business Analyst", ["SQL", "Excel"]),
+        # A missing scalar field is skipped, like career.get() on a dict
+        "data_engineer": {field: value for field, value in career("Data Engineer", ["SQL", "Python"]).items()
+                          if field != "description"},
+    })
+    path = str(tmp_path / "careers.ckb")
+    compile_database(database, path)
+    view = CareerKnowledgeBase(path).as_database()
+
+    matcher, index = CareerMatcher(view), CareerIndex(view)
+    profile = {"skills": ["Python", "SQL"], "interests": ["data"], "work_values": ["Impact"]}
+    expected = CareerMatcher(database)
+    for got, want in zip(matcher.score(profile), expected.score(profile)):
+        assert np.allclose(got, want)
+    assert matcher.recommend(profile) == expected.recommend(profile)
+    assert index.postings == CareerIndex(database).postings
+    assert index.build_context(["sql python"]) == CareerIndex(database).build_context(["sql python"])
+    # Neither built the nested dicts of the view
+    assert view._nested is None
+
+
+def test_reloader_swaps_in_a_new_version(tmp_path):
+    path = str(tmp_path / "careers.ckb")
+    compile_database(DATABASE, path, version="v1")
+    loaded = []
+    reloader = CareerKBReloader(CareerKnowledgeBase(path), loaded.append, check_seconds=0.01)
+
+    reloader.maybe_reload()
+    assert loaded == []
+
+    compile_database(dict(DATABASE, business={"analyst": career("Business Analyst", ["Excel"])}), path, version="v2")
+    time.sleep(0.02)
+    reloader.maybe_reload()
+    assert wait_for(lambda: reloader.reloads == 1)
+    assert [kb.version for kb in loaded] == ["v2"]
+    assert reloader.stats()["careers"] == 3
+
+
+def test_failed_reload_keeps_the_current_version(tmp_path):
+    path = tmp_path / "careers.ckb"
+    compile_database(DATABASE, str(path), version="v1")
+    reloader = CareerKBReloader(CareerKnowledgeBase(str(path)), lambda kb: None, check_seconds=0.01)
+
+    path.write_bytes(b"broken")
+    time.sleep(0.02)
+    reloader.maybe_reload()
+    assert wait_for(lambda: reloader.last_error is not None)
+    assert reloader.kb.version == "v1"
+    assert reloader.reloads == 0
+
+
+def test_model_serves_the_reloaded_knowledge_base(fake_gemini, monkeypatch, tmp_path):
+    path = str(tmp_path / "careers.ckb")
+    compile_database(DATABASE, path, version="v1")
+    monkeypatch.setenv("CAREER_KB_PATH", path)
+    monkeypatch.setenv("CAREER_KB_RELOAD_SECONDS", "0.01")
+    from tes_gemini import CareerChatbotModel
+    model = CareerChatbotModel()
+    profile = {"interests": ["produk"], "skills": ["Roadmap"]}
+
+    assert model.career_database.version == "v1"
+    key_v1 = model._assessment_cache_key(profile)
+    assert "Product Manager" not in [r["career_title"] for r in model.basic_recommendations(profile)]
+
+    compile_database(dict(DATABASE, product={"product_manager": career("Product Manager", ["Roadmap"])}), path, version="v2")
+    time.sleep(0.02)
+    model._get_career_matcher()
+    assert wait_for(lambda: model.career_database.version == "v2")
+
+    assert model.basic_recommendations(profile)[0]["career_title"] == "Product Manager"
+    # Results cached for the old career data are not reused
+    assert model._assessment_cache_key(profile) != key_v1
@@ -0,0 +1,129 @@
+import json
+import math
+import os
+
+import pytest
+
+from career_matcher import (CATEGORY_WEIGHT, DESCRIPTION_WEIGHT, INTEREST_BLOCK_WEIGHT, REQUIRED_SKILL_WEIGHT,
+                            SKILL_BLOCK_WEIGHT, TITLE_WEIGHT, TRENDING_SKILL_WEIGHT, CareerMatcher)
+from career_terms import expand_terms, tokenize
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "my_career_chatbot.json")
+
+
+def scalar_scores(career_database, user_profile):
+    """Reference scoring: one career at a time, plain-Python cosine over token dicts."""
+    def cosine(row, tokens):
+        if not tokens:
+            return 0.0
+        norm = math.sqrt(sum(weight * weight for weight in row.values())) or 1.0
+        return sum(row.get(token, 0.0) for token in tokens) / norm / math.sqrt(len(tokens))
+
+    skill_tokens = set(expand_terms(user_profile.get("skills", [])))
+    interest_tokens = set(expand_terms(
+        list(user_profile.get("interests", [])) + list(user_profile.get("work_values", []))
+    ))
+    scores = []
+    for category, careers in career_database.items():
+        for career in careers.values():
+            skills = {}
+            for field, weight in (("trending_skills", TRENDING_SKILL_WEIGHT), ("skills_required", REQUIRED_SKILL_WEIGHT)):
+                for skill in career.get(field, []):
+                    for token in tokenize(skill):
+                        skills[token] = max(skills.get(token, 0.0), weight)
+            interests = {}
+            for text, weight in ((career.get("description", ""), DESCRIPTION_WEIGHT),
+                                 (career.get("title", ""), TITLE_WEIGHT), (category, CATEGORY_WEIGHT)):
+                for token in tokenize(text):
+                    interests[token] = max(interests.get(token, 0.0), weight)
+            scores.append((career.get("title", ""), SKILL_BLOCK_WEIGHT * cosine(skills, skill_tokens)
+                           + INTEREST_BLOCK_WEIGHT * cosine(interests, interest_tokens)))
+    return scores
+
+
+def scalar_ranking(career_database, user_profile, top_k=5):
+    scores = scalar_scores(career_database, user_profile)
+    # sorted() is stable: ties keep database order
+    ranked = sorted((entry for entry in scores if entry[1] > 0), key=lambda entry: -entry[1])
+    return ranked[:top_k]
+
+
+def career(title, skills, trending=()):
+    return {"title": title, "skills_required": list(skills), "trending_skills": list(trending)}
+
+
+HAND_SCORED = {
+    "technology": {
+        "sql_developer": career("SQL Developer", ["SQL"]),
+        "reporting_analyst": career("Reporting Analyst", ["SQL", "Excel"]),
+        "accountant": career("Accountant", ["Excel"]),
+    },
+    "finance": {
+        "database_administrator": career("Database Administrator", ["SQL"]),
+    },
+}
+
+
+def test_hand_scored_ranking_keeps_ties_in_database_order():
+    recommendations = CareerMatcher(HAND_SCORED).recommend({"skills": ["SQL"]})
+
+    # SQL only: cosine 1.0 for both single-skill careers, 1/sqrt(2) next to Excel, 0 for Excel alone
+    assert [(r["career_title"], r["match_score"]) for r in recommendations] == [
+        ("SQL Developer", 85),
+        ("Database Administrator", 85),
+        ("Reporting Analyst", 75),
+    ]
+
+
+def test_tie_at_the_cut_off_takes_the_earlier_career():
+    titles = [r["career_title"] for r in CareerMatcher(HAND_SCORED).recommend({"skills": ["SQL"]}, top_k=1)]
+    assert titles == ["SQL Developer"]
+
+
+def test_unknown_skills_dilute_the_profile():
+    recommendations = CareerMatcher(HAND_SCORED).recommend({"skills": ["SQL", "COBOL"]})
+
+    # 0.7 * 1/sqrt(2) for the SQL-only careers
+    assert recommendations[0]["match_score"] == round(50 + 50 * SKILL_BLOCK_WEIGHT / math.sqrt(2))
+    assert CareerMatcher(HAND_SCORED).recommend({"skills": ["COBOL"]}) == []
+
+
+def test_repeated_profile_tokens_count_once():
+    matcher = CareerMatcher(HAND_SCORED)
+    # Python and Java both expand to "programming"; scores stay cosines
+    skill_scores, _ = matcher.score({"skills": ["Python", "Java", "SQL", "sql"]})
+    assert skill_scores.max() <= 1.0
+    assert matcher.recommend({"skills": ["SQL", "sql"]}) == matcher.recommend({"skills": ["SQL"]})
+
+
+def test_empty_profiles_and_databases():
+    assert CareerMatcher(HAND_SCORED).recommend({}) == []
+    assert CareerMatcher(HAND_SCORED).recommend({"skills": [], "interests": []}) == []
+    assert CareerMatcher({}).recommend({"skills": ["SQL"]}) == []
+    assert CareerMatcher(None).recommend({"skills": ["SQL"]}) == []
+
+
+PROFILES = [
+    {"skills": ["Python", "SQL"], "interests": ["Technology", "Data"]},
+    {"skills": ["Figma", "User Research"], "interests": ["desain", "kreatif"], "work_values": ["Impact"]},
+    {"skills": ["Communication"], "interests": ["pemasaran", "media sosial"]},
+    {"skills": ["Excel", "Leadership", "Ngoding"], "interests": ["bisnis"]},
+    {"skills": ["Underwater Basket Weaving"]},
+    {"interests": ["Technology"]},
+]
+
+
+@pytest.mark.parametrize("user_profile", PROFILES)
+def test_vectorized_ranking_matches_scalar_scoring(user_profile):
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        career_database = json.load(f)["career_database"]
+    matcher = CareerMatcher(career_database)
+
+    skill_scores, interest_scores = matcher.score(user_profile)
+    combined = SKILL_BLOCK_WEIGHT * skill_scores + INTEREST_BLOCK_WEIGHT * interest_scores
+    expected = scalar_scores(career_database, user_profile)
+    assert combined.tolist() == pytest.approx([score for _, score in expected], abs=1e-6)
+
+    ranked = [(r["career_title"], r["match_score"]) for r in matcher.recommend(user_profile)]
+    assert ranked == [(title, int(round(50 + 50 * min(score, 1.0))))
+                      for title, score in scalar_ranking(career_database, user_profile)]
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController
+from fake_gemini import FakeGenerativeModel
+from sse import SSE_HEADERS, format_sse
+
+CHAT_BODY = {"user_message": "Saya ingin pindah karir ke data analyst", "session_id": "s1"}
+
+
+def parse_sse(body):
+    """(event, data) pairs of an event stream; events without a name are "message" events."""
+    assert body.endswith("\n\n"), body
+    events = []
+    for block in body[:-2].split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        assert set(fields) <= {"event", "data"}, block
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_format_sse_frames_one_json_event():
+    assert format_sse({"text": "Halo"}) == 'data: {"text": "Halo"}\n\n'
+    assert format_sse({"status": "success"}, event="done") == 'event: done\ndata: {"status": "success"}\n\n'
+
+
+def test_format_sse_keeps_multiline_text_in_one_data_line():
+    message = format_sse({"text": "Gaji:\n\nRp 8 juta – 18 juta"})
+    assert message == 'data: {"text": "Gaji:\\n\\nRp 8 juta – 18 juta"}\n\n'
+    assert parse_sse(message) == [("message", {"text": "Gaji:\n\nRp 8 juta – 18 juta"})]
+
+
+@pytest.fixture
+def main_api(fake_gemini, monkeypatch):
+    import main_api
+    from tes_gemini import CareerChatbotModel
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    monkeypatch.setattr(main_api, "admission", AdmissionController())
+    return main_api
+
+
+@pytest.fixture
+def gemini_calls(monkeypatch):
+    """Gemini calls as (model, "sync" or "async") pairs."""
+    calls = []
+    generate_content = FakeGenerativeModel.generate_content
+    generate_content_async = FakeGenerativeModel.generate_content_async
+
+    def recording(self, *args, **kwargs):
+        calls.append((self, "sync"))
+        return generate_content(self, *args, **kwargs)
+
+    async def recording_async(self, *args, **kwargs):
+        calls.append((self, "async"))
+        return await generate_content_async(self, *args, **kwargs)
+
+    monkeypatch.setattr(FakeGenerativeModel, "generate_content", recording)
+    monkeypatch.setattr(FakeGenerativeModel, "generate_content_async", recording_async)
+    return calls
+
+
+def calls_of(model, gemini_calls):
+    # Background threads of other tests call Gemini too; keep this model's calls only
+    models = {id(tier_model) for tier_model in model.backend._models.values()}
+    return [kind for tier_model, kind in gemini_calls if id(tier_model) in models]
+
+
+def test_chat_uses_the_async_gemini_path(main_api, fake_gemini, gemini_calls):
+    client = TestClient(main_api.app)
+
+    response = client.post("/chat", json=CHAT_BODY)
+
+    assert response.status_code == 200
+    assert response.json() == {"response": fake_gemini.text_response}
+    assert calls_of(main_api.chatbot_model, gemini_calls) == ["async"]
+    history = main_api.chatbot_model.session_store.get_history("s1")
+    assert [(t["user"], t["assistant"]) for t in history] == [(CHAT_BODY["user_message"], fake_gemini.text_response)]
+
+
+def test_concurrent_chats_overlap_on_the_event_loop(main_api, fake_gemini):
+    fake_gemini.latency_ms = 300
+    fake_gemini.latency_distribution = "fixed"
+
+    async def chat_concurrently(count):
+        transport = httpx.ASGITransport(app=main_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/chat", json={"user_message": "Halo", "session_id": f"s{i}"}) for i in range(count)
+            ))
+
+    start = time.perf_counter()
+    responses = asyncio.run(chat_concurrently(4))
+    elapsed = time.perf_counter() - start
+
+    assert [response.status_code for response in responses] == [200] * 4
+    # Four 300 ms Gemini calls one after another would take 1.2 s
+    assert elapsed < 0.9
+
+
+def test_chat_answers_with_the_fallback_when_gemini_fails(main_api, fake_gemini):
+    fake_gemini.error_rate = 1.0
+    client = TestClient(main_api.app)
+
+    response = client.post("/chat", json=CHAT_BODY)
+
+    assert response.status_code == 200
+    assert response.json()["response"] != fake_gemini.text_response
+    assert main_api.chatbot_model.session_store.get_history("s1") == []
+
+
+def test_stream_sends_chunks_then_done(main_api, fake_gemini, gemini_calls):
+    client = TestClient(main_api.app)
+
+    response = client.post("/chat/stream", json=CHAT_BODY)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    for name, value in SSE_HEADERS.items():
+        assert response.headers[name] == value
+    events = parse_sse(response.text)
+    assert events[-1] == ("done", {"status": "success"})
+    chunks = events[:-1]
+    assert len(chunks) == fake_gemini.stream_chunks
+    assert all(event == "message" for event, _ in chunks)
+    assert "".join(data["text"] for _, data in chunks) == fake_gemini.text_response
+    assert calls_of(main_api.chatbot_model, gemini_calls) == ["async"]
+    # The turn is stored once, after the last chunk
+    history = main_api.chatbot_model.session_store.get_history("s1")
+    assert [t["assistant"] for t in history] == [fake_gemini.text_response]
+
+
+def test_stream_sends_the_fallback_when_gemini_fails_before_the_first_chunk(main_api, fake_gemini):
+    fake_gemini.error_rate = 1.0
+    client = TestClient(main_api.app)
+
+    events = parse_sse(client.post("/chat/stream", json=CHAT_BODY).text)
+
+    assert [event for event, _ in events] == ["message", "done"]
+    assert events[0][1]["text"] != fake_gemini.text_response
+    assert main_api.chatbot_model.session_store.get_history("s1") == []
+
+
+def test_stream_ends_with_an_error_event_and_frees_its_slot(main_api, monkeypatch):
+    async def failing_stream(user_message, user_context=None, session_id=None):
+        yield "Halo"
+        raise RuntimeError("koneksi terputus")
+
+    monkeypatch.setattr(main_api.chatbot_model, "generate_response_stream_async", failing_stream)
+    client = TestClient(main_api.app)
+
+    events = parse_sse(client.post("/chat/stream", json=CHAT_BODY).text)
+
+    assert events == [
+        ("message", {"text": "Halo"}),
+        ("error", {"error": "Error generating chat response: koneksi terputus"}),
+    ]
+    assert main_api.admission.stats()["in_flight"] == 0
+
+
+def test_flask_stream_uses_the_same_framing(fake_gemini):
+    import app as flask_app
+    deadline = time.monotonic() + 30
+    while not flask_app.startup.ready and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert flask_app.startup.ready, flask_app.startup.status()
+    client = flask_app.app.test_client()
+
+    response = client.post("/chat/stream", json=dict(CHAT_BODY, session_id="flask-stream"))
+
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Buffering"] == "no"
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1] == ("done", {"status": "success"})
+    assert "".join(data["text"] for _, data in events[:-1]) == fake_gemini.text_response
@@ -0,0 +1,180 @@
+import json
+import pickle
+import sqlite3
+import time
+
+import pytest
+
+from conversation_log import ConversationLog
+from model_config import CONFIG_FORMAT_VERSION, load_config, resolve_config_path, save_config
+from session_store import SessionStore
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def turn(i, **fields):
+    return dict({"user": f"pertanyaan {i}", "assistant": f"jawaban {i}", "timestamp": f"2024-01-01T10:00:{i:02d}"},
+                **fields)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "conversations.db")
+
+
+def test_turns_survive_a_restart(log_path):
+    log = ConversationLog(log_path, flush_interval=0.01)
+    for i in range(3):
+        log.append("s1", turn(i, context={"goals": "jadi PM"} if i == 0 else None))
+    log.append("s2", turn(9))
+    log.close()
+    assert log.written_turns == 4
+
+    reopened = ConversationLog(log_path)
+    history = reopened.load_session("s1", limit=10)
+    assert [t["user"] for t in history] == ["pertanyaan 0", "pertanyaan 1", "pertanyaan 2"]
+    assert history[0]["context"] == {"goals": "jadi PM"}
+    assert history[1]["context"] is None
+    assert reopened.load_session("s1", limit=2)[0]["user"] == "pertanyaan 1"
+    assert reopened.load_session("unknown", limit=10) == []
+    reopened.close()
+
+
+def test_log_uses_wal_journaling(log_path):
+    ConversationLog(log_path).close()
+    with sqlite3.connect(log_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_pages_walk_back_through_a_session(log_path):
+    log = ConversationLog(log_path, flush_interval=0.01)
+    for i in range(5):
+        log.append("s1", turn(i))
+    assert wait_for(lambda: log.written_turns == 5)
+
+    first = log.page("s1", limit=2)
+    second = log.page("s1", before_id=first[-1]["id"], limit=2)
+    last = log.page("s1", before_id=second[-1]["id"], limit=2)
+    assert [t["user"] for t in first + second + last] == [f"pertanyaan {i}" for i in (4, 3, 2, 1, 0)]
+    log.close()
+
+
+def test_writes_are_batched(log_path):
+    log = ConversationLog(log_path, batch_size=4, flush_interval=1)
+    for i in range(8):
+        log.append("s1", turn(i))
+    # Two full batches commit without waiting out the flush interval
+    assert wait_for(lambda: log.written_turns == 8, timeout=0.9)
+    assert log.stats()["pending_writes"] == 0
+    log.close()
+
+
+def test_missing_session_is_restored_lazily_from_the_log(log_path):
+    log = ConversationLog(log_path, flush_interval=0.01)
+    for i in range(5):
+        log.append("s1", turn(i))
+    log.close()
+
+    log = ConversationLog(log_path)
+    store = SessionStore(max_turns=3, loader=log.load_session)
+    assert len(store) == 0
+
+    # Only the newest max_turns turns come back, and the session stays in memory afterwards
+    assert [t["user"] for t in store.get_history("s1")] == ["pertanyaan 2", "pertanyaan 3", "pertanyaan 4"]
+    assert len(store) == 1
+    log.close()
+
+
+def test_model_restores_history_after_a_restart(fake_gemini, log_path):
+    from tes_gemini import CareerChatbotModel
+
+    log = ConversationLog(log_path, flush_interval=0.01)
+    first = CareerChatbotModel(session_store=SessionStore(), conversation_log=log)
+    first.generate_response("Apa itu data analyst?", session_id="s1")
+    first.generate_response("Berapa gajinya?", session_id="s1")
+    log.close()
+
+    log = ConversationLog(log_path)
+    restarted = CareerChatbotModel(session_store=SessionStore(), conversation_log=log)
+    history = restarted.session_store.get_history("s1")
+    assert [t["user"] for t in history] == ["Apa itu data analyst?", "Berapa gajinya?"]
+    assert "Berapa gajinya?" in restarted._build_context("Lalu?", session_id="s1")
+    log.close()
+
+
+CONFIG = {
+    "system_prompt": "Anda adalah CareerMentorAI",
+    "generation_config": {"temperature": 0.7},
+    "safety_settings": [],
+    "career_database": {"technology": {"data_analyst": {"title": "Data Analyst", "skills_required": ["SQL"]}}},
+    "model_version": "1.0",
+}
+
+
+def test_config_round_trip_leaves_history_out(tmp_path):
+    path = str(tmp_path / "model.json")
+    save_config(path, dict(CONFIG, conversation_history=[turn(0)]))
+
+    loaded = load_config(path)
+    assert {key: loaded[key] for key in CONFIG} == CONFIG
+    assert loaded["config_format_version"] == CONFIG_FORMAT_VERSION
+    assert "conversation_history" not in loaded
+    assert not (tmp_path / "model.json.tmp").exists()
+
+
+def test_unsupported_configs_are_rejected(tmp_path):
+    newer = tmp_path / "newer.json"
+    newer.write_text(json.dumps(dict(CONFIG, config_format_version=CONFIG_FORMAT_VERSION + 1)), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_config(str(newer))
+
+    not_a_dict = tmp_path / "list.json"
+    not_a_dict.write_text("[]", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_config(str(not_a_dict))
+
+    with pytest.raises(FileNotFoundError):
+        load_config(str(tmp_path / "missing.json"))
+
+
+def test_legacy_pickle_resolves_to_a_sibling_json(tmp_path):
+    pickle_path = tmp_path / "model.pkl"
+    with open(pickle_path, "wb") as f:
+        pickle.dump(dict(CONFIG, system_prompt="dari pickle"), f)
+
+    assert resolve_config_path(str(pickle_path)) == str(pickle_path)
+    save_config(str(tmp_path / "model.json"), CONFIG)
+    assert resolve_config_path(str(pickle_path)) == str(tmp_path / "model.json")
+    assert resolve_config_path(str(tmp_path / "other.json")) == str(tmp_path / "other.json")
+
+
+def test_legacy_pickle_still_loads_with_its_history(fake_gemini, tmp_path):
+    from tes_implement_gemini import GeminiModelImplementation
+    pickle_path = tmp_path / "model.pkl"
+    with open(pickle_path, "wb") as f:
+        pickle.dump(dict(CONFIG, conversation_history=[turn(0, session_id="s1"), turn(1)]), f)
+
+    model = GeminiModelImplementation(model_path=str(pickle_path), session_store=SessionStore())
+    assert model.model_path == str(pickle_path)
+    assert model.system_prompt == CONFIG["system_prompt"]
+    # Session-tagged turns are migrated; untagged ones are skipped
+    assert [t["user"] for t in model.session_store.get_history("s1")] == ["pertanyaan 0"]
+    assert model.session_store.stats()["stored_turns"] == 1
+
+
+def test_model_prefers_the_json_next_to_a_legacy_pickle(fake_gemini, tmp_path):
+    from tes_implement_gemini import GeminiModelImplementation
+    pickle_path = tmp_path / "model.pkl"
+    with open(pickle_path, "wb") as f:
+        pickle.dump(dict(CONFIG, system_prompt="dari pickle"), f)
+    save_config(str(tmp_path / "model.json"), dict(CONFIG, system_prompt="dari json"))
+
+    model = GeminiModelImplementation(model_path=str(pickle_path), session_store=SessionStore())
+
+    assert model.model_path == str(tmp_path / "model.json")
+    assert model.system_prompt == "dari json"
@@ -0,0 +1,155 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from history_summary import RollingSummary
+from model_router import FLASH
+
+
+class RecordingBackend:
+    """Stands in for GeminiBackend.generate and records the summary prompts."""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, prompt, tier, **kwargs):
+        self.calls.append((prompt, tier, kwargs))
+        return SimpleNamespace(text=f" ringkasan {len(self.calls)} ")
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def turns(count, timestamp="2024-01-01T10:00:00"):
+    # Every turn shares one timestamp, as turns written within the clock's resolution do
+    return [{"user": f"pertanyaan {i}", "assistant": f"jawaban {i}", "timestamp": timestamp, "index": i}
+            for i in range(count)]
+
+
+def test_turns_leaving_the_recent_window_are_folded_through_the_flash_tier():
+    backend = RecordingBackend()
+    summary = RollingSummary(backend, recent_turns=2)
+
+    summary.schedule("s1", turns(4))
+    assert wait_for(lambda: summary.stats()["updates"] == 1)
+
+    prompt, tier, kwargs = backend.calls[0]
+    assert tier == FLASH
+    assert "pertanyaan 0" in prompt and "pertanyaan 1" in prompt and "pertanyaan 2" not in prompt
+    assert kwargs["generation_config"]["max_output_tokens"] == summary.summary_max_tokens
+    assert summary.get("s1") == "ringkasan 1"
+
+
+def test_turns_sharing_a_timestamp_are_each_folded_once():
+    backend = RecordingBackend()
+    summary = RollingSummary(backend, recent_turns=1)
+
+    summary.schedule("s1", turns(2))
+    assert wait_for(lambda: summary.stats()["updates"] == 1)
+    summary.schedule("s1", turns(4))
+    assert wait_for(lambda: summary.stats()["updates"] == 2)
+
+    second_prompt = backend.calls[1][0]
+    assert "pertanyaan 0" not in second_prompt
+    assert "pertanyaan 1" in second_prompt and "pertanyaan 2" in second_prompt
+    assert summary.next_index("s1", []) == 3
+
+
+def test_unchanged_history_is_not_summarized_again():
+    backend = RecordingBackend()
+    summary = RollingSummary(backend, recent_turns=1)
+
+    summary.schedule("s1", turns(3))
+    assert wait_for(lambda: summary.stats()["updates"] == 1)
+    summary.schedule("s1", turns(3))
+    assert wait_for(lambda: summary.stats()["pending_updates"] == 0)
+
+    assert len(backend.calls) == 1
+
+
+def test_next_index_follows_history_and_folded_turns():
+    summary = RollingSummary(RecordingBackend(), recent_turns=1)
+
+    assert summary.next_index("s1", []) == 0
+    assert summary.next_index("s1", turns(3)[-1:]) == 3
+    # Turns restored from the conversation log carry no index
+    assert summary.next_index("s1", [{"user": "lama", "assistant": "lama"}]) == 0
+
+
+def render(summary, recent_turns):
+    return "\n".join([summary] + [turn["user"] for turn in recent_turns])
+
+
+def count_words(prompt):
+    return SimpleNamespace(total_tokens=len(prompt.split()))
+
+
+def test_fit_drops_the_oldest_recent_turns_first():
+    summary = RollingSummary(RecordingBackend(), max_input_tokens=9)
+    recent = [{"user": f"kata satu dua {i}"} for i in range(3)]
+
+    prompt = summary.fit(render, "ringkasan", recent, count_words)
+
+    assert prompt == "ringkasan\nkata satu dua 1\nkata satu dua 2"
+    assert summary.stats()["trimmed_prompts"] == 1
+
+
+def test_fit_shortens_the_summary_once_no_turns_are_left():
+    summary = RollingSummary(RecordingBackend(), max_input_tokens=60)
+    long_summary = " ".join(["fakta"] * 100)
+
+    prompt = summary.fit(render, long_summary, [{"user": "halo"}], count_words)
+
+    assert "halo" not in prompt
+    assert prompt.endswith("...")
+    assert len(prompt.split()) <= 60
+
+
+def test_fit_skips_count_tokens_for_small_prompts():
+    summary = RollingSummary(RecordingBackend(), max_input_tokens=3000)
+
+    def fail(prompt):
+        raise AssertionError("count_tokens called for a small prompt")
+
+    assert summary.fit(render, "ringkasan", [{"user": "halo"}], fail) == "ringkasan\nhalo"
+    assert summary.stats()["count_token_calls"] == 0
+
+
+@pytest.fixture
+def summary_model(fake_gemini, monkeypatch):
+    monkeypatch.setenv("HISTORY_MODE", "summary")
+    monkeypatch.setenv("HISTORY_RECENT_TURNS", "1")
+    from tes_gemini import CareerChatbotModel
+    return CareerChatbotModel()
+
+
+def test_model_summarizes_through_its_backend(summary_model):
+    for i in range(3):
+        summary_model.generate_response(f"Bagaimana cara jadi data analyst? ({i})", session_id="s1")
+
+    summary = summary_model.history_summary
+    assert wait_for(lambda: summary.stats()["updates"] >= 1 and summary.stats()["pending_updates"] == 0)
+    assert [turn["index"] for turn in summary_model.session_store.get_history("s1")] == [0, 1, 2]
+    assert summary.get("s1")
+    assert summary_model.backend.stats()["calls"][FLASH]["breaker"]["state"] == "closed"
+
+
+def test_failed_summaries_are_counted_and_keep_the_old_summary(summary_model, fake_gemini):
+    summary_model.generate_response("Apa itu UX designer?", session_id="s1")
+    summary_model.generate_response("Berapa gajinya?", session_id="s1")
+    summary = summary_model.history_summary
+    assert wait_for(lambda: summary.stats()["updates"] == 1 and summary.stats()["pending_updates"] == 0)
+    folded = summary.get("s1")
+
+    fake_gemini.error_rate = 1.0
+    summary.schedule("s1", summary_model.session_store.get_history("s1") + [
+        {"user": "Perlu sertifikasi?", "assistant": "Tidak wajib.", "index": 2}
+    ])
+
+    assert wait_for(lambda: summary.stats()["failures"] == 1 and summary.stats()["pending_updates"] == 0)
+    assert summary.get("s1") == folded
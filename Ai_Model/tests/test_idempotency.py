@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from idempotency import REPLAYED_HEADER, IdempotencyConflict, IdempotencyStore
+from metrics import fallback_served, record_fallback, reset_fallback_served
+
+CHAT_BODY = {"user_message": "Saya ingin pindah karir ke data analyst", "session_id": "s1"}
+PROFILE = {
+    "interests": ["data", "teknologi"],
+    "skills": ["Python", "SQL"],
+    "experience_level": "junior",
+    "education": "S1 Statistika",
+    "work_values": ["growth"],
+}
+
+
+def test_store_replays_only_successful_responses():
+    store = IdempotencyStore()
+    fingerprint = store.fingerprint(b"{}")
+
+    assert store.begin("ok", fingerprint) is None
+    store.finish("ok", 200, b'{"a": 1}')
+    assert store.begin("ok", fingerprint) == (200, b'{"a": 1}')
+
+    assert store.begin("error", fingerprint) is None
+    store.finish("error", 500, b"{}")
+    assert store.begin("error", fingerprint) is None
+
+
+def test_store_rejects_a_reused_key_with_another_body():
+    store = IdempotencyStore()
+    assert store.begin("k", store.fingerprint(b"one")) is None
+    store.finish("k", 200, b"{}")
+    with pytest.raises(IdempotencyConflict):
+        store.begin("k", store.fingerprint(b"two"))
+
+
+def test_retry_waiting_on_an_abandoned_request_runs_it_again():
+    store = IdempotencyStore(wait_seconds=5)
+    fingerprint = store.fingerprint(b"{}")
+    assert store.begin("k", fingerprint) is None
+
+    results = []
+    retry = threading.Thread(target=lambda: results.append(store.begin("k", fingerprint)))
+    retry.start()
+    time.sleep(0.05)
+    store.abandon("k")
+    retry.join(timeout=5)
+
+    # The retry claimed the key itself instead of replaying nothing
+    assert results == [None]
+    assert store.stats()["in_flight"] == 1
+
+
+def test_fallback_flag_is_per_request():
+    reset_fallback_served()
+    assert not fallback_served()
+    record_fallback("chat")
+    assert fallback_served()
+    reset_fallback_served()
+    assert not fallback_served()
+
+
+@pytest.fixture
+def main_api():
+    # Imported before fake_gemini, which would otherwise be replaced by the server's own fake backend
+    import main_api
+    return main_api
+
+
+@pytest.fixture
+def flask_app():
+    import app
+    return app
+
+
+@pytest.fixture
+def fastapi_client(main_api, fake_gemini, monkeypatch):
+    from tes_gemini import CareerChatbotModel
+
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    monkeypatch.setattr(main_api, "idempotency", IdempotencyStore())
+    return TestClient(main_api.app)
+
+
+@pytest.mark.parametrize("path, body", [("/chat", CHAT_BODY), ("/assess-career", PROFILE)])
+def test_fastapi_does_not_replay_fallback_replies(fastapi_client, fake_gemini, path, body):
+    headers = {"Idempotency-Key": f"key-{path}"}
+
+    fake_gemini.error_rate = 1.0
+    fallback = fastapi_client.post(path, json=body, headers=headers)
+    assert fallback.status_code == 200
+
+    # The retry reaches Gemini instead of getting the stored fallback
+    fake_gemini.error_rate = 0.0
+    retry = fastapi_client.post(path, json=body, headers=headers)
+    assert retry.status_code == 200
+    assert REPLAYED_HEADER not in retry.headers
+    assert retry.json() != fallback.json()
+
+    replay = fastapi_client.post(path, json=body, headers=headers)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.json() == retry.json()
+
+
+def test_flask_does_not_replay_fallback_replies(flask_app, fake_gemini, monkeypatch):
+    deadline = time.monotonic() + 30
+    while not flask_app.startup.ready and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert flask_app.startup.ready, flask_app.startup.status()
+    monkeypatch.setattr(flask_app, "idempotency", IdempotencyStore())
+    client = flask_app.app.test_client()
+    headers = {"Idempotency-Key": "flask-key"}
+
+    fake_gemini.error_rate = 1.0
+    fallback = client.post("/chat", json=CHAT_BODY, headers=headers)
+    assert fallback.status_code == 200
+
+    fake_gemini.error_rate = 0.0
+    retry = client.post("/chat", json=CHAT_BODY, headers=headers)
+    assert REPLAYED_HEADER not in retry.headers
+    assert retry.get_json()["response"] != fallback.get_json()["response"]
+
+    replay = client.post("/chat", json=CHAT_BODY, headers=headers)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.get_json() == retry.get_json()
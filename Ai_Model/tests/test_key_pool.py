@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from gemini_backend import GeminiBackend
+from key_pool import KeyPool, QuotaWaitTimeout, TokenBucket
+from model_router import FLASH, PRO
+
+
+def test_token_bucket_refills_continuously_up_to_capacity():
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    bucket.refill(bucket.updated + 30)
+    assert bucket.available == pytest.approx(30)
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.available == bucket.capacity
+    # Amounts above capacity wait for a full bucket instead of forever
+    bucket.take(60)
+    assert bucket.wait_time(1000) == pytest.approx(60)
+
+
+def test_pool_spreads_calls_over_keys_and_times_out_when_all_are_spent():
+    pool = KeyPool(["a", "b"], requests_per_minute=2)
+    served = [pool.acquire(tokens=10, timeout=0.1).api_key for _ in range(4)]
+    assert sorted(served) == ["a", "a", "b", "b"]
+
+    with pytest.raises(QuotaWaitTimeout):
+        pool.acquire(tokens=10, timeout=0.05)
+    assert pool.stats()["wait_timeouts"] == 1
+
+
+def test_caller_waits_for_token_quota():
+    pool = KeyPool([None], tokens_per_minute=600)
+    pool.acquire(tokens=600, timeout=0.1)
+
+    start = time.monotonic()
+    pool.acquire(tokens=5, timeout=2)
+    assert time.monotonic() - start >= 0.4
+    assert pool.stats()["waited"] == 1
+
+
+def test_async_callers_wait_without_blocking_the_loop():
+    pool = KeyPool([None], requests_per_minute=600)
+    for _ in range(600):
+        pool.acquire(tokens=1, timeout=0.1)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        background = asyncio.ensure_future(ticker())
+        await pool.acquire_async(tokens=1, timeout=1)
+        with pytest.raises(QuotaWaitTimeout):
+            await pool.acquire_async(tokens=1, timeout=0.01)
+        background.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 3
+
+
+def test_throttled_key_is_skipped_during_cooldown():
+    pool = KeyPool(["a", "b"], cooldown_seconds=60)
+    pool.throttled(pool.slots[0])
+    assert {pool.acquire(tokens=1, timeout=0.1).api_key for _ in range(3)} == {"b"}
+    assert pool.stats()["keys"][0]["cooling_down"]
+
+
+def test_settle_corrects_the_token_estimate():
+    pool = KeyPool([None], tokens_per_minute=1000)
+    slot = pool.acquire(tokens=100, timeout=0.1)
+    pool.settle(slot, estimated_tokens=100, actual_tokens=400)
+    assert slot.tokens.available == pytest.approx(600, abs=1)
+
+
+def test_backend_rotates_keys_and_queues_locally(fake_gemini, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEYS", "key-a,key-b")
+    monkeypatch.setenv("GEMINI_FLASH_RPM", "1")
+    monkeypatch.setenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "0.2")
+    backend = GeminiBackend.from_env()
+    backend.configure("Anda adalah konselor karir.")
+
+    backend.generate("Pertanyaan pertama", FLASH)
+    backend.generate("Pertanyaan kedua", FLASH)
+    assert [key["served"] for key in backend.key_pools[FLASH].stats()["keys"]] == [1, 1]
+
+    # Both flash keys are spent: the call gives up locally and moves to the pro tier
+    backend.generate("Pertanyaan ketiga", FLASH)
+    assert backend.key_pools[FLASH].stats()["wait_timeouts"] == 1
+    assert backend.key_pools[PRO].stats()["keys"][0]["served"] == 1
+    # A local quota wait says nothing about Gemini's health
+    assert backend.resilience[FLASH].breaker.consecutive_failures == 0
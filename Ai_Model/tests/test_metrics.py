@@ -0,0 +1,124 @@
+import pytest
+
+import metrics
+from metrics import CONTENT_TYPE, MetricsRegistry, once_per_render
+
+
+def test_counter_exposition_with_escaped_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests served", ("path",))
+    counter.inc(path='/a"b')
+    counter.inc(2, path="back\\slash\nnewline")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests served",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 1',
+        'requests_total{path="back\\\\slash\\nnewline"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, stage="gemini")
+
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE latency_seconds histogram"
+    assert lines[2:] == [
+        'latency_seconds_bucket{stage="gemini",le="0.1"} 1',
+        'latency_seconds_bucket{stage="gemini",le="1"} 3',
+        'latency_seconds_bucket{stage="gemini",le="+Inf"} 4',
+        'latency_seconds_sum{stage="gemini"} 4.05',
+        'latency_seconds_count{stage="gemini"} 4',
+    ]
+
+
+def test_labels_must_match_the_declared_names():
+    counter = MetricsRegistry().counter("x_total", "X", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(tier="flash")
+
+
+def test_collected_metrics_and_failing_collectors():
+    registry = MetricsRegistry()
+    registry.collect("sessions", "Live sessions", lambda: 3)
+    registry.collect("queued", "Queued per kind", lambda: [({"kind": "chat"}, 2), ({"kind": "assessment"}, 0.5)])
+    registry.collect("missing", "Not loaded yet", lambda: None)
+    registry.collect("broken", "Fails", lambda: 1 / 0)
+
+    text = registry.render()
+    assert "sessions 3\n" in text
+    assert 'queued{kind="chat"} 2\n' in text and 'queued{kind="assessment"} 0.5\n' in text
+    assert "# TYPE missing gauge\n" in text and "\nmissing " not in text
+    assert "# broken unavailable: division by zero\n" in text
+    assert text.endswith("\n")
+    assert CONTENT_TYPE.startswith("text/plain; version=0.0.4")
+
+
+def test_once_per_render_shares_one_call_per_scrape():
+    calls = []
+
+    def stats():
+        calls.append(1)
+        return {"active_sessions": 2, "stored_turns": 5}
+
+    shared = once_per_render(stats)
+    registry = MetricsRegistry()
+    registry.collect("sessions", "Sessions", lambda: shared()["active_sessions"])
+    registry.collect("turns", "Turns", lambda: shared()["stored_turns"])
+
+    registry.render()
+    assert len(calls) == 1
+    registry.render()
+    assert len(calls) == 2
+    # Outside of a scrape every call goes through
+    shared()
+    assert len(calls) == 3
+
+
+def test_once_per_render_shares_errors_too():
+    calls = []
+
+    def stats():
+        calls.append(1)
+        raise ConnectionError("redis down")
+
+    shared = once_per_render(stats)
+    registry = MetricsRegistry()
+    registry.collect("a", "A", lambda: shared()["x"])
+    registry.collect("b", "B", lambda: shared()["y"])
+
+    text = registry.render()
+    assert len(calls) == 1
+    assert text.count("unavailable: redis down") == 2
+
+
+def test_server_metrics_read_the_session_store_once_per_scrape(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    calls = []
+
+    def session_stats():
+        calls.append(1)
+        return {"active_sessions": 4, "stored_turns": 9, "estimated_bytes": 1024}
+
+    admission = {"in_flight": 1, "queued": {"chat": 0}, "admitted": {"chat": 7}, "rejected": {"chat": 1}}
+    metrics.register_server_metrics(lambda: admission, session_stats)
+
+    text = registry.render()
+    assert len(calls) == 1
+    assert "career_chatbot_history_sessions 4\n" in text
+    assert "career_chatbot_history_bytes 1024\n" in text
+    assert 'career_chatbot_admission_admitted_total{kind="chat"} 7\n' in text
+    assert "# TYPE career_chatbot_admission_rejected_total counter\n" in text
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 21)]
+    assert metrics.percentile(values, 50) == 10.0
+    assert metrics.percentile(values, 95) == 19.0
+    assert metrics.percentile(values, 100) == 20.0
+    assert metrics.percentile([3.0], 99) == 3.0
+    assert metrics.percentile([], 95) == 0.0
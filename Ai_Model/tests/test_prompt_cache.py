@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import prompt_cache
+from prompt_cache import RETRY_BASE_SECONDS, PromptCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class CachedContent:
+    def __init__(self, name):
+        self.name = name
+        self.updates = 0
+        self.update_error = None
+
+    def update(self, ttl):
+        if self.update_error:
+            raise self.update_error
+        self.updates += 1
+
+
+class ScriptedPromptCache(PromptCache):
+    """PromptCache whose CachedContent.create call is replaced by a script of results."""
+
+    def __init__(self, *results, **kwargs):
+        super().__init__("gemini-1.5-flash-002", "system prompt", **kwargs)
+        self.results = list(results)
+        self.creates = 0
+        self.started = threading.Event()
+        self.release = None
+
+    def _create(self):
+        self.creates += 1
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result, f"model:{result.name}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(prompt_cache.time, "time", clock.time)
+    return clock
+
+
+def test_cache_is_created_once_and_reused(clock):
+    cache = ScriptedPromptCache(CachedContent("c1"))
+
+    assert cache.get_model() == "model:c1"
+    clock.now += 60
+    assert cache.get_model() == "model:c1"
+    assert cache.creates == 1
+    assert cache.stats()["cached_content"] == "c1"
+
+
+def test_transient_errors_back_off_instead_of_disabling(clock):
+    cache = ScriptedPromptCache(google_exceptions.ServiceUnavailable("blip"), CachedContent("c1"))
+
+    assert cache.get_model() is None
+    assert not cache.disabled
+
+    # Within the backoff window nobody retries
+    clock.now += RETRY_BASE_SECONDS - 1
+    assert cache.get_model() is None
+    assert cache.creates == 1
+
+    clock.now += 2
+    assert cache.get_model() == "model:c1"
+    assert cache.stats()["failures"] == 1
+
+
+def test_backoff_doubles_per_failure(clock):
+    cache = ScriptedPromptCache(google_exceptions.ResourceExhausted("429"),
+                                google_exceptions.ResourceExhausted("429"), CachedContent("c1"))
+
+    cache.get_model()
+    clock.now += RETRY_BASE_SECONDS + 1
+    cache.get_model()
+    clock.now += RETRY_BASE_SECONDS + 1
+    assert cache.get_model() is None
+    clock.now += RETRY_BASE_SECONDS
+    assert cache.get_model() == "model:c1"
+    assert cache.creates == 3
+
+
+def test_invalid_argument_disables_caching_for_good(clock):
+    cache = ScriptedPromptCache(google_exceptions.InvalidArgument("Cached content is too small"))
+
+    assert cache.get_model() is None
+    assert cache.disabled
+    clock.now += 3600
+    assert cache.get_model() is None
+    assert cache.creates == 1
+
+
+def test_concurrent_callers_do_not_wait_for_the_creation(clock):
+    cache = ScriptedPromptCache(CachedContent("c1"))
+    cache.release = threading.Event()
+    creator = threading.Thread(target=cache.get_model)
+    creator.start()
+    assert cache.started.wait(5)
+
+    # The lock is not held across the network call: other callers fall back at once
+    assert cache.get_model() is None
+    cache.release.set()
+    creator.join(5)
+
+    assert cache.get_model() == "model:c1"
+    assert cache.creates == 1
+
+
+def test_refresh_extends_the_ttl_near_expiry(clock):
+    content = CachedContent("c1")
+    cache = ScriptedPromptCache(content, ttl_seconds=600, refresh_margin_seconds=120)
+    cache.get_model()
+
+    clock.now += 500
+    assert cache.get_model() == "model:c1"
+    assert content.updates == 1
+    assert cache.refreshes == 1
+    assert cache.stats()["expires_in_seconds"] == 600
+
+
+def test_failed_recreation_keeps_the_current_model_until_it_expires(clock):
+    content = CachedContent("c1")
+    cache = ScriptedPromptCache(content, google_exceptions.ServiceUnavailable("blip"),
+                                ttl_seconds=600, refresh_margin_seconds=120)
+    cache.get_model()
+    content.update_error = google_exceptions.NotFound("gone")
+
+    clock.now += 500
+    assert cache.get_model() == "model:c1"
+    assert not cache.disabled
+    clock.now += 101
+    assert cache.get_model() is None
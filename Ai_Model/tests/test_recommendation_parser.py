@@ -0,0 +1,87 @@
+import pytest
+
+from recommendation_parser import DEFAULT_SALARY_RANGE, RecommendationParser, extract_json
+
+ITEM = {
+    "career_title": "Data Analyst",
+    "match_score": 85,
+    "reasons": ["Analitis"],
+    "next_steps": ["Belajar SQL"],
+    "salary_range": "Rp 7,000,000 - Rp 18,000,000/bulan",
+    "growth_prospect": "Tinggi",
+}
+PROFILE = {"interests": ["data"], "skills": ["Python", "SQL"]}
+
+
+def test_extract_json_ignores_fences_and_commentary():
+    text = 'Berikut rekomendasinya:\n```json\n[{"career_title": "Data Analyst"}]\n```\nSemoga membantu!'
+    assert extract_json(text) == [{"career_title": "Data Analyst"}]
+
+
+def test_extract_json_salvages_the_complete_items_of_a_truncated_array():
+    text = '[{"career_title": "Data Analyst", "match_score": 85}, {"career_title": "Data Sci'
+    assert extract_json(text) == [{"career_title": "Data Analyst", "match_score": 85}]
+
+
+def test_extract_json_rejects_text_without_json():
+    with pytest.raises(ValueError):
+        extract_json("Maaf, saya tidak bisa membantu.")
+    with pytest.raises(ValueError):
+        extract_json('[{"career_title": "Data')
+
+
+def test_items_are_repaired_or_dropped():
+    parser = RecommendationParser()
+    reply = ('[{"title": "UX Designer", "match_score": "0.8", "reasons": "Kreatif"},'
+             ' {"career_title": "Tanpa Skor"}, "bukan objek",'
+             ' {"career_title": "Data Analyst", "match_score": 85, "reasons": ["Analitis"], "next_steps": ["Belajar SQL"], '
+             '"salary_range": "Rp 7,000,000 - Rp 18,000,000/bulan", "growth_prospect": "Tinggi"}]')
+
+    recommendations = parser.parse(reply)
+    assert recommendations[0] == {
+        "career_title": "UX Designer",
+        "match_score": 80,
+        "reasons": ["Kreatif"],
+        "next_steps": [],
+        "salary_range": DEFAULT_SALARY_RANGE,
+        "growth_prospect": "Tidak diketahui",
+    }
+    assert recommendations[1] == ITEM
+    assert parser.stats()["repaired_items"] == 1
+    assert parser.stats()["dropped_items"] == 2
+
+
+def test_unusable_replies_count_as_wasted_calls():
+    parser = RecommendationParser()
+    assert parser.parse('{"recommendations": []}') is None
+    assert parser.parse("tidak ada JSON") is None
+    assert parser.parse('{"recommendations": [%s]}' % '{"career_title": "Data Analyst", "match_score": 85}')
+    assert parser.stats()["wasted_calls"] == 2
+    assert parser.stats()["wasted_call_rate"] == round(2 / 3, 4)
+
+
+def test_batch_replies_keep_only_usable_profiles():
+    parser = RecommendationParser()
+    results = parser.parse_batch('{"p0": [{"career_title": "Data Analyst", "match_score": 85}], "p1": ["rusak"]}')
+    assert list(results) == ["p0"]
+    assert results["p0"][0]["match_score"] == 85
+
+
+def test_model_uses_salvaged_recommendations(fake_gemini):
+    from tes_gemini import CareerChatbotModel
+    fake_gemini.json_response = [dict(ITEM, match_score="85%"), {"career_title": "Tanpa Skor"}]
+    model = CareerChatbotModel()
+
+    assert model.assess_career_fit(PROFILE) == [ITEM]
+    assert model.recommendation_parser.stats()["repaired_items"] == 1
+
+
+def test_model_falls_back_when_nothing_is_usable(fake_gemini):
+    from tes_gemini import CareerChatbotModel
+    fake_gemini.json_response = "Maaf, saya tidak bisa memberi rekomendasi."
+    model = CareerChatbotModel()
+
+    assert model.assess_career_fit(PROFILE) == model.basic_recommendations(PROFILE)
+    assert model.recommendation_parser.stats()["wasted_calls"] == 1
+    with pytest.raises(ValueError):
+        model._parse_recommendations('"bukan daftar"', PROFILE, fallback=False)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from gemini_backend import GeminiBackend
+from model_router import FLASH
+from resilience import HEDGE_MIN_SAMPLES, LATENCY_WINDOW, CircuitBreaker, CircuitOpenError, LocalRejection, ResilientCaller
+
+
+def failing(error):
+    def fn(timeout):
+        raise error
+    return fn
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    caller = ResilientCaller(max_attempts=1, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(google_exceptions.ServiceUnavailable):
+            caller.call(failing(google_exceptions.ServiceUnavailable("down")))
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda timeout: "never called")
+
+    # After reset_timeout one trial goes through; its success closes the breaker
+    time.sleep(0.06)
+    assert caller.call(lambda timeout: "ok") == "ok"
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+    assert breaker.stats()["short_circuited"] == 1
+
+
+def test_failed_half_open_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    caller = ResilientCaller(max_attempts=1, breaker=breaker)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        caller.call(failing(google_exceptions.ServiceUnavailable("down")))
+
+    time.sleep(0.06)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        caller.call(failing(google_exceptions.ServiceUnavailable("still down")))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_local_rejections_do_not_trip_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    caller = ResilientCaller(max_attempts=3, breaker=breaker)
+    with pytest.raises(LocalRejection):
+        caller.call(failing(LocalRejection("no quota left locally")))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert caller.retries == 0
+
+
+def test_only_transient_errors_are_retried():
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise google_exceptions.ServiceUnavailable("busy")
+        return "ok"
+
+    caller = ResilientCaller(max_attempts=3, backoff_base=0.001, breaker=CircuitBreaker(failure_threshold=10))
+    assert caller.call(flaky) == "ok"
+    assert caller.retries == 2
+
+    caller = ResilientCaller(max_attempts=3, backoff_base=0.001)
+    with pytest.raises(google_exceptions.InvalidArgument):
+        caller.call(failing(google_exceptions.InvalidArgument("bad request")))
+    assert caller.retries == 0
+
+
+def prime_latencies(caller, seconds=0.01):
+    for _ in range(HEDGE_MIN_SAMPLES):
+        caller._latencies.append(seconds)
+
+
+def test_slow_attempt_is_hedged():
+    caller = ResilientCaller(hedge=True, hedge_workers=2)
+    prime_latencies(caller)
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert caller.call(fn) == "fast"
+    assert (caller.hedges, caller.hedge_wins) == (1, 1)
+
+
+def test_slow_async_attempt_is_hedged():
+    caller = ResilientCaller(hedge=True)
+    prime_latencies(caller)
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        first = len(calls) == 1
+        await asyncio.sleep(0.5 if first else 0)
+        return "slow" if first else "fast"
+
+    assert asyncio.run(caller.call_async(fn)) == "fast"
+    assert (caller.hedges, caller.hedge_wins) == (1, 1)
+
+
+def test_hedges_are_capped_by_the_budget():
+    caller = ResilientCaller(hedge=True, hedge_workers=4, hedge_budget=0.1)
+    # A full window, so the slow attempts below do not move the p95
+    caller._latencies.extend([0.01] * LATENCY_WINDOW)
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        # Every first attempt is slow, so each one would be hedged without a budget
+        if len(calls) % 2 == 1:
+            time.sleep(0.05)
+        return "ok"
+
+    for _ in range(8):
+        calls.clear()
+        assert caller.call(fn) == "ok"
+
+    assert caller.attempts == 8
+    assert caller.hedges == 1
+    assert caller.hedges_over_budget == 7
+    assert caller.stats()["hedges_over_budget"] == 7
+
+
+def test_hedge_budget_grows_with_the_attempts():
+    caller = ResilientCaller(hedge=True, hedge_budget=0.1)
+    caller.hedges, caller.attempts = 1, 19
+    assert not caller._claim_hedge()
+    caller.attempts = 20
+    assert caller._claim_hedge()
+    assert caller.hedges == 2
+
+
+def test_p95_uses_the_nearest_rank():
+    caller = ResilientCaller()
+    for ms in range(1, 22):
+        caller._latencies.append(ms / 1000)
+    # ceil(0.95 * 21) = 20th value, not the 19th
+    assert caller.p95_latency() == 0.020
+
+    caller._latencies.clear()
+    prime_latencies(caller, seconds=0.01)
+    assert caller.p95_latency() == 0.01
+
+
+def test_backend_breaker_opens_on_gemini_outage(fake_gemini, monkeypatch):
+    monkeypatch.setenv("GEMINI_BREAKER_FAILURES", "2")
+    backend = GeminiBackend.from_env()
+    backend.configure("Anda adalah konselor karir.")
+    fake_gemini.error_rate = 1.0
+
+    for i in range(2):
+        with pytest.raises(google_exceptions.ServiceUnavailable):
+            backend.generate(f"Pertanyaan {i}", FLASH)
+    assert backend.resilience[FLASH].breaker.state == CircuitBreaker.OPEN
+
+    # Gemini recovered, but the open breaker keeps failing fast until reset_timeout
+    fake_gemini.error_rate = 0.0
+    with pytest.raises(CircuitOpenError):
+        backend.generate("Pertanyaan lagi", FLASH)
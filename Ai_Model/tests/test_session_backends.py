@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from fake_redis import FakeRedis
+from session_backends import RedisSessionStore, SqliteSessionStore
+from session_store import SessionStore
+
+
+def turn(i):
+    return {"user": f"pesan {i}", "assistant": f"jawaban {i}", "timestamp": f"2024-01-01T00:00:{i:02d}"}
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_store(request, tmp_path):
+    """Factory of stores; stores made by one factory share their data like separate workers would."""
+    redis = FakeRedis()
+
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SqliteSessionStore(str(tmp_path / "sessions.db"), **kwargs)
+        if request.param == "redis":
+            return RedisSessionStore(redis, **kwargs)
+        return SessionStore(**kwargs)
+
+    make.backend = request.param
+    return make
+
+
+def test_sessions_are_kept_apart_and_capped(make_store):
+    store = make_store(max_turns=3)
+    for i in range(5):
+        store.append_turn("a", turn(i))
+    store.append_turn("b", turn(9))
+    store.append_turn(None, turn(10))
+
+    assert store.get_history("a") == [turn(2), turn(3), turn(4)]
+    assert store.get_history("a", limit=1) == [turn(4)]
+    assert store.get_history("b") == [turn(9)]
+    assert store.get_history(None) == []
+    assert store.stats()["active_sessions"] == 2
+    assert store.stats()["stored_turns"] == 4
+
+
+def test_shared_backends_are_visible_to_other_workers(make_store):
+    if make_store.backend == "memory":
+        pytest.skip("the in-memory store is per process")
+    first, second = make_store(), make_store()
+    first.append_turn("a", turn(1))
+    second.append_turn("a", turn(2))
+    assert first.get_history("a") == second.get_history("a") == [turn(1), turn(2)]
+
+    second.clear("a")
+    assert first.get_history("a") == []
+
+
+def test_missing_sessions_are_restored_once_from_the_loader(make_store):
+    calls = []
+
+    def loader(session_id, max_turns):
+        calls.append(session_id)
+        return [turn(i) for i in range(5)]
+
+    store = make_store(max_turns=2, loader=loader)
+    assert store.get_history("old") == [turn(3), turn(4)]
+    assert store.get_history("old") == [turn(3), turn(4)]
+    assert calls == ["old"]
+
+
+def test_export_and_load_round_trip(make_store):
+    store = make_store()
+    store.append_turn("a", turn(1))
+    store.append_turn("b", turn(2))
+    exported = store.export_turns()
+    assert sorted(t["session_id"] for t in exported) == ["a", "b"]
+
+    copy = make_store() if make_store.backend == "memory" else SessionStore()
+    copy.load_turns(exported)
+    assert copy.get_history("a") == [turn(1)]
+    assert copy.get_history("b") == [turn(2)]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_idle_sessions_expire(backend, tmp_path):
+    if backend == "sqlite":
+        store = SqliteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=0.05)
+    else:
+        store = SessionStore(ttl_seconds=0.05)
+    store.append_turn("a", turn(1))
+    time.sleep(0.1)
+    assert store.get_history("a") == []
+
+
+def test_redis_sessions_expire_with_their_key():
+    redis = FakeRedis()
+    store = RedisSessionStore(redis, ttl_seconds=60, prefix="test:")
+    store.append_turn("a", turn(1))
+    # Expiry is Redis' job; an expired key is simply gone
+    redis.expire("test:a", 0)
+    assert store.get_history("a") == []
+
+
+def test_backend_is_selected_from_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_SQLITE_PATH", str(tmp_path / "sessions.db"))
+    assert isinstance(SessionStore.from_env(), SqliteSessionStore)
+
+    monkeypatch.setenv("SESSION_BACKEND", "redis")
+    monkeypatch.setenv("SESSION_REDIS_URL", "fake://")
+    assert isinstance(SessionStore.from_env(), RedisSessionStore)
+
+    monkeypatch.setenv("SESSION_BACKEND", "memcached")
+    with pytest.raises(ValueError):
+        SessionStore.from_env()
+
+
+def test_two_model_instances_share_a_conversation(fake_gemini, tmp_path):
+    from tes_gemini import CareerChatbotModel
+    path = str(tmp_path / "sessions.db")
+    worker_a = CareerChatbotModel(session_store=SqliteSessionStore(path))
+    worker_b = CareerChatbotModel(session_store=SqliteSessionStore(path))
+
+    reply = worker_a.generate_response("Saya suka data", session_id="s1")
+    history = worker_b.session_store.get_history("s1")
+    assert [(t["user"], t["assistant"]) for t in history] == [("Saya suka data", reply)]
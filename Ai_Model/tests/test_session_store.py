@@ -0,0 +1,126 @@
+import pytest
+
+import session_store
+from session_store import TURN_OVERHEAD_BYTES, SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def turn(text, **extra):
+    return dict({"user": text, "assistant": "ok"}, **extra)
+
+
+def test_ring_buffer_keeps_the_latest_turns():
+    store = SessionStore(max_turns=3)
+    for i in range(5):
+        store.append_turn("s1", turn(f"q{i}"))
+
+    assert [t["user"] for t in store.get_history("s1")] == ["q2", "q3", "q4"]
+    assert [t["user"] for t in store.get_history("s1", limit=2)] == ["q3", "q4"]
+    assert store.turn_count == 3
+
+
+def test_anonymous_turns_are_not_stored():
+    store = SessionStore()
+    store.append_turn(None, turn("q"))
+
+    assert store.get_history(None) == []
+    assert len(store) == 0
+
+
+def test_least_recently_used_session_is_evicted_first():
+    store = SessionStore(max_sessions=2)
+    store.append_turn("a", turn("qa"))
+    store.append_turn("b", turn("qb"))
+    # Reading "a" makes "b" the least recently used
+    store.get_history("a")
+    store.append_turn("c", turn("qc"))
+
+    assert store.get_history("b") == []
+    assert [t["user"] for t in store.get_history("a")] == ["qa"]
+    assert [t["user"] for t in store.get_history("c")] == ["qc"]
+    assert store.evictions == 1
+
+
+def test_idle_sessions_expire(clock):
+    store = SessionStore(ttl_seconds=60)
+    store.append_turn("old", turn("q1"))
+    clock.now += 30
+    store.append_turn("fresh", turn("q2"))
+
+    clock.now += 31
+    assert store.get_history("old") == []
+    assert [t["user"] for t in store.get_history("fresh")] == ["q2"]
+    assert store.stats()["active_sessions"] == 1
+
+
+def test_expired_sessions_are_swept_on_write(clock):
+    store = SessionStore(ttl_seconds=60)
+    store.append_turn("a", turn("q1"))
+    clock.now += 61
+    store.append_turn("b", turn("q2"))
+
+    assert len(store) == 1
+    assert store.evictions == 1
+
+
+def test_byte_budget_evicts_oldest_sessions():
+    size = TURN_OVERHEAD_BYTES + len("x" * 100) + len("ok")
+    store = SessionStore(max_bytes=size * 2)
+    for session_id in ("a", "b", "c"):
+        store.append_turn(session_id, turn("x" * 100))
+
+    assert store.total_bytes == size * 2
+    assert store.get_history("a") == []
+    assert store.stats()["estimated_bytes"] <= store.max_bytes
+
+
+def test_counters_follow_drops_and_clear():
+    store = SessionStore(max_turns=2)
+    for i in range(3):
+        store.append_turn("a", turn(f"q{i}"))
+    store.append_turn("b", turn("q"))
+    store.clear("a")
+
+    assert store.turn_count == 1
+    assert store.total_bytes == TURN_OVERHEAD_BYTES + len("q") + len("ok")
+
+
+def test_loader_restores_missing_sessions_lazily():
+    calls = []
+
+    def loader(session_id, max_turns):
+        calls.append((session_id, max_turns))
+        return [turn("from log")]
+
+    store = SessionStore(max_turns=4, loader=loader)
+
+    assert [t["user"] for t in store.get_history("s1")] == ["from log"]
+    store.get_history("s1")
+    assert calls == [("s1", 4)]
+
+
+def test_export_and_load_round_trip():
+    store = SessionStore()
+    store.append_turn("a", turn("q1"))
+    store.append_turn("b", turn("q2"))
+
+    copy = SessionStore()
+    copy.load_turns(store.export_turns() + [turn("untagged")])
+
+    assert [t["user"] for t in copy.get_history("a")] == ["q1"]
+    assert [t["user"] for t in copy.get_history("b")] == ["q2"]
+    assert copy.turn_count == 2
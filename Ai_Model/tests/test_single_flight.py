@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gemini_backend import GeminiBackend
+from model_router import FLASH
+from single_flight import SingleFlight
+
+
+def test_identical_concurrent_calls_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "reply"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "key", call) for _ in range(4)]
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ["reply"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def failing_call():
+            started.set()
+            await asyncio.sleep(0.05)
+            raise RuntimeError("boom")
+
+        leader = asyncio.ensure_future(flight.do_async("key", failing_call))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.do_async("key", failing_call))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["boom", "boom"]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def call():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        leader = asyncio.ensure_future(flight.do_async("key", call))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.do_async("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "reply"
+
+
+def test_backend_coalesces_identical_prompts(fake_gemini):
+    fake_gemini.latency_ms = 100
+    fake_gemini.latency_distribution = "fixed"
+    backend = GeminiBackend.from_env()
+    backend.configure("Anda adalah konselor karir.")
+
+    async def ask():
+        same = [backend.generate_async("Apa itu data analyst?", FLASH) for _ in range(3)]
+        other = backend.generate_async("Apa itu UX designer?", FLASH)
+        return await asyncio.gather(*same, other)
+
+    responses = asyncio.run(ask())
+    assert len({response.text for response in responses[:3]}) == 1
+    assert backend.single_flight.stats()["calls"] == 2
+    assert backend.single_flight.stats()["coalesced"] == 2
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from startup import Startup
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def flaky(failures):
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError(f"load failed ({len(calls)})")
+        return {"flash#0": 5}
+
+    return load, calls
+
+
+def test_failed_startup_is_retried_until_ready():
+    startup = Startup(max_attempts=3, retry_seconds=0)
+    load, calls = flaky(failures=2)
+
+    startup.run_in_background(load)
+    assert wait_for(lambda: startup.ready)
+
+    assert len(calls) == 3
+    status = startup.status()
+    assert status["attempts"] == 3 and status["alive"] and status["error"] is None
+    assert status["warm_up"] == {"flash#0": 5}
+
+
+def test_startup_reports_not_alive_after_the_last_attempt():
+    startup = Startup(max_attempts=2, retry_seconds=0)
+    load, calls = flaky(failures=5)
+
+    startup.run_in_background(load)
+    assert wait_for(lambda: not startup.alive)
+
+    assert len(calls) == 2
+    assert not startup.ready
+    assert startup.error == "load failed (2)"
+
+
+def test_background_run_starts_once_per_process():
+    startup = Startup(retry_seconds=0)
+    load, calls = flaky(failures=0)
+
+    startup.run_in_background(load)
+    startup.run_in_background(load)
+    assert wait_for(lambda: startup.ready)
+    assert len(calls) == 1
+
+
+def test_async_startup_retries_with_backoff():
+    startup = Startup(max_attempts=3, retry_seconds=0.01)
+    load, calls = flaky(failures=1)
+
+    async def load_async():
+        return load()
+
+    asyncio.run(startup.run_async(load_async))
+    assert startup.ready and len(calls) == 2
+
+
+def test_retry_delay_doubles():
+    startup = Startup(max_attempts=4, retry_seconds=2)
+    delays = []
+    for _ in range(4):
+        startup.attempts += 1
+        delays.append(startup._failed(RuntimeError("boom")))
+
+    assert delays == [2, 4, 8, None]
+    assert startup.failed
+
+
+def failed_startup():
+    startup = Startup(max_attempts=1)
+    # Already run in this process, as after a real failed startup
+    startup._pid = os.getpid()
+    startup.attempts = 1
+    startup._failed(RuntimeError("config missing"))
+    return startup
+
+
+@pytest.fixture
+def main_api():
+    import main_api
+    return main_api
+
+
+def test_fastapi_probes_follow_startup(main_api, fake_gemini, monkeypatch):
+    loading = Startup()
+    monkeypatch.setattr(main_api, "startup", loading)
+    client = TestClient(main_api.app)
+
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 503
+
+    loading._ready()
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and ready.json()["ready"]
+
+    monkeypatch.setattr(main_api, "startup", failed_startup())
+    dead = client.get("/healthz")
+    assert dead.status_code == 503
+    assert dead.json()["error"] == "config missing"
+    assert client.get("/readyz").status_code == 503
+
+
+def test_flask_probes_follow_startup(fake_gemini, monkeypatch):
+    import app as flask_app
+
+    # Wait for the module's own background startup, which would otherwise run during the test
+    assert wait_for(lambda: flask_app.startup.ready, timeout=30)
+    client = flask_app.app.test_client()
+
+    assert client.get("/healthz").status_code == 200
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and ready.get_json()["alive"]
+
+    monkeypatch.setattr(flask_app, "startup", failed_startup())
+    dead = client.get("/healthz")
+    assert dead.status_code == 503
+    assert dead.get_json()["status"] == "startup failed"
+    assert client.get("/readyz").status_code == 503
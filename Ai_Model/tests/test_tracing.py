@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from profiler import PROFILE_HEADER, SamplingProfiler
+from tracing import current_trace, end_trace, record_span, span, start_trace, traced
+
+CHAT_BODY = {"user_message": "Saya ingin pindah karir ke data analyst", "session_id": "s1"}
+
+# One Server-Timing entry: a metric name and its duration in milliseconds
+TIMING_ENTRY = re.compile(r"^[a-z_]+;dur=\d+(\.\d+)?$")
+
+
+def timing_entries(header):
+    entries = header.split(", ")
+    assert all(TIMING_ENTRY.match(entry) for entry in entries), header
+    return {name: float(value[len("dur="):]) for name, value in (entry.split(";") for entry in entries)}
+
+
+def test_server_timing_sums_repeated_spans_and_ends_with_the_total():
+    trace, token = start_trace("POST", "/chat")
+    try:
+        record_span("gemini_call", 0.1)
+        record_span("prompt_build", 0.002)
+        record_span("gemini_call", 0.05)
+        header = trace.server_timing()
+    finally:
+        end_trace(token)
+
+    assert header.startswith("gemini_call;dur=150.0, prompt_build;dur=2.0, total;dur=")
+    assert list(timing_entries(header)) == ["gemini_call", "prompt_build", "total"]
+
+
+def test_spans_outside_a_request_are_dropped():
+    assert current_trace() is None
+    record_span("gemini_call", 0.1)
+    with span("serialize"):
+        pass
+    assert current_trace() is None
+
+
+def test_traced_functions_record_a_span_even_when_they_raise():
+    @traced("json_parse")
+    def parse(text):
+        raise ValueError(text)
+
+    trace, token = start_trace("POST", "/assess-career")
+    try:
+        with pytest.raises(ValueError):
+            parse("{")
+    finally:
+        end_trace(token)
+    assert [name for name, _ in trace.spans] == ["json_parse"]
+
+
+def test_fastapi_sends_the_stage_breakdown(fake_gemini, monkeypatch):
+    import main_api
+    from tes_gemini import CareerChatbotModel
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    client = TestClient(main_api.app)
+
+    response = client.post("/chat", json=CHAT_BODY)
+
+    assert response.status_code == 200
+    timings = timing_entries(response.headers["Server-Timing"])
+    assert {"admission", "prompt_build", "gemini_call", "serialize"} <= set(timings)
+    assert list(timings)[-1] == "total"
+    assert timings["total"] >= timings["gemini_call"]
+
+    # Probes carry the header too, with only the total
+    assert list(timing_entries(client.get("/healthz").headers["Server-Timing"])) == ["total"]
+
+
+def test_flask_sends_the_stage_breakdown(fake_gemini):
+    import app as flask_app
+    deadline = time.monotonic() + 30
+    while not flask_app.startup.ready and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert flask_app.startup.ready, flask_app.startup.status()
+    client = flask_app.app.test_client()
+
+    response = client.post("/chat", json=CHAT_BODY)
+
+    assert response.status_code == 200
+    timings = timing_entries(response.headers["Server-Timing"])
+    assert {"admission", "gemini_call", "serialize"} <= set(timings)
+    assert list(timings)[-1] == "total"
+
+
+def test_profiler_is_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    monkeypatch.delenv("PROFILE_ALLOW_HEADER", raising=False)
+    assert SamplingProfiler.from_env() is None
+
+    monkeypatch.setenv("PROFILE_ALLOW_HEADER", "1")
+    monkeypatch.setenv("PROFILE_SLOW_MS", "500")
+    profiler = SamplingProfiler.from_env()
+    assert profiler.stats() == {"sample_rate": 0.0, "allow_header": True, "slow_ms": 500, "profiled": 0, "written": 0}
+
+
+def test_profile_header_is_honoured_only_when_allowed():
+    assert SamplingProfiler(allow_header=True).wants("1")
+    assert not SamplingProfiler(allow_header=True).wants("true")
+    assert not SamplingProfiler(allow_header=True).wants(None)
+    assert not SamplingProfiler(allow_header=False).wants("1")
+
+
+def test_sample_rate_picks_a_fraction_of_requests(monkeypatch):
+    import profiler as profiler_module
+    sampled = SamplingProfiler(sample_rate=0.25)
+
+    monkeypatch.setattr(profiler_module.random, "random", lambda: 0.2)
+    assert sampled.wants(None)
+    monkeypatch.setattr(profiler_module.random, "random", lambda: 0.3)
+    assert not sampled.wants(None)
+    assert not SamplingProfiler(sample_rate=0.0).wants(None)
+
+
+def busy_request(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_slow_request_profile_is_written_as_folded_stacks(tmp_path):
+    profiler = SamplingProfiler(allow_header=True, slow_ms=100, interval_ms=1, output_dir=str(tmp_path))
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_request, args=(stop,))
+    worker.start()
+    try:
+        session = profiler.start(worker.ident)
+        time.sleep(0.1)
+    finally:
+        stop.set()
+        worker.join()
+
+    path = profiler.finish(session, 0.25, "POST /chat")
+
+    assert os.path.basename(path).endswith("-POST_chat-250ms.folded")
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines and all(re.match(r"^\S.* \d+$", line) for line in lines)
+    assert any("busy_request (test_tracing.py:" in line for line in lines)
+    assert profiler.stats()["written"] == 1
+
+
+def test_fast_request_profile_is_discarded(tmp_path):
+    profiler = SamplingProfiler(allow_header=True, slow_ms=2000, interval_ms=1, output_dir=str(tmp_path))
+    session = profiler.start()
+    time.sleep(0.02)
+
+    assert profiler.finish(session, 0.02, "POST /chat") is None
+    assert os.listdir(tmp_path) == []
+    assert profiler.stats()["profiled"] == 1
+
+
+def test_servers_profile_only_requests_that_ask_for_it(fake_gemini, monkeypatch, tmp_path):
+    import app as flask_app
+    import main_api
+    from tes_gemini import CareerChatbotModel
+    fastapi_profiler = SamplingProfiler(allow_header=True, output_dir=str(tmp_path))
+    flask_profiler = SamplingProfiler(allow_header=True, output_dir=str(tmp_path))
+    monkeypatch.setattr(main_api, "profiler", fastapi_profiler)
+    monkeypatch.setattr(main_api, "chatbot_model", CareerChatbotModel())
+    monkeypatch.setattr(flask_app, "profiler", flask_profiler)
+
+    fastapi_client = TestClient(main_api.app)
+    assert fastapi_client.post("/chat", json=CHAT_BODY).status_code == 200
+    assert fastapi_client.post("/chat", json=CHAT_BODY, headers={PROFILE_HEADER: "1"}).status_code == 200
+    assert fastapi_profiler.stats()["profiled"] == 1
+
+    flask_client = flask_app.app.test_client()
+    flask_client.get("/healthz")
+    flask_client.get("/healthz", headers={PROFILE_HEADER: "1"})
+    assert flask_profiler.stats()["profiled"] == 1
+    # Fast requests leave no profile behind
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,117 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """
+    Timing spans of one HTTP request.
+
+    The trace is held in a context variable, so spans recorded anywhere below
+    the request handler land in it, including code run through
+    asyncio.to_thread (which copies the context). Outside a request the span
+    helpers only feed the stage histogram.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def totals_ms(self) -> Dict[str, float]:
+        """Milliseconds per span name (repeated spans, e.g. a retried call, are summed), in first-seen order."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for name, seconds in self.spans:
+                totals[name] = totals.get(name, 0.0) + seconds * 1000
+        return {name: round(ms, 1) for name, ms in totals.items()}
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: the spans so far plus the total."""
+        entries = [f"{name};dur={ms}" for name, ms in self.totals_ms().items()]
+        entries.append(f"total;dur={round(self.elapsed * 1000, 1)}")
+        return ", ".join(entries)
+
+    def log(self, status: int, **fields: Any):
+        """Write the request's timing breakdown as one JSON log line."""
+        record = {
+            "event": "request_timing",
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "total_ms": round(self.elapsed * 1000, 1),
+            "spans_ms": self.totals_ms(),
+        }
+        record.update(fields)
+        logger.info(json.dumps(record))
+
+
+def start_trace(method: str, path: str) -> Tuple[RequestTrace, Token]:
+    trace = RequestTrace(method, path)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token):
+    _current.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+def record_span(name: str, seconds: float):
+    """Add an already measured span to the current request's trace (if any)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def record_stage(name: str, seconds: float):
+    """Record a request stage both as a span and in the stage latency histogram."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    record_span(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as a span of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator recording each call of a function as a request stage (see record_stage)."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -11,6 +11,8 @@ const DashboardPage: React.FC = () => {
   const [inputMessage, setInputMessage] = useState('');
   const [messages, setMessages] = useState<Array<{id: number, text: string, sender: 'user' | 'ai'}>>([]);
   const [isLoading, setIsLoading] = useState(false);
+  // Session id so the AI server keeps conversation history per chat, not globally
+  const [sessionId] = useState(() => crypto.randomUUID());
 
   // API URL - sesuaikan dengan server Anda
   const AI_API_URL = "http://model.nextpath.my.id/"; // atau 'http://127.0.0.1:5000'
@@ -54,6 +56,7 @@ const DashboardPage: React.FC = () => {
         
         const response = await axios.post(`${AI_API_URL}/chat`, {
           user_message: userMessage,
+          session_id: sessionId,
           user_context: {
             // Add any user context if needed
             timestamp: new Date().toISOString()